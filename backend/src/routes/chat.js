@@ -20,6 +20,8 @@ async function createChatSession(userId) {
 router.post("/", authenticateChatToken, chatLimiter, async (req, res) => {
   const { message, sessionId: clientSessionId, userId: bodyUserId } = req.body || {};
   const authUserId = req.chatUser?.userId;
+  // A client retrying under the same key gets the first attempt's reply, not a second turn
+  const idempotencyKey = req.get("Idempotency-Key") || req.body?.idempotencyKey;
 
   if (!message || typeof message !== "string") {
     return res.status(400).json({ message: "message is required" });
@@ -43,17 +45,28 @@ router.post("/", authenticateChatToken, chatLimiter, async (req, res) => {
     // Try to call Python microservice if available
     try {
 
-      const response = await axios.post(`${pythonServiceUrl}/chat`, {
-        userId,
-        sessionId,
-        message,
-      });
+      const response = await axios.post(
+        `${pythonServiceUrl}/chat`,
+        { userId, sessionId, message },
+        idempotencyKey ? { headers: { "Idempotency-Key": idempotencyKey } } : undefined
+      );
 
       replyText = response.data.reply || "I have processed your request.";
       if (response.data.sessionId && response.data.sessionId !== sessionId) {
         sessionId = response.data.sessionId;
       }
+      // Tell the client this was the stored reply to an earlier attempt with the same key
+      const replayed = response.headers["idempotent-replayed"];
+      if (replayed) {
+        res.set("Idempotent-Replayed", replayed);
+      }
     } catch (err) {
+      // A 4xx is the service's answer to this request (409 same key still in progress, 422 key
+      // reused for another message): pass it on. Only an unreachable service or a 5xx falls back.
+      const status = err.response?.status;
+      if (status >= 400 && status < 500) {
+        return res.status(status).json(err.response.data);
+      }
       const msg = err.response
         ? `HTTP ${err.response.status} ${err.response.statusText} from ${pythonServiceUrl}/chat`
         : err.code
@@ -77,4 +90,59 @@ router.post("/", authenticateChatToken, chatLimiter, async (req, res) => {
   }
 });
 
+// POST /api/chat/stream – same body as /api/chat, answered as Server-Sent Events
+// (session, token, tool, part, done) relayed from the Python service's /chat/stream.
+router.post("/stream", authenticateChatToken, chatLimiter, async (req, res) => {
+  const { message, sessionId: clientSessionId, userId: bodyUserId } = req.body || {};
+  const userId = bodyUserId || req.chatUser?.userId;
+
+  if (!message || typeof message !== "string") {
+    return res.status(400).json({ message: "message is required" });
+  }
+  if (!userId) {
+    return res.status(400).json({ message: "userId is missing" });
+  }
+
+  let upstream;
+  let sessionId = clientSessionId;
+  try {
+    if (!sessionId) {
+      sessionId = await createChatSession(userId);
+    }
+    upstream = await axios.post(
+      `${pythonServiceUrl}/chat/stream`,
+      { userId, sessionId, message },
+      { responseType: "stream" }
+    );
+  } catch (err) {
+    if (!sessionId) {
+      console.error("Error in /api/chat/stream:", err);
+      return res.status(500).json({ message: "Internal server error" });
+    }
+    console.warn("Python service not available for streaming:", err.code || err.message);
+  }
+
+  res.set({
+    "Content-Type": "text/event-stream",
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no",
+  });
+  res.flushHeaders();
+
+  if (!upstream) {
+    const replyText =
+      "Thanks for your message. This is a placeholder reply until the LangChain service is connected.\n\nYou said: " +
+      message;
+    res.write(`event: done\ndata: ${JSON.stringify({ reply: replyText, sessionId })}\n\n`);
+    return res.end();
+  }
+
+  req.on("close", () => upstream.data.destroy());
+  upstream.data.on("error", (err) => {
+    console.warn("Stream from Python service failed:", err.message);
+    res.end();
+  });
+  upstream.data.pipe(res);
+});
+
 module.exports = router;
@@ -0,0 +1,30 @@
+-- Adds the per-provider non-overlap constraint to an existing database
+-- (new databases get it from schema.sql). Safe to re-run.
+--
+-- Existing overlapping pending/confirmed bookings must be resolved first; list them with:
+--
+--   SELECT a.id, b.id, a.provider_name, a.start_time, b.start_time
+--   FROM appointments a
+--   JOIN appointments b
+--     ON a.provider_name = b.provider_name
+--    AND a.id < b.id
+--    AND tstzrange(a.start_time, a.end_time, '[)') && tstzrange(b.start_time, b.end_time, '[)')
+--   WHERE a.status IN ('pending', 'confirmed')
+--     AND b.status IN ('pending', 'confirmed');
+
+CREATE EXTENSION IF NOT EXISTS btree_gist;
+
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM pg_constraint
+        WHERE conrelid = 'appointments'::regclass AND conname = 'appointments_no_overlap'
+    ) THEN
+        ALTER TABLE appointments
+            ADD CONSTRAINT appointments_no_overlap EXCLUDE USING gist (
+                provider_name WITH =,
+                tstzrange(start_time, end_time, '[)') WITH &&
+            ) WHERE (status IN ('pending', 'confirmed'));
+    END IF;
+END
+$$;
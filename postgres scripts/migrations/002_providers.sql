@@ -0,0 +1,35 @@
+-- Adds the provider directory (providers / provider_hours) to an existing database
+-- (new databases get it from schema.sql). Safe to re-run.
+--
+-- Every provider that already has appointments is registered at the location of their
+-- latest one, without hours rows, so they keep working BUSINESS_START-BUSINESS_END every
+-- day until hours are added, e.g.:
+--
+--   INSERT INTO provider_hours (provider_id, weekday, start_time, end_time)
+--   SELECT id, d, '09:00', '17:00' FROM providers, generate_series(0, 4) AS d
+--   WHERE name = 'Dr. Bob Dentist';
+
+CREATE TABLE IF NOT EXISTS providers (
+    id              UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    name            VARCHAR(255) NOT NULL UNIQUE,
+    location        VARCHAR(255) NOT NULL,
+    active          BOOLEAN NOT NULL DEFAULT TRUE,
+    created_at      TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_providers_location ON providers (location);
+
+CREATE TABLE IF NOT EXISTS provider_hours (
+    provider_id     UUID NOT NULL REFERENCES providers(id) ON DELETE CASCADE,
+    weekday         SMALLINT NOT NULL CHECK (weekday BETWEEN 0 AND 6),
+    start_time      TIME NOT NULL,
+    end_time        TIME NOT NULL CHECK (end_time > start_time),
+    PRIMARY KEY (provider_id, weekday, start_time)
+);
+
+INSERT INTO providers (name, location)
+SELECT DISTINCT ON (provider_name) provider_name, location
+FROM appointments
+WHERE provider_name IS NOT NULL AND location IS NOT NULL
+ORDER BY provider_name, start_time DESC
+ON CONFLICT (name) DO NOTHING;
@@ -0,0 +1,187 @@
+-- Adds the per-(provider, day) occupancy summary and the triggers that maintain it to an
+-- existing database (new databases get them from schema.sql), then backfills it. Safe to
+-- re-run. The backfill cuts days in Asia/Dubai; for another TZ_NAME run instead
+--
+--   python -m app.services.occupancy rebuild
+--
+-- which sets appointment_occupancy_settings.tz to TZ_NAME and recomputes every row.
+
+-- APPOINTMENT OCCUPANCY SUMMARY: one row per (provider, clinic-local day) with at least one
+-- pending/confirmed appointment. occupancy has 1440 bits, bit i set when wall-clock minute i
+-- after local midnight is booked; a missing row is a free day.
+-- Maintained by the statement-level triggers below, whoever writes to appointments.
+CREATE TABLE IF NOT EXISTS appointment_occupancy_settings (
+    id              BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),
+    tz              TEXT NOT NULL  -- clinic time zone the days are cut in (TZ_NAME)
+);
+
+INSERT INTO appointment_occupancy_settings (id, tz) VALUES (TRUE, 'Asia/Dubai')
+ON CONFLICT (id) DO NOTHING;
+
+CREATE TABLE IF NOT EXISTS appointment_occupancy (
+    provider_name   VARCHAR(255) NOT NULL,
+    day             DATE NOT NULL,
+    occupancy       VARBIT NOT NULL,
+    updated_at      TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (provider_name, day)
+);
+
+CREATE OR REPLACE FUNCTION appointment_occupancy_tz() RETURNS TEXT
+LANGUAGE sql STABLE AS $$
+    SELECT tz FROM appointment_occupancy_settings
+$$;
+
+-- Clinic-local days [start, end) touches
+CREATE OR REPLACE FUNCTION appointment_occupancy_days(start_time TIMESTAMPTZ, end_time TIMESTAMPTZ, tz TEXT)
+RETURNS SETOF DATE
+LANGUAGE sql STABLE AS $$
+    SELECT d::date
+    FROM generate_series(
+        (start_time AT TIME ZONE tz)::date,
+        ((end_time - INTERVAL '1 microsecond') AT TIME ZONE tz)::date,
+        INTERVAL '1 day'
+    ) AS d
+$$;
+
+-- Occupancy computed from appointments for days [p_from, p_to) of the given providers (NULL:
+-- all). Bit i of a day is set when wall-clock minute i after local midnight overlaps a
+-- booking (partial minutes count as taken), as the service's slot grid counts minutes; each
+-- booking's run of ones is shifted into place. The start_time bounds (a day of slack for
+-- appointments running past midnight) keep it a range scan on idx_appointments_provider_time.
+CREATE OR REPLACE FUNCTION appointment_occupancy_compute(p_providers TEXT[], p_from DATE, p_to DATE)
+RETURNS TABLE (provider_name VARCHAR(255), day DATE, occupancy VARBIT)
+LANGUAGE plpgsql STABLE AS $$
+#variable_conflict use_column
+DECLARE
+    v_tz TEXT := appointment_occupancy_tz();
+BEGIN
+    -- No "p_providers IS NULL OR ..." in the query: the cached generic plan couldn't use the index
+    IF p_providers IS NULL THEN
+        p_providers := ARRAY(SELECT DISTINCT a.provider_name FROM appointments a WHERE a.provider_name IS NOT NULL);
+    END IF;
+    RETURN QUERY
+    SELECT a.provider_name, d.day,
+           bit_or((~(0::bit(1440)) << (1440 - greatest(m.last - m.first, 0))) >> m.first)::varbit
+    FROM appointments a
+    CROSS JOIN LATERAL appointment_occupancy_days(a.start_time, a.end_time, v_tz) AS d(day)
+    CROSS JOIN LATERAL (
+        SELECT floor(extract(epoch FROM greatest(a.start_time AT TIME ZONE v_tz, d.day::timestamp) - d.day::timestamp) / 60)::int AS first,
+               ceil(extract(epoch FROM least(a.end_time AT TIME ZONE v_tz, (d.day + 1)::timestamp) - d.day::timestamp) / 60)::int AS last
+    ) m
+    WHERE a.status IN ('pending', 'confirmed')
+      AND a.provider_name = ANY(p_providers)
+      AND a.start_time >= (p_from - 1)::timestamp AT TIME ZONE v_tz
+      AND a.start_time < p_to::timestamp AT TIME ZONE v_tz
+      AND d.day >= p_from AND d.day < p_to
+    GROUP BY a.provider_name, d.day;
+END
+$$;
+
+-- Recompute the given (provider, day) pairs: upsert busy days, delete ones now free.
+-- (plpgsql rather than sql here and above: its plans are cached per session, which is
+-- most of a trigger's cost otherwise.)
+CREATE OR REPLACE FUNCTION appointment_occupancy_refresh(p_providers TEXT[], p_days DATE[])
+RETURNS VOID
+LANGUAGE plpgsql AS $$
+BEGIN
+    WITH keys AS (
+        SELECT DISTINCT k.provider_name, k.day FROM unnest(p_providers, p_days) AS k(provider_name, day)
+    ), fresh AS (
+        SELECT c.provider_name, c.day, c.occupancy
+        FROM appointment_occupancy_compute(
+            (SELECT array_agg(DISTINCT provider_name) FROM keys),
+            (SELECT min(day) FROM keys),
+            (SELECT max(day) + 1 FROM keys)
+        ) c
+        JOIN keys k ON k.provider_name = c.provider_name AND k.day = c.day
+    ), freed AS (
+        DELETE FROM appointment_occupancy o
+        USING keys k
+        WHERE o.provider_name = k.provider_name AND o.day = k.day
+          AND NOT EXISTS (SELECT 1 FROM fresh f WHERE f.provider_name = k.provider_name AND f.day = k.day)
+    )
+    INSERT INTO appointment_occupancy (provider_name, day, occupancy, updated_at)
+    SELECT provider_name, day, occupancy, NOW() FROM fresh
+    ON CONFLICT (provider_name, day) DO UPDATE
+    SET occupancy = EXCLUDED.occupancy, updated_at = EXCLUDED.updated_at;
+END
+$$;
+
+-- Statement-level, so a bulk import refreshes each touched provider-day once. Updates that
+-- don't move an active booking (notes, updated_at) refresh nothing.
+CREATE OR REPLACE FUNCTION appointment_occupancy_sync() RETURNS TRIGGER
+LANGUAGE plpgsql AS $$
+DECLARE
+    v_tz TEXT := appointment_occupancy_tz();
+    v_providers TEXT[];
+    v_days DATE[];
+    k RECORD;
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        SELECT array_agg(r.provider_name), array_agg(d.day) INTO v_providers, v_days
+        FROM new_rows r
+        CROSS JOIN LATERAL appointment_occupancy_days(r.start_time, r.end_time, v_tz) AS d(day)
+        WHERE r.status IN ('pending', 'confirmed') AND r.provider_name IS NOT NULL;
+    ELSIF TG_OP = 'DELETE' THEN
+        SELECT array_agg(r.provider_name), array_agg(d.day) INTO v_providers, v_days
+        FROM old_rows r
+        CROSS JOIN LATERAL appointment_occupancy_days(r.start_time, r.end_time, v_tz) AS d(day)
+        WHERE r.status IN ('pending', 'confirmed') AND r.provider_name IS NOT NULL;
+    ELSE
+        SELECT array_agg(r.provider_name), array_agg(d.day) INTO v_providers, v_days
+        FROM old_rows o
+        JOIN new_rows n ON n.id = o.id
+        CROSS JOIN LATERAL (
+            SELECT o.provider_name, o.start_time, o.end_time WHERE o.status IN ('pending', 'confirmed')
+            UNION ALL
+            SELECT n.provider_name, n.start_time, n.end_time WHERE n.status IN ('pending', 'confirmed')
+        ) r
+        CROSS JOIN LATERAL appointment_occupancy_days(r.start_time, r.end_time, v_tz) AS d(day)
+        WHERE r.provider_name IS NOT NULL
+          AND (o.provider_name, o.start_time, o.end_time, o.status)
+              IS DISTINCT FROM (n.provider_name, n.start_time, n.end_time, n.status);
+    END IF;
+    IF v_providers IS NULL THEN
+        RETURN NULL;
+    END IF;
+    -- Serialize refreshes of a provider-day until commit: two transactions booking
+    -- different slots of one day would otherwise each upsert a mask missing the other's
+    -- booking. The refresh below runs after the wait, with a snapshot that sees the other
+    -- transaction's rows (READ COMMITTED).
+    FOR k IN
+        SELECT DISTINCT hashtext(u.provider_name) AS key1, u.day - DATE '2000-01-01' AS key2
+        FROM unnest(v_providers, v_days) AS u(provider_name, day)
+        ORDER BY 1, 2
+    LOOP
+        PERFORM pg_advisory_xact_lock(k.key1, k.key2);
+    END LOOP;
+    PERFORM appointment_occupancy_refresh(v_providers, v_days);
+    RETURN NULL;
+END
+$$;
+
+DROP TRIGGER IF EXISTS appointment_occupancy_insert ON appointments;
+CREATE TRIGGER appointment_occupancy_insert
+    AFTER INSERT ON appointments
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION appointment_occupancy_sync();
+
+DROP TRIGGER IF EXISTS appointment_occupancy_update ON appointments;
+CREATE TRIGGER appointment_occupancy_update
+    AFTER UPDATE ON appointments
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION appointment_occupancy_sync();
+
+DROP TRIGGER IF EXISTS appointment_occupancy_delete ON appointments;
+CREATE TRIGGER appointment_occupancy_delete
+    AFTER DELETE ON appointments
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION appointment_occupancy_sync();
+
+SELECT appointment_occupancy_refresh(array_agg(k.provider_name), array_agg(k.day))
+FROM (
+    SELECT DISTINCT a.provider_name, d.day
+    FROM appointments a
+    CROSS JOIN LATERAL appointment_occupancy_days(a.start_time, a.end_time, appointment_occupancy_tz()) AS d(day)
+    WHERE a.status IN ('pending', 'confirmed') AND a.provider_name IS NOT NULL
+) k;
@@ -0,0 +1,104 @@
+-- Turns an existing chat_messages table into the monthly-partitioned one of schema.sql and
+-- adds chat_transcripts (new databases get both from schema.sql). Safe to re-run.
+--
+-- The existing rows aren't copied: the old table becomes the partition chat_messages_legacy,
+-- covering everything before the first of next month (UTC), and new months get their own
+-- partitions. Attaching it builds the primary key on (id, created_at) and scans the table once
+-- to check the bound, with chat_messages locked; on a large table run this in a quiet
+-- period. The legacy partition is compacted and dropped like any other month once all of
+-- it is older than CHAT_MESSAGES_RETENTION_DAYS.
+
+DO $$
+DECLARE
+    v_bound TIMESTAMPTZ := date_trunc('month', NOW() AT TIME ZONE 'UTC') AT TIME ZONE 'UTC' + interval '1 month';
+BEGIN
+    IF (SELECT relkind FROM pg_class WHERE oid = 'chat_messages'::regclass) <> 'r' THEN
+        RETURN;  -- already partitioned
+    END IF;
+
+    LOCK TABLE chat_messages IN ACCESS EXCLUSIVE MODE;
+    ALTER TABLE chat_messages RENAME TO chat_messages_legacy;
+    -- A partition takes the parent's primary key, (id, created_at), built on attach
+    ALTER TABLE chat_messages_legacy DROP CONSTRAINT chat_messages_pkey;
+    ALTER INDEX idx_chat_messages_session_created_at RENAME TO chat_messages_legacy_session_created_at_idx;
+
+    CREATE TABLE chat_messages (
+        id              UUID NOT NULL DEFAULT uuid_generate_v4(),
+        chat_session_id UUID NOT NULL REFERENCES chat_sessions(id) ON DELETE CASCADE,
+        sender_type     VARCHAR(50) NOT NULL, -- 'user' or 'assistant'
+        content         TEXT NOT NULL,
+        created_at      TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+        metadata        JSONB,
+        PRIMARY KEY (id, created_at)
+    ) PARTITION BY RANGE (created_at);
+
+    CREATE INDEX idx_chat_messages_session_created_at ON chat_messages (chat_session_id, created_at);
+
+    EXECUTE format('ALTER TABLE chat_messages ATTACH PARTITION chat_messages_legacy FOR VALUES FROM (MINVALUE) TO (%L)', v_bound);
+END
+$$;
+
+-- Partitions of chat_messages with their [lower_bound, upper_bound) (lower_bound NULL for
+-- MINVALUE), read back from the catalog
+CREATE OR REPLACE FUNCTION chat_messages_partitions()
+RETURNS TABLE (partition REGCLASS, lower_bound TIMESTAMPTZ, upper_bound TIMESTAMPTZ)
+LANGUAGE sql STABLE AS $$
+    SELECT c.oid::regclass,
+           substring(b.expr FROM 'FROM \(''([^'']*)''\)')::timestamptz,
+           substring(b.expr FROM 'TO \(''([^'']*)''\)')::timestamptz
+    FROM pg_inherits i
+    JOIN pg_class c ON c.oid = i.inhrelid
+    CROSS JOIN LATERAL (SELECT pg_get_expr(c.relpartbound, c.oid) AS expr) b
+    WHERE i.inhparent = 'chat_messages'::regclass
+$$;
+
+-- Creates the monthly partitions from the month of p_from through p_months_ahead months
+-- after the current one, skipping months an existing partition already covers; returns how
+-- many it created. Safe to call concurrently.
+CREATE OR REPLACE FUNCTION chat_messages_add_partitions(p_months_ahead INT DEFAULT 3, p_from TIMESTAMPTZ DEFAULT NOW())
+RETURNS INT
+LANGUAGE plpgsql AS $$
+DECLARE
+    v_month   DATE := date_trunc('month', p_from AT TIME ZONE 'UTC')::date;
+    v_last    DATE := (date_trunc('month', NOW() AT TIME ZONE 'UTC') + make_interval(months => p_months_ahead))::date;
+    v_start   TIMESTAMPTZ;
+    v_created INT := 0;
+BEGIN
+    PERFORM pg_advisory_xact_lock(hashtext('chat_messages_add_partitions'));
+    WHILE v_month <= v_last LOOP
+        v_start := v_month::timestamp AT TIME ZONE 'UTC';
+        IF NOT EXISTS (
+            SELECT 1 FROM chat_messages_partitions() p
+            WHERE coalesce(p.lower_bound, '-infinity') <= v_start AND v_start < p.upper_bound
+        ) THEN
+            EXECUTE format(
+                'CREATE TABLE %I PARTITION OF chat_messages FOR VALUES FROM (%L) TO (%L)',
+                'chat_messages_' || to_char(v_month, '"y"YYYY"m"MM'),
+                v_start, (v_month + interval '1 month') AT TIME ZONE 'UTC'
+            );
+            v_created := v_created + 1;
+        END IF;
+        v_month := (v_month + interval '1 month')::date;
+    END LOOP;
+    RETURN v_created;
+END
+$$;
+
+SELECT chat_messages_add_partitions();
+
+CREATE TABLE IF NOT EXISTS chat_transcripts (
+    chat_session_id  UUID PRIMARY KEY REFERENCES chat_sessions(id) ON DELETE CASCADE,
+    messages         JSONB NOT NULL,
+    message_count    INT NOT NULL,
+    first_message_at TIMESTAMPTZ NOT NULL,
+    last_message_at  TIMESTAMPTZ NOT NULL,
+    compacted_at     TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+DO $$
+BEGIN
+    ALTER TABLE chat_transcripts ALTER COLUMN messages SET COMPRESSION lz4;
+EXCEPTION WHEN feature_not_supported THEN
+    NULL;
+END
+$$;
@@ -0,0 +1,17 @@
+-- Adds the chat_requests table behind /chat idempotency keys to an existing database (new
+-- databases get it from schema.sql). Safe to re-run.
+
+-- CHAT REQUESTS: /chat idempotency keys. One row per (user, key): the fingerprint of the
+-- request body and, once the turn finished, its response, which retries under the same key
+-- get back instead of a second turn. Rows older than IDEMPOTENCY_TTL are deleted by the service.
+CREATE TABLE IF NOT EXISTS chat_requests (
+    user_id          UUID NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    idempotency_key  VARCHAR(255) NOT NULL,
+    request_hash     CHAR(64) NOT NULL,  -- sha256 of the request body
+    response         JSONB,              -- NULL while the request is in flight
+    claimed_at       TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    completed_at     TIMESTAMPTZ,
+    PRIMARY KEY (user_id, idempotency_key)
+);
+
+CREATE INDEX IF NOT EXISTS idx_chat_requests_claimed_at ON chat_requests (claimed_at);
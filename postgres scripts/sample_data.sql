@@ -5,6 +5,28 @@ VALUES
 ('dr.bob@example.com', 'hashed_password_2', 'Dr. Bob Dentist', 'dentist')
 ON CONFLICT (email) DO NOTHING;
 
+-- SAMPLE PROVIDERS (Dr. Bob has no hours rows: BUSINESS_START-BUSINESS_END every day)
+INSERT INTO providers (name, location)
+VALUES
+('Dr. Bob Dentist', 'Downtown Dental Clinic'),
+('Dr. Carol Dentist', 'Downtown Dental Clinic'),
+('Dr. Dan Dentist', 'Marina Dental Clinic')
+ON CONFLICT (name) DO NOTHING;
+
+-- Dr. Carol: weekdays with a lunch break; Dr. Dan: weekends
+INSERT INTO provider_hours (provider_id, weekday, start_time, end_time)
+SELECT p.id, d, h.start_time, h.end_time
+FROM providers p
+CROSS JOIN generate_series(0, 4) AS d
+CROSS JOIN (VALUES (TIME '08:00', TIME '12:00'), (TIME '13:00', TIME '16:00')) AS h(start_time, end_time)
+WHERE p.name = 'Dr. Carol Dentist'
+UNION ALL
+SELECT p.id, d, TIME '10:00', TIME '18:00'
+FROM providers p
+CROSS JOIN generate_series(5, 6) AS d
+WHERE p.name = 'Dr. Dan Dentist'
+ON CONFLICT DO NOTHING;
+
 -- SAMPLE CHAT SESSION
 INSERT INTO chat_sessions (user_id, status, metadata)
 VALUES
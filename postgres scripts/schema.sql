@@ -1,5 +1,7 @@
 -- Enable UUID extension (if not already enabled)
 CREATE EXTENSION IF NOT EXISTS "uuid-ossp";
+-- GiST equality on provider_name for the appointments overlap constraint
+CREATE EXTENSION IF NOT EXISTS btree_gist;
 
 -- USERS TABLE
 CREATE TABLE IF NOT EXISTS users (
@@ -29,6 +31,28 @@ CREATE TABLE IF NOT EXISTS chat_sessions (
 CREATE INDEX IF NOT EXISTS idx_chat_sessions_user_started_at
     ON chat_sessions (user_id, started_at DESC);
 
+-- PROVIDERS TABLE (dentists; name is what appointments.provider_name holds)
+CREATE TABLE IF NOT EXISTS providers (
+    id              UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    name            VARCHAR(255) NOT NULL UNIQUE,
+    location        VARCHAR(255) NOT NULL,
+    active          BOOLEAN NOT NULL DEFAULT TRUE,
+    created_at      TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_providers_location ON providers (location);
+
+-- PROVIDER HOURS: one row per working span (weekday 0 = Monday, clinic-local times). A
+-- weekday without rows is a day off; a provider without any rows works
+-- BUSINESS_START-BUSINESS_END every day.
+CREATE TABLE IF NOT EXISTS provider_hours (
+    provider_id     UUID NOT NULL REFERENCES providers(id) ON DELETE CASCADE,
+    weekday         SMALLINT NOT NULL CHECK (weekday BETWEEN 0 AND 6),
+    start_time      TIME NOT NULL,
+    end_time        TIME NOT NULL CHECK (end_time > start_time),
+    PRIMARY KEY (provider_id, weekday, start_time)
+);
+
 -- APPOINTMENTS TABLE
 CREATE TABLE IF NOT EXISTS appointments (
     id               UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
@@ -41,7 +65,13 @@ CREATE TABLE IF NOT EXISTS appointments (
     provider_name    VARCHAR(255),
     location         VARCHAR(255),
     created_at       TIMESTAMPTZ NOT NULL DEFAULT NOW(),
-    updated_at       TIMESTAMPTZ NOT NULL DEFAULT NOW()
+    updated_at       TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    -- A provider can't hold two active bookings that overlap; concurrent inserts of the
+    -- same slot are decided by the index, the loser gets SQLSTATE 23P01.
+    CONSTRAINT appointments_no_overlap EXCLUDE USING gist (
+        provider_name WITH =,
+        tstzrange(start_time, end_time, '[)') WITH &&
+    ) WHERE (status IN ('pending', 'confirmed'))
 );
 
 CREATE INDEX IF NOT EXISTS idx_appointments_provider_time
@@ -53,14 +83,278 @@ CREATE INDEX IF NOT EXISTS idx_appointments_user_time
 CREATE INDEX IF NOT EXISTS idx_appointments_status_time
     ON appointments (status, start_time);
 
+-- APPOINTMENT OCCUPANCY SUMMARY: one row per (provider, clinic-local day) with at least one
+-- pending/confirmed appointment. occupancy has 1440 bits, bit i set when wall-clock minute i
+-- after local midnight is booked; a missing row is a free day.
+-- Maintained by the statement-level triggers below, whoever writes to appointments.
+CREATE TABLE IF NOT EXISTS appointment_occupancy_settings (
+    id              BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),
+    tz              TEXT NOT NULL  -- clinic time zone the days are cut in (TZ_NAME)
+);
+
+INSERT INTO appointment_occupancy_settings (id, tz) VALUES (TRUE, 'Asia/Dubai')
+ON CONFLICT (id) DO NOTHING;
+
+CREATE TABLE IF NOT EXISTS appointment_occupancy (
+    provider_name   VARCHAR(255) NOT NULL,
+    day             DATE NOT NULL,
+    occupancy       VARBIT NOT NULL,
+    updated_at      TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (provider_name, day)
+);
+
+CREATE OR REPLACE FUNCTION appointment_occupancy_tz() RETURNS TEXT
+LANGUAGE sql STABLE AS $$
+    SELECT tz FROM appointment_occupancy_settings
+$$;
+
+-- Clinic-local days [start, end) touches
+CREATE OR REPLACE FUNCTION appointment_occupancy_days(start_time TIMESTAMPTZ, end_time TIMESTAMPTZ, tz TEXT)
+RETURNS SETOF DATE
+LANGUAGE sql STABLE AS $$
+    SELECT d::date
+    FROM generate_series(
+        (start_time AT TIME ZONE tz)::date,
+        ((end_time - INTERVAL '1 microsecond') AT TIME ZONE tz)::date,
+        INTERVAL '1 day'
+    ) AS d
+$$;
+
+-- Occupancy computed from appointments for days [p_from, p_to) of the given providers (NULL:
+-- all). Bit i of a day is set when wall-clock minute i after local midnight overlaps a
+-- booking (partial minutes count as taken), as the service's slot grid counts minutes; each
+-- booking's run of ones is shifted into place. The start_time bounds (a day of slack for
+-- appointments running past midnight) keep it a range scan on idx_appointments_provider_time.
+CREATE OR REPLACE FUNCTION appointment_occupancy_compute(p_providers TEXT[], p_from DATE, p_to DATE)
+RETURNS TABLE (provider_name VARCHAR(255), day DATE, occupancy VARBIT)
+LANGUAGE plpgsql STABLE AS $$
+#variable_conflict use_column
+DECLARE
+    v_tz TEXT := appointment_occupancy_tz();
+BEGIN
+    -- No "p_providers IS NULL OR ..." in the query: the cached generic plan couldn't use the index
+    IF p_providers IS NULL THEN
+        p_providers := ARRAY(SELECT DISTINCT a.provider_name FROM appointments a WHERE a.provider_name IS NOT NULL);
+    END IF;
+    RETURN QUERY
+    SELECT a.provider_name, d.day,
+           bit_or((~(0::bit(1440)) << (1440 - greatest(m.last - m.first, 0))) >> m.first)::varbit
+    FROM appointments a
+    CROSS JOIN LATERAL appointment_occupancy_days(a.start_time, a.end_time, v_tz) AS d(day)
+    CROSS JOIN LATERAL (
+        SELECT floor(extract(epoch FROM greatest(a.start_time AT TIME ZONE v_tz, d.day::timestamp) - d.day::timestamp) / 60)::int AS first,
+               ceil(extract(epoch FROM least(a.end_time AT TIME ZONE v_tz, (d.day + 1)::timestamp) - d.day::timestamp) / 60)::int AS last
+    ) m
+    WHERE a.status IN ('pending', 'confirmed')
+      AND a.provider_name = ANY(p_providers)
+      AND a.start_time >= (p_from - 1)::timestamp AT TIME ZONE v_tz
+      AND a.start_time < p_to::timestamp AT TIME ZONE v_tz
+      AND d.day >= p_from AND d.day < p_to
+    GROUP BY a.provider_name, d.day;
+END
+$$;
+
+-- Recompute the given (provider, day) pairs: upsert busy days, delete ones now free.
+-- (plpgsql rather than sql here and above: its plans are cached per session, which is
+-- most of a trigger's cost otherwise.)
+CREATE OR REPLACE FUNCTION appointment_occupancy_refresh(p_providers TEXT[], p_days DATE[])
+RETURNS VOID
+LANGUAGE plpgsql AS $$
+BEGIN
+    WITH keys AS (
+        SELECT DISTINCT k.provider_name, k.day FROM unnest(p_providers, p_days) AS k(provider_name, day)
+    ), fresh AS (
+        SELECT c.provider_name, c.day, c.occupancy
+        FROM appointment_occupancy_compute(
+            (SELECT array_agg(DISTINCT provider_name) FROM keys),
+            (SELECT min(day) FROM keys),
+            (SELECT max(day) + 1 FROM keys)
+        ) c
+        JOIN keys k ON k.provider_name = c.provider_name AND k.day = c.day
+    ), freed AS (
+        DELETE FROM appointment_occupancy o
+        USING keys k
+        WHERE o.provider_name = k.provider_name AND o.day = k.day
+          AND NOT EXISTS (SELECT 1 FROM fresh f WHERE f.provider_name = k.provider_name AND f.day = k.day)
+    )
+    INSERT INTO appointment_occupancy (provider_name, day, occupancy, updated_at)
+    SELECT provider_name, day, occupancy, NOW() FROM fresh
+    ON CONFLICT (provider_name, day) DO UPDATE
+    SET occupancy = EXCLUDED.occupancy, updated_at = EXCLUDED.updated_at;
+END
+$$;
+
+-- Statement-level, so a bulk import refreshes each touched provider-day once. Updates that
+-- don't move an active booking (notes, updated_at) refresh nothing.
+CREATE OR REPLACE FUNCTION appointment_occupancy_sync() RETURNS TRIGGER
+LANGUAGE plpgsql AS $$
+DECLARE
+    v_tz TEXT := appointment_occupancy_tz();
+    v_providers TEXT[];
+    v_days DATE[];
+    k RECORD;
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        SELECT array_agg(r.provider_name), array_agg(d.day) INTO v_providers, v_days
+        FROM new_rows r
+        CROSS JOIN LATERAL appointment_occupancy_days(r.start_time, r.end_time, v_tz) AS d(day)
+        WHERE r.status IN ('pending', 'confirmed') AND r.provider_name IS NOT NULL;
+    ELSIF TG_OP = 'DELETE' THEN
+        SELECT array_agg(r.provider_name), array_agg(d.day) INTO v_providers, v_days
+        FROM old_rows r
+        CROSS JOIN LATERAL appointment_occupancy_days(r.start_time, r.end_time, v_tz) AS d(day)
+        WHERE r.status IN ('pending', 'confirmed') AND r.provider_name IS NOT NULL;
+    ELSE
+        SELECT array_agg(r.provider_name), array_agg(d.day) INTO v_providers, v_days
+        FROM old_rows o
+        JOIN new_rows n ON n.id = o.id
+        CROSS JOIN LATERAL (
+            SELECT o.provider_name, o.start_time, o.end_time WHERE o.status IN ('pending', 'confirmed')
+            UNION ALL
+            SELECT n.provider_name, n.start_time, n.end_time WHERE n.status IN ('pending', 'confirmed')
+        ) r
+        CROSS JOIN LATERAL appointment_occupancy_days(r.start_time, r.end_time, v_tz) AS d(day)
+        WHERE r.provider_name IS NOT NULL
+          AND (o.provider_name, o.start_time, o.end_time, o.status)
+              IS DISTINCT FROM (n.provider_name, n.start_time, n.end_time, n.status);
+    END IF;
+    IF v_providers IS NULL THEN
+        RETURN NULL;
+    END IF;
+    -- Serialize refreshes of a provider-day until commit: two transactions booking
+    -- different slots of one day would otherwise each upsert a mask missing the other's
+    -- booking. The refresh below runs after the wait, with a snapshot that sees the other
+    -- transaction's rows (READ COMMITTED).
+    FOR k IN
+        SELECT DISTINCT hashtext(u.provider_name) AS key1, u.day - DATE '2000-01-01' AS key2
+        FROM unnest(v_providers, v_days) AS u(provider_name, day)
+        ORDER BY 1, 2
+    LOOP
+        PERFORM pg_advisory_xact_lock(k.key1, k.key2);
+    END LOOP;
+    PERFORM appointment_occupancy_refresh(v_providers, v_days);
+    RETURN NULL;
+END
+$$;
+
+DROP TRIGGER IF EXISTS appointment_occupancy_insert ON appointments;
+CREATE TRIGGER appointment_occupancy_insert
+    AFTER INSERT ON appointments
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION appointment_occupancy_sync();
+
+DROP TRIGGER IF EXISTS appointment_occupancy_update ON appointments;
+CREATE TRIGGER appointment_occupancy_update
+    AFTER UPDATE ON appointments
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION appointment_occupancy_sync();
+
+DROP TRIGGER IF EXISTS appointment_occupancy_delete ON appointments;
+CREATE TRIGGER appointment_occupancy_delete
+    AFTER DELETE ON appointments
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION appointment_occupancy_sync();
+
+-- CHAT MESSAGES: partitioned by (UTC) month of created_at, one table per month named
+-- chat_messages_yYYYYmMM. chat_messages_add_partitions() creates the months ahead (here, and
+-- from the service on startup and every few hours); there is no default partition, so
+-- partitions are always detachable without a lock on the parent. Months older than
+-- CHAT_MESSAGES_RETENTION_DAYS are compacted into chat_transcripts and dropped by
+-- python -m app.services.chat_archive.
 CREATE TABLE IF NOT EXISTS chat_messages (
-    id              UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    id              UUID NOT NULL DEFAULT uuid_generate_v4(),
     chat_session_id UUID NOT NULL REFERENCES chat_sessions(id) ON DELETE CASCADE,
     sender_type     VARCHAR(50) NOT NULL, -- 'user' or 'assistant'
     content         TEXT NOT NULL,
     created_at      TIMESTAMPTZ NOT NULL DEFAULT NOW(),
-    metadata        JSONB
-);
+    metadata        JSONB,
+    PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
 
 CREATE INDEX IF NOT EXISTS idx_chat_messages_session_created_at
     ON chat_messages (chat_session_id, created_at);
+
+-- Partitions of chat_messages with their [lower_bound, upper_bound) (lower_bound NULL for
+-- MINVALUE), read back from the catalog
+CREATE OR REPLACE FUNCTION chat_messages_partitions()
+RETURNS TABLE (partition REGCLASS, lower_bound TIMESTAMPTZ, upper_bound TIMESTAMPTZ)
+LANGUAGE sql STABLE AS $$
+    SELECT c.oid::regclass,
+           substring(b.expr FROM 'FROM \(''([^'']*)''\)')::timestamptz,
+           substring(b.expr FROM 'TO \(''([^'']*)''\)')::timestamptz
+    FROM pg_inherits i
+    JOIN pg_class c ON c.oid = i.inhrelid
+    CROSS JOIN LATERAL (SELECT pg_get_expr(c.relpartbound, c.oid) AS expr) b
+    WHERE i.inhparent = 'chat_messages'::regclass
+$$;
+
+-- Creates the monthly partitions from the month of p_from through p_months_ahead months
+-- after the current one, skipping months an existing partition already covers; returns how
+-- many it created. Safe to call concurrently.
+CREATE OR REPLACE FUNCTION chat_messages_add_partitions(p_months_ahead INT DEFAULT 3, p_from TIMESTAMPTZ DEFAULT NOW())
+RETURNS INT
+LANGUAGE plpgsql AS $$
+DECLARE
+    v_month   DATE := date_trunc('month', p_from AT TIME ZONE 'UTC')::date;
+    v_last    DATE := (date_trunc('month', NOW() AT TIME ZONE 'UTC') + make_interval(months => p_months_ahead))::date;
+    v_start   TIMESTAMPTZ;
+    v_created INT := 0;
+BEGIN
+    PERFORM pg_advisory_xact_lock(hashtext('chat_messages_add_partitions'));
+    WHILE v_month <= v_last LOOP
+        v_start := v_month::timestamp AT TIME ZONE 'UTC';
+        IF NOT EXISTS (
+            SELECT 1 FROM chat_messages_partitions() p
+            WHERE coalesce(p.lower_bound, '-infinity') <= v_start AND v_start < p.upper_bound
+        ) THEN
+            EXECUTE format(
+                'CREATE TABLE %I PARTITION OF chat_messages FOR VALUES FROM (%L) TO (%L)',
+                'chat_messages_' || to_char(v_month, '"y"YYYY"m"MM'),
+                v_start, (v_month + interval '1 month') AT TIME ZONE 'UTC'
+            );
+            v_created := v_created + 1;
+        END IF;
+        v_month := (v_month + interval '1 month')::date;
+    END LOOP;
+    RETURN v_created;
+END
+$$;
+
+SELECT chat_messages_add_partitions();
+
+-- CHAT TRANSCRIPTS: the messages of compacted partitions, one row per session, oldest first
+-- ({"t": created_at, "s": sender_type, "c": content, "m": metadata if any}). A session
+-- spanning several compacted months gets each month added in turn.
+CREATE TABLE IF NOT EXISTS chat_transcripts (
+    chat_session_id  UUID PRIMARY KEY REFERENCES chat_sessions(id) ON DELETE CASCADE,
+    messages         JSONB NOT NULL,
+    message_count    INT NOT NULL,
+    first_message_at TIMESTAMPTZ NOT NULL,
+    last_message_at  TIMESTAMPTZ NOT NULL,
+    compacted_at     TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+-- Transcripts are written once and rarely read: compress them with lz4 where the server
+-- supports it (pglz, the default, otherwise)
+DO $$
+BEGIN
+    ALTER TABLE chat_transcripts ALTER COLUMN messages SET COMPRESSION lz4;
+EXCEPTION WHEN feature_not_supported THEN
+    NULL;
+END
+$$;
+
+-- CHAT REQUESTS: /chat idempotency keys. One row per (user, key): the fingerprint of the
+-- request body and, once the turn finished, its response, which retries under the same key
+-- get back instead of a second turn. Rows older than IDEMPOTENCY_TTL are deleted by the service.
+CREATE TABLE IF NOT EXISTS chat_requests (
+    user_id          UUID NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    idempotency_key  VARCHAR(255) NOT NULL,
+    request_hash     CHAR(64) NOT NULL,  -- sha256 of the request body
+    response         JSONB,              -- NULL while the request is in flight
+    claimed_at       TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    completed_at     TIMESTAMPTZ,
+    PRIMARY KEY (user_id, idempotency_key)
+);
+
+CREATE INDEX IF NOT EXISTS idx_chat_requests_claimed_at ON chat_requests (claimed_at);
@@ -0,0 +1,139 @@
+"""
+Async Postgres access (psycopg 3 + psycopg_pool) for CHAT_EXECUTION_MODE=async.
+
+Mirrors app/db.py: same pool sizing/recycling settings, same transaction semantics,
+same SQL (psycopg 3 uses the same %s / %(name)s placeholders as psycopg2).
+psycopg is imported lazily so the sync service never pays for it.
+"""
+
+import asyncio
+import time
+import weakref
+from contextlib import asynccontextmanager
+from typing import Any, AsyncGenerator, Dict
+
+from .core import config, metrics
+
+_apool = None
+_apool_lock = asyncio.Lock()
+_last_used: "weakref.WeakKeyDictionary[Any, float]" = weakref.WeakKeyDictionary()
+
+
+async def _check(conn) -> None:
+    """Checkout health check: ping only connections idle longer than DB_POOL_PING_AFTER."""
+    if time.monotonic() - _last_used.get(conn, 0.0) < config.DB_POOL_PING_AFTER:
+        return
+    await conn.execute("SELECT 1")
+    await conn.rollback()
+
+
+async def _reset(conn) -> None:
+    if conn.autocommit:
+        await conn.set_autocommit(False)
+    _last_used[conn] = time.monotonic()
+
+
+_counting_classes = None
+
+
+def _counting_types():
+    """
+    (connection class, cursor class) that count round trips like app/db.py: a statement,
+    the BEGIN psycopg sends before a transaction's first statement, COMMIT/ROLLBACK.
+    Built on first use because psycopg is imported lazily.
+    """
+    global _counting_classes
+    if _counting_classes is None:
+        from psycopg import AsyncConnection, AsyncCursor, pq
+
+        def _count(conn, statements: int = 1) -> None:
+            begins = not conn.autocommit and conn.info.transaction_status == pq.TransactionStatus.IDLE
+            metrics.count_db_round_trips(statements + int(begins))
+
+        class CountingAsyncCursor(AsyncCursor):
+            async def execute(self, query, params=None, **kwargs):
+                _count(self.connection)
+                return await super().execute(query, params, **kwargs)
+
+            async def executemany(self, query, params_seq, **kwargs):
+                params_seq = list(params_seq)
+                _count(self.connection, len(params_seq))
+                return await super().executemany(query, params_seq, **kwargs)
+
+        class CountingAsyncConnection(AsyncConnection):
+            def _ends_transaction(self) -> None:
+                if not self.closed and self.info.transaction_status != pq.TransactionStatus.IDLE:
+                    metrics.count_db_round_trips()
+
+            async def commit(self) -> None:
+                self._ends_transaction()
+                await super().commit()
+
+            async def rollback(self) -> None:
+                self._ends_transaction()
+                await super().rollback()
+
+        _counting_classes = (CountingAsyncConnection, CountingAsyncCursor)
+    return _counting_classes
+
+
+async def get_async_pool():
+    global _apool
+    if _apool is None:
+        async with _apool_lock:
+            if _apool is None:
+                from psycopg.conninfo import make_conninfo
+                from psycopg_pool import AsyncConnectionPool
+
+                connection_class, cursor_class = _counting_types()
+                pool = AsyncConnectionPool(
+                    make_conninfo(
+                        host=config.DB_HOST,
+                        port=config.DB_PORT,
+                        user=config.DB_USER,
+                        password=config.DB_PASSWORD,
+                        dbname=config.DB_NAME,
+                    ),
+                    min_size=config.DB_POOL_MIN,
+                    max_size=max(config.DB_POOL_MAX, config.DB_POOL_MIN),
+                    timeout=config.DB_POOL_TIMEOUT,
+                    max_idle=config.DB_POOL_MAX_IDLE,
+                    max_lifetime=config.DB_POOL_MAX_LIFETIME,
+                    connection_class=connection_class,
+                    kwargs={"cursor_factory": cursor_class},
+                    configure=_reset,
+                    check=_check,
+                    reset=_reset,
+                    name="python-service-async",
+                    open=False,
+                )
+                await pool.open()
+                _apool = pool
+    return _apool
+
+
+async def close_async_pool() -> None:
+    global _apool
+    pool, _apool = _apool, None
+    if pool is not None:
+        await pool.close()
+
+
+def async_pool_stats() -> Dict[str, Any]:
+    return dict(_apool.get_stats()) if _apool is not None else {}
+
+
+@asynccontextmanager
+async def adb_conn(autocommit: bool = False) -> AsyncGenerator[Any, None]:
+    """Borrow a pooled async connection: commit on success, rollback on error (like db_conn)."""
+    pool = await get_async_pool()
+    async with pool.connection() as conn:
+        if autocommit:
+            await conn.set_autocommit(True)
+        yield conn
+
+
+def adict_cursor(conn):
+    from psycopg.rows import dict_row
+
+    return conn.cursor(row_factory=dict_row)
@@ -1,11 +1,68 @@
-from fastapi import FastAPI
-from .models import ChatRequest, ChatResponse
-from .db import db_conn
-from .core import config
-from .services.sessions import ensure_session, log_message, get_history, touch_session
+import asyncio
+import json
+import logging
+from contextlib import asynccontextmanager, suppress
+from datetime import date, datetime
+from typing import List, Optional
+
+import anyio
+from fastapi import FastAPI, Header, HTTPException, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from .models import (
+    ChatRequest, ChatResponse, AvailabilityRangeResponse, NextAvailabilityResponse,
+    LocationAvailabilityResponse, AnyProviderAvailabilityResponse, AppointmentImportResponse,
+)
+from .db import db_conn, close_pool, pool_stats
+from .adb import close_async_pool, async_pool_stats
+from . import warmup
+from .core import config, metrics
+from .services.sessions import begin_turn, finish_turn, abegin_turn, afinish_turn
 from .services.rules import chat_rule_based
+from .services.availability import availability_stats
+from .services.message_log import stop_writer, message_log_stats
+from .services.history import history_stats
+from .services.response_cache import response_cache_stats
+from .services.invalidation import start_listener, stop_listener, invalidation_stats
+from .services.chat_archive import start_maintenance, stop_maintenance, chat_archive_stats
+from .services.tool_executor import configure_pool, shutdown_pool
+from .services import bulk, idempotency
+from .services.scheduling import (
+    list_available_slots_range, alist_available_slots_range, find_next_slots, afind_next_slots,
+    list_location_slots_range, alist_location_slots_range, list_any_provider_slots, alist_any_provider_slots,
+    lookup_stats,
+)
+
+logger = logging.getLogger("python-service.api")
 
-app = FastAPI(title="Dental LangChain Chat Service (modular)")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Sync /chat turns run on anyio's threadpool; the tool pool is sized to serve all of them
+    configure_pool(anyio.to_thread.current_default_thread_limiter().total_tokens)
+    # Imports, date parser, DB pool and model client warm in the background; /ready flips after
+    warming = asyncio.create_task(warmup.run())
+    # Other workers' writes reach this worker's caches through the invalidation listener
+    start_listener()
+    # Upcoming chat_messages partitions, and compaction of old ones when retention is set
+    start_maintenance()
+    yield
+    stop_maintenance()
+    stop_listener()
+    if not warming.done():
+        warming.cancel()
+        with suppress(asyncio.CancelledError):
+            await warming
+    if config.USE_LLM:
+        from .services.llm import close_registry
+        await close_registry()
+    shutdown_pool()
+    # Drain queued chat messages while the pool is still open
+    stop_writer()
+    close_pool()
+    await close_async_pool()
+
+app = FastAPI(title="Dental LangChain Chat Service (modular)", lifespan=lifespan)
+app.add_middleware(metrics.RequestMetricsMiddleware)
 
 @app.get("/health")
 def health():
@@ -15,26 +72,445 @@ def health():
         db_ok = True
     except Exception:
         db_ok = False
-    return {"status": "ok", "db": db_ok, "llm": config.USE_LLM}
+    return {
+        "status": "ok" if warmup.readiness.ready else warmup.STARTING,
+        "ready": warmup.readiness.ready,
+        "warmup": warmup.readiness.snapshot(),
+        "db": db_ok,
+        "llm": config.USE_LLM,
+        "mode": config.CHAT_EXECUTION_MODE,
+        "pool": pool_stats(),
+        "async_pool": async_pool_stats(),
+        "availability_cache": availability_stats(),
+        "message_log": message_log_stats(),
+        "history_cache": history_stats(),
+        "response_cache": response_cache_stats(),
+        "cache_invalidation": invalidation_stats(),
+        "chat_archive": chat_archive_stats(),
+        "availability_lookups": lookup_stats(),
+        "idempotency": idempotency.idempotency_stats(),
+    }
+
+@app.get("/ready")
+def ready():
+    """Readiness probe: 503 until the startup warm-up has finished."""
+    body = warmup.readiness.snapshot()
+    return JSONResponse(body, status_code=200 if warmup.readiness.ready else 503)
 
-@app.post("/chat", response_model=ChatResponse)
-def chat(req: ChatRequest):
-    session_id = ensure_session(req.userId, req.sessionId)
-    log_message(session_id, "user", req.message)
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
 
-    history_rows = get_history(session_id, limit=10)
+def _rules_reply(message: str, user_id: str, path: str) -> str:
+    metrics.reply_path.inc(path=path)
+    with metrics.stage("rules"):
+        return chat_rule_based(message, user_id)
+
+# ---------- Idempotency keys ----------
+#
+# A request with an idempotencyKey (or Idempotency-Key header) runs at most once per user and
+# key: retries get the stored response, marked with an Idempotent-Replayed header
+# (services/idempotency.py).
+
+def _idempotency_key(req: ChatRequest, header: Optional[str]) -> Optional[str]:
+    key = req.idempotencyKey or header
+    if key is not None and len(key) > 255:
+        raise HTTPException(status_code=400, detail="Idempotency-Key is longer than 255 characters")
+    return key
+
+def _idempotency_error(e: Exception) -> HTTPException:
+    status = 422 if isinstance(e, idempotency.KeyReused) else 409
+    return HTTPException(status_code=status, detail=str(e))
+
+def chat(req: ChatRequest, response: Response, idempotency_key: Optional[str] = Header(None)):
+    key = _idempotency_key(req, idempotency_key)
+    if key is None:
+        return _chat(req)
+    try:
+        body, replayed = idempotency.run(
+            req.userId, key, idempotency.request_hash(req.model_dump()), lambda: _chat(req).model_dump()
+        )
+    except (idempotency.KeyReused, idempotency.InProgress) as e:
+        raise _idempotency_error(e)
+    if replayed:
+        response.headers["Idempotent-Replayed"] = "true"
+    return ChatResponse(**body)
+
+async def chat_async(
+    req: ChatRequest, response: Response, idempotency_key: Optional[str] = Header(None)
+):
+    key = _idempotency_key(req, idempotency_key)
+    if key is None:
+        return await _chat_async(req)
+
+    async def turn():
+        return (await _chat_async(req)).model_dump()
+
+    try:
+        body, replayed = await idempotency.arun(req.userId, key, idempotency.request_hash(req.model_dump()), turn)
+    except (idempotency.KeyReused, idempotency.InProgress) as e:
+        raise _idempotency_error(e)
+    if replayed:
+        response.headers["Idempotent-Replayed"] = "true"
+    return ChatResponse(**body)
+
+def _chat(req: ChatRequest) -> ChatResponse:
+    session_id, history_rows = begin_turn(req.userId, req.sessionId, req.message, history_limit=10)
 
     if config.USE_LLM:
         try:
             from .services.llm import chat_with_llm
             reply_text = chat_with_llm(req.message, req.userId, history_rows)
+            metrics.reply_path.inc(path="llm")
         except Exception as e:
             # Fallback to rule-based if LLM path fails for any reason
-            reply_text = chat_rule_based(req.message, req.userId)
+            reply_text = _rules_reply(req.message, req.userId, "fallback")
     else:
-        reply_text = chat_rule_based(req.message, req.userId)
+        reply_text = _rules_reply(req.message, req.userId, "rules")
 
-    log_message(session_id, "assistant", reply_text)
-    touch_session(session_id)
+    finish_turn(session_id, reply_text)
 
     return ChatResponse(reply=reply_text, sessionId=session_id)
+
+async def _chat_async(req: ChatRequest) -> ChatResponse:
+    session_id, history_rows = await abegin_turn(req.userId, req.sessionId, req.message, history_limit=10)
+
+    if config.USE_LLM:
+        try:
+            from .services.llm import achat_with_llm
+            reply_text = await achat_with_llm(req.message, req.userId, history_rows)
+            metrics.reply_path.inc(path="llm")
+        except Exception as e:
+            # Fallback to rule-based if LLM path fails for any reason
+            reply_text = await run_in_threadpool(_rules_reply, req.message, req.userId, "fallback")
+    else:
+        reply_text = await run_in_threadpool(_rules_reply, req.message, req.userId, "rules")
+
+    await afinish_turn(session_id, reply_text)
+
+    return ChatResponse(reply=reply_text, sessionId=session_id)
+
+# CHAT_EXECUTION_MODE picks the implementation; both share the same contract.
+app.add_api_route(
+    "/chat",
+    chat_async if config.ASYNC_CHAT else chat,
+    methods=["POST"],
+    response_model=ChatResponse,
+)
+
+# ---------- Streaming chat (Server-Sent Events) ----------
+#
+# POST /chat/stream takes the /chat body and answers with text/event-stream:
+#   session {"sessionId"}            as soon as the turn is recorded
+#   token   {"text"}                 model text while it is generated (no-tool replies)
+#   tool    {"name","status"}        around each tool call
+#   part    {"tool","text"}          a finished tool's part of the reply
+#   done    {"reply","sessionId"}    final reply, after it has been persisted
+# The reply in "done" is authoritative: if the LLM fails mid-stream the rule-based reply
+# replaces whatever was streamed. A client that disconnects before "done" gets no bot message.
+
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+def _stream_reply(message: str, user_id: str, history_rows):
+    if config.USE_LLM:
+        try:
+            from .services.llm import stream_chat_with_llm
+            yield from stream_chat_with_llm(message, user_id, history_rows)
+            metrics.reply_path.inc(path="llm")
+            return
+        except Exception:
+            logger.exception("streaming LLM path failed; falling back to rules")
+        yield "reply", {"text": _rules_reply(message, user_id, "fallback")}
+        return
+    yield "reply", {"text": _rules_reply(message, user_id, "rules")}
+
+async def _astream_reply(message: str, user_id: str, history_rows):
+    if config.USE_LLM:
+        try:
+            from .services.llm import astream_chat_with_llm
+            async for event in astream_chat_with_llm(message, user_id, history_rows):
+                yield event
+            metrics.reply_path.inc(path="llm")
+            return
+        except Exception:
+            logger.exception("streaming LLM path failed; falling back to rules")
+        yield "reply", {"text": await run_in_threadpool(_rules_reply, message, user_id, "fallback")}
+        return
+    yield "reply", {"text": await run_in_threadpool(_rules_reply, message, user_id, "rules")}
+
+def chat_stream(req: ChatRequest):
+    session_id, history_rows = begin_turn(req.userId, req.sessionId, req.message, history_limit=10)
+
+    def events():
+        yield _sse("session", {"sessionId": session_id})
+        reply_text = ""
+        for event, data in _stream_reply(req.message, req.userId, history_rows):
+            if event == "reply":
+                reply_text = data["text"]
+            else:
+                yield _sse(event, data)
+        finish_turn(session_id, reply_text)
+        yield _sse("done", {"reply": reply_text, "sessionId": session_id})
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+async def chat_stream_async(req: ChatRequest):
+    session_id, history_rows = await abegin_turn(req.userId, req.sessionId, req.message, history_limit=10)
+
+    async def events():
+        yield _sse("session", {"sessionId": session_id})
+        reply_text = ""
+        async for event, data in _astream_reply(req.message, req.userId, history_rows):
+            if event == "reply":
+                reply_text = data["text"]
+            else:
+                yield _sse(event, data)
+        await afinish_turn(session_id, reply_text)
+        yield _sse("done", {"reply": reply_text, "sessionId": session_id})
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+app.add_api_route(
+    "/chat/stream",
+    chat_stream_async if config.ASYNC_CHAT else chat_stream,
+    methods=["POST"],
+    response_class=StreamingResponse,
+)
+
+# ---------- Availability (multi-day / next opening / per location) ----------
+
+def _slots_out(slots):
+    return [{"start": s, "end": e} for s, e in slots]
+
+def _range_out(provider: str, duration_minutes: int, by_day):
+    days = [{"date": d, "slots": _slots_out(slots)} for d, slots in by_day.items()]
+    return {"provider": provider, "durationMinutes": duration_minutes, "days": days}
+
+def availability_range(
+    from_: date = Query(..., alias="from", description="First clinic-local day (inclusive)"),
+    to: date = Query(..., description="Last clinic-local day (exclusive)"),
+    provider: str = config.DEFAULT_PROVIDER,
+    duration_minutes: int = Query(config.DEFAULT_APPT_MIN, alias="durationMinutes", ge=5, le=480),
+    limit_per_day: int = Query(10, alias="limitPerDay", ge=1, le=200),
+):
+    try:
+        by_day = list_available_slots_range(from_, to, provider, duration_minutes, limit_per_day)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return _range_out(provider, duration_minutes, by_day)
+
+async def availability_range_async(
+    from_: date = Query(..., alias="from", description="First clinic-local day (inclusive)"),
+    to: date = Query(..., description="Last clinic-local day (exclusive)"),
+    provider: str = config.DEFAULT_PROVIDER,
+    duration_minutes: int = Query(config.DEFAULT_APPT_MIN, alias="durationMinutes", ge=5, le=480),
+    limit_per_day: int = Query(10, alias="limitPerDay", ge=1, le=200),
+):
+    try:
+        by_day = await alist_available_slots_range(from_, to, provider, duration_minutes, limit_per_day)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return _range_out(provider, duration_minutes, by_day)
+
+def availability_next(
+    after: Optional[datetime] = Query(None, description="Earliest start (default: now; naive = clinic tz)"),
+    count: int = Query(5, ge=1, le=50),
+    provider: str = config.DEFAULT_PROVIDER,
+    duration_minutes: int = Query(config.DEFAULT_APPT_MIN, alias="durationMinutes", ge=5, le=480),
+):
+    slots = find_next_slots(after, count, provider, duration_minutes)
+    return {"provider": provider, "durationMinutes": duration_minutes, "slots": _slots_out(slots)}
+
+async def availability_next_async(
+    after: Optional[datetime] = Query(None, description="Earliest start (default: now; naive = clinic tz)"),
+    count: int = Query(5, ge=1, le=50),
+    provider: str = config.DEFAULT_PROVIDER,
+    duration_minutes: int = Query(config.DEFAULT_APPT_MIN, alias="durationMinutes", ge=5, le=480),
+):
+    slots = await afind_next_slots(after, count, provider, duration_minutes)
+    return {"provider": provider, "durationMinutes": duration_minutes, "slots": _slots_out(slots)}
+
+app.add_api_route(
+    "/availability",
+    availability_range_async if config.ASYNC_CHAT else availability_range,
+    methods=["GET"],
+    response_model=AvailabilityRangeResponse,
+)
+app.add_api_route(
+    "/availability/next",
+    availability_next_async if config.ASYNC_CHAT else availability_next,
+    methods=["GET"],
+    response_model=NextAvailabilityResponse,
+)
+
+def _location_out(location: str, duration_minutes: int, by_provider):
+    staff = [
+        {"provider": name, "days": [{"date": d, "slots": _slots_out(slots)} for d, slots in by_day.items()]}
+        for name, by_day in by_provider.items()
+    ]
+    return {"location": location, "durationMinutes": duration_minutes, "providers": staff}
+
+def _any_out(location: str, day: date, duration_minutes: int, slots):
+    return {
+        "location": location,
+        "date": day,
+        "durationMinutes": duration_minutes,
+        "slots": [{"start": s, "end": e, "provider": p} for s, e, p in slots],
+    }
+
+def availability_location(
+    from_: date = Query(..., alias="from", description="First clinic-local day (inclusive)"),
+    to: date = Query(..., description="Last clinic-local day (exclusive)"),
+    location: str = config.DEFAULT_LOCATION,
+    duration_minutes: int = Query(config.DEFAULT_APPT_MIN, alias="durationMinutes", ge=5, le=480),
+    limit_per_day: int = Query(10, alias="limitPerDay", ge=1, le=200),
+):
+    try:
+        by_provider = list_location_slots_range(from_, to, location, duration_minutes, limit_per_day)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return _location_out(location, duration_minutes, by_provider)
+
+async def availability_location_async(
+    from_: date = Query(..., alias="from", description="First clinic-local day (inclusive)"),
+    to: date = Query(..., description="Last clinic-local day (exclusive)"),
+    location: str = config.DEFAULT_LOCATION,
+    duration_minutes: int = Query(config.DEFAULT_APPT_MIN, alias="durationMinutes", ge=5, le=480),
+    limit_per_day: int = Query(10, alias="limitPerDay", ge=1, le=200),
+):
+    try:
+        by_provider = await alist_location_slots_range(from_, to, location, duration_minutes, limit_per_day)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return _location_out(location, duration_minutes, by_provider)
+
+def availability_any(
+    day: date = Query(..., alias="date", description="Clinic-local day"),
+    location: str = config.DEFAULT_LOCATION,
+    duration_minutes: int = Query(config.DEFAULT_APPT_MIN, alias="durationMinutes", ge=5, le=480),
+    limit: int = Query(10, ge=1, le=200),
+):
+    slots = list_any_provider_slots(day, location, duration_minutes, limit)
+    return _any_out(location, day, duration_minutes, slots)
+
+async def availability_any_async(
+    day: date = Query(..., alias="date", description="Clinic-local day"),
+    location: str = config.DEFAULT_LOCATION,
+    duration_minutes: int = Query(config.DEFAULT_APPT_MIN, alias="durationMinutes", ge=5, le=480),
+    limit: int = Query(10, ge=1, le=200),
+):
+    slots = await alist_any_provider_slots(day, location, duration_minutes, limit)
+    return _any_out(location, day, duration_minutes, slots)
+
+app.add_api_route(
+    "/availability/location",
+    availability_location_async if config.ASYNC_CHAT else availability_location,
+    methods=["GET"],
+    response_model=LocationAvailabilityResponse,
+)
+app.add_api_route(
+    "/availability/any",
+    availability_any_async if config.ASYNC_CHAT else availability_any,
+    methods=["GET"],
+    response_model=AnyProviderAvailabilityResponse,
+)
+
+# ---------- Bulk import / export ----------
+
+# The body is read raw: a declared bytes Body would have FastAPI JSON-decode an
+# application/json upload (NDJSON is several documents) and reject it before the handler.
+IMPORT_BODY = {
+    "requestBody": {
+        "required": True,
+        "description": "CSV with a header row, or NDJSON",
+        "content": {bulk.MEDIA_TYPES[bulk.CSV]: {"schema": {"type": "string"}},
+                    bulk.MEDIA_TYPES[bulk.NDJSON]: {"schema": {"type": "string"}}},
+    }
+}
+
+def _import_format(fmt: Optional[str], content_type: Optional[str]) -> str:
+    if fmt is None:
+        media_type = (content_type or "").split(";")[0].strip().lower()
+        fmt = bulk.NDJSON if "json" in media_type else bulk.CSV
+    if fmt not in bulk.FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(bulk.FORMATS)}")
+    return fmt
+
+async def import_appointments(
+    request: Request,
+    fmt: Optional[str] = Query(None, alias="format", description="csv | ndjson (default: from Content-Type)"),
+    dry_run: bool = Query(False, alias="dryRun", description="Run every check, insert nothing"),
+    content_type: Optional[str] = Header(None),
+):
+    fmt = _import_format(fmt, content_type)
+    body = await request.body()
+    try:
+        return await run_in_threadpool(bulk.import_appointments, body, fmt, dry_run)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except bulk.ImportConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+async def import_appointments_async(
+    request: Request,
+    fmt: Optional[str] = Query(None, alias="format", description="csv | ndjson (default: from Content-Type)"),
+    dry_run: bool = Query(False, alias="dryRun", description="Run every check, insert nothing"),
+    content_type: Optional[str] = Header(None),
+):
+    fmt = _import_format(fmt, content_type)
+    body = await request.body()
+    try:
+        return await bulk.aimport_appointments(body, fmt, dry_run)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except bulk.ImportConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+def _export_request(from_: date, to: date, fmt: str):
+    if fmt not in bulk.FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(bulk.FORMATS)}")
+    try:
+        return bulk.export_window(from_, to)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def _export_response(chunks, fmt: str) -> StreamingResponse:
+    headers = {"Content-Disposition": f'attachment; filename="appointments.{fmt}"'}
+    return StreamingResponse(chunks, media_type=bulk.MEDIA_TYPES[fmt], headers=headers)
+
+def export_appointments(
+    from_: date = Query(..., alias="from", description="First clinic-local day (inclusive)"),
+    to: date = Query(..., description="Last clinic-local day (exclusive)"),
+    provider: str = config.DEFAULT_PROVIDER,
+    fmt: str = Query(bulk.CSV, alias="format", description="csv | ndjson"),
+    status: Optional[List[str]] = Query(None, description="Only these statuses (repeatable; default: all)"),
+):
+    window = _export_request(from_, to, fmt)
+    return _export_response(bulk.export_appointments(provider, window, status, fmt), fmt)
+
+async def export_appointments_async(
+    from_: date = Query(..., alias="from", description="First clinic-local day (inclusive)"),
+    to: date = Query(..., description="Last clinic-local day (exclusive)"),
+    provider: str = config.DEFAULT_PROVIDER,
+    fmt: str = Query(bulk.CSV, alias="format", description="csv | ndjson"),
+    status: Optional[List[str]] = Query(None, description="Only these statuses (repeatable; default: all)"),
+):
+    window = _export_request(from_, to, fmt)
+    return _export_response(bulk.aexport_appointments(provider, window, status, fmt), fmt)
+
+app.add_api_route(
+    "/appointments/import",
+    import_appointments_async if config.ASYNC_CHAT else import_appointments,
+    methods=["POST"],
+    response_model=AppointmentImportResponse,
+    openapi_extra=IMPORT_BODY,
+)
+app.add_api_route(
+    "/appointments/export",
+    export_appointments_async if config.ASYNC_CHAT else export_appointments,
+    methods=["GET"],
+    response_class=StreamingResponse,
+)
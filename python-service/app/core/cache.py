@@ -0,0 +1,202 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+from . import metrics
+
+
+class TTLCache:
+    """
+    Thread-safe LRU with a per-entry TTL and hit/miss/eviction counters.
+    maxsize <= 0 or ttl <= 0 disables it (every get is a miss, set is a no-op).
+    """
+
+    def __init__(self, maxsize: int, ttl: float, name: str = "cache"):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.maxsize > 0 and self.ttl > 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                del self._data[key]
+                self.expirations += 1
+            self.misses += 1
+            return default
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        if not self.enabled:
+            return
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def update(self, key: Hashable, fn: Callable[[Any], Any], refresh: bool = False) -> bool:
+        """
+        Replace a live entry with fn(value). Keeps its expiry, or with refresh=True restarts
+        the TTL and marks it most recently used (idle-timeout semantics). False if not cached.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] <= now:
+                return False
+            expires_at = now + self.ttl if refresh else entry[0]
+            self._data[key] = (expires_at, fn(entry[1]))
+            if refresh:
+                self._data.move_to_end(key)
+            return True
+
+    def pop(self, key: Hashable) -> bool:
+        with self._lock:
+            if self._data.pop(key, None) is None:
+                return False
+            self.invalidations += 1
+            return True
+
+    def pop_where(self, predicate: Callable[[Hashable], bool]) -> int:
+        with self._lock:
+            doomed = [k for k in self._data if predicate(k)]
+            for k in doomed:
+                del self._data[k]
+            self.invalidations += len(doomed)
+            return len(doomed)
+
+    def clear(self) -> None:
+        with self._lock:
+            self.invalidations += len(self._data)
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical calls: while one call for a key runs, later callers with
+    the same key wait for it and get its result (or its exception) instead of running again.
+    Nothing is kept once the call finishes. Results are shared, not copied: callers must
+    treat them as read-only.
+
+    do() is for threads, ado() for coroutines on one event loop; the two don't coalesce with
+    each other. enabled=False runs every call.
+    """
+
+    def __init__(self, name: str, enabled: bool = True):
+        self.name = name
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, "_Call"] = {}
+        self._tasks: Dict[Hashable, "asyncio.Task"] = {}
+        self.leaders = 0
+        self.shared = 0
+
+    def _count(self, role: str) -> None:
+        with self._lock:
+            if role == "leader":
+                self.leaders += 1
+            else:
+                self.shared += 1
+        metrics.single_flight.inc(flight=self.name, role=role)
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        if not self.enabled:
+            return fn()
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        if not leader:
+            self._count("shared")
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        self._count("leader")
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    async def ado(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        # The call runs as its own task: a caller that is cancelled (client gone) stops
+        # waiting without cancelling it for the others.
+        if not self.enabled:
+            return await fn()
+        task = self._tasks.get(key)
+        if task is None:
+            self._count("leader")
+            task = self._tasks[key] = asyncio.ensure_future(fn())
+            task.add_done_callback(lambda t: self._finished(key, t))
+        else:
+            self._count("shared")
+        return await asyncio.shield(task)
+
+    def _finished(self, key: Hashable, task: "asyncio.Task") -> None:
+        if self._tasks.get(key) is task:
+            del self._tasks[key]
+        if not task.cancelled():
+            task.exception()  # retrieved here, so an error nobody waited for isn't logged as lost
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "leaders": self.leaders,
+                "shared": self.shared,
+                "in_flight": len(self._calls) + len(self._tasks),
+            }
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
@@ -6,6 +6,25 @@ load_dotenv()
 
 # LLM toggle
 USE_LLM: bool = bool(os.getenv("OPENAI_API_KEY"))
+OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL") or None  # any OpenAI-compatible endpoint
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))
+LLM_HTTP_MAX_CONNECTIONS = int(os.getenv("LLM_HTTP_MAX_CONNECTIONS", "100"))
+LLM_HTTP_MAX_KEEPALIVE = int(os.getenv("LLM_HTTP_MAX_KEEPALIVE", "20"))
+# Read-only tool calls of one model turn run concurrently, at most this many at a time per
+# turn (threads from a shared pool in sync mode, tasks in async mode); 1 runs them in turn
+TOOL_MAX_WORKERS = int(os.getenv("TOOL_MAX_WORKERS", "8"))
+# Threads of that shared pool. 0: sized from request concurrency, i.e. the request threadpool
+# (anyio's limiter) times TOOL_MAX_WORKERS, so a turn never waits for other users' tools
+TOOL_POOL_WORKERS = int(os.getenv("TOOL_POOL_WORKERS", "0"))
+
+# Warm up on startup (imports, date parser, DB pool, model client) before /ready answers 200.
+# Off: ready at once, and each of those costs lands on the first request that needs it.
+WARMUP_ON_STARTUP: bool = os.getenv("WARMUP_ON_STARTUP", "true").strip().lower() in ("1", "true", "yes")
+
+# Execution mode for /chat: "sync" (threadpool + psycopg2) or "async" (event loop + psycopg 3, `ainvoke`)
+CHAT_EXECUTION_MODE = os.getenv("CHAT_EXECUTION_MODE", "sync").strip().lower()
+ASYNC_CHAT: bool = CHAT_EXECUTION_MODE == "async"
 
 # DB
 DB_HOST = os.getenv("POSTGRES_HOST", "postgres")
@@ -18,5 +37,80 @@ DB_NAME = os.getenv("POSTGRES_DB", "dental_chatbot")
 DEFAULT_PROVIDER = os.getenv("DEFAULT_PROVIDER", "Dr. Bob Dentist")
 DEFAULT_LOCATION = os.getenv("DEFAULT_LOCATION", "Downtown Dental Clinic")
 DEFAULT_APPT_MIN = int(os.getenv("DEFAULT_APPT_MINUTES", "30"))
+# Hours of providers without their own (provider_hours), every day
 BUSINESS_START = os.getenv("BUSINESS_START", "09:00")  # HH:MM
 BUSINESS_END = os.getenv("BUSINESS_END", "17:00")      # HH:MM
+# Provider directory (providers / provider_hours) held in-process for this many seconds
+PROVIDER_CACHE_TTL = float(os.getenv("PROVIDER_CACHE_TTL", "300"))
+
+# Bulk appointment import/export (/appointments/import, /appointments/export)
+IMPORT_MAX_ROWS = int(os.getenv("IMPORT_MAX_ROWS", "20000"))                # rows per import request
+EXPORT_FETCH_SIZE = int(os.getenv("EXPORT_FETCH_SIZE", "1000"))             # rows per server-side cursor fetch
+EXPORT_MAX_RANGE_DAYS = int(os.getenv("EXPORT_MAX_RANGE_DAYS", "366"))      # longest export window
+
+# DB connection pool
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "1"))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "5"))            # seconds to wait for a free connection
+DB_POOL_PING_AFTER = float(os.getenv("DB_POOL_PING_AFTER", "30"))     # idle seconds before a checkout is health-checked
+DB_POOL_MAX_IDLE = float(os.getenv("DB_POOL_MAX_IDLE", "300"))        # idle seconds before a connection is recycled
+DB_POOL_MAX_LIFETIME = float(os.getenv("DB_POOL_MAX_LIFETIME", "3600"))  # seconds before a connection is recycled
+
+# Date parsing: LRU entries of memoized dateparser results (0 disables the cache)
+DATE_PARSE_CACHE_SIZE = int(os.getenv("DATE_PARSE_CACHE_SIZE", "2048"))
+
+# Availability index: per-(provider, day) occupancy kept in-process
+AVAILABILITY_CACHE_TTL = float(os.getenv("AVAILABILITY_CACHE_TTL", "60"))     # seconds; 0 disables
+AVAILABILITY_CACHE_SIZE = int(os.getenv("AVAILABILITY_CACHE_SIZE", "4096"))  # provider-days
+# Multi-day availability: widest [from, to) window and how far "next available" looks ahead
+AVAILABILITY_MAX_RANGE_DAYS = int(os.getenv("AVAILABILITY_MAX_RANGE_DAYS", "31"))
+AVAILABILITY_SEARCH_DAYS = int(os.getenv("AVAILABILITY_SEARCH_DAYS", "60"))
+# Availability misses read the per-(provider, day) summary maintained by triggers
+# (migrations/003_appointment_occupancy.sql) instead of scanning appointments
+OCCUPANCY_SUMMARY: bool = os.getenv("OCCUPANCY_SUMMARY", "true").strip().lower() in ("1", "true", "yes")
+# Identical availability lookups running at the same time in a worker share one DB read
+SINGLE_FLIGHT_LOOKUPS: bool = os.getenv("SINGLE_FLIGHT_LOOKUPS", "true").strip().lower() in ("1", "true", "yes")
+
+# chat_messages persistence: "sync" (written inside the turn's statements) or "write_behind"
+# (queued in-process, flushed in batches by a background thread)
+CHAT_LOG_MODE = os.getenv("CHAT_LOG_MODE", "sync").strip().lower()
+WRITE_BEHIND_LOG: bool = CHAT_LOG_MODE == "write_behind"
+CHAT_LOG_QUEUE_MAX = int(os.getenv("CHAT_LOG_QUEUE_MAX", "10000"))          # queued messages before backpressure
+CHAT_LOG_BATCH_SIZE = int(os.getenv("CHAT_LOG_BATCH_SIZE", "500"))          # rows per multi-row INSERT
+CHAT_LOG_FLUSH_MS = float(os.getenv("CHAT_LOG_FLUSH_MS", "50"))             # max age of a partial batch
+CHAT_LOG_ENQUEUE_TIMEOUT = float(os.getenv("CHAT_LOG_ENQUEUE_TIMEOUT", "1"))  # seconds to wait on a full queue, then write inline
+CHAT_LOG_SHUTDOWN_TIMEOUT = float(os.getenv("CHAT_LOG_SHUTDOWN_TIMEOUT", "10"))
+# chat_messages is partitioned by month: months of partitions kept created ahead, and after how
+# many days a month is compacted into chat_transcripts and dropped (0 keeps every message).
+# Each worker checks every CHAT_ARCHIVE_INTERVAL seconds (0 disables; run the CLI instead).
+CHAT_PARTITIONS_AHEAD = int(os.getenv("CHAT_PARTITIONS_AHEAD", "3"))
+CHAT_MESSAGES_RETENTION_DAYS = int(os.getenv("CHAT_MESSAGES_RETENTION_DAYS", "0"))
+CHAT_ARCHIVE_INTERVAL = float(os.getenv("CHAT_ARCHIVE_INTERVAL", "21600"))
+# /chat idempotency keys (migrations/005_chat_requests.sql): how long a response is replayed,
+# how long a retry waits for the first request still running on another worker, and after
+# how long an unfinished claim (its worker died) is taken over (seconds)
+IDEMPOTENCY_TTL = float(os.getenv("IDEMPOTENCY_TTL", "86400"))
+IDEMPOTENCY_WAIT = float(os.getenv("IDEMPOTENCY_WAIT", "30"))
+IDEMPOTENCY_STALE = float(os.getenv("IDEMPOTENCY_STALE", "120"))
+
+# Per-session history cache: last HISTORY_WINDOW messages of recently active sessions.
+# Entries expire after HISTORY_CACHE_IDLE seconds without a message (0 disables the cache).
+HISTORY_WINDOW = int(os.getenv("HISTORY_WINDOW", "10"))
+HISTORY_CACHE_SIZE = int(os.getenv("HISTORY_CACHE_SIZE", "10000"))  # sessions
+HISTORY_CACHE_IDLE = float(os.getenv("HISTORY_CACHE_IDLE", "900"))
+
+# LLM plan cache: the model's tool calls / text per (message, clinic day, history), so
+# repeated questions skip the model (seconds; 0 disables)
+PLAN_CACHE_TTL = float(os.getenv("PLAN_CACHE_TTL", "600"))
+PLAN_CACHE_SIZE = int(os.getenv("PLAN_CACHE_SIZE", "10000"))
+# check_availability payloads per (provider, day); dropped when that day is booked
+TOOL_CACHE_TTL = float(os.getenv("TOOL_CACHE_TTL", "10"))
+TOOL_CACHE_SIZE = int(os.getenv("TOOL_CACHE_SIZE", "2048"))
+
+# Cross-worker cache coherence: writes publish an event on this Postgres NOTIFY channel and
+# every worker's listener updates/drops its cached entries (availability, payloads, history)
+CACHE_INVALIDATION: bool = os.getenv("CACHE_INVALIDATION", "true").strip().lower() in ("1", "true", "yes")
+CACHE_INVALIDATION_CHANNEL = os.getenv("CACHE_INVALIDATION_CHANNEL", "cache_invalidation")
+
+# Metrics (/metrics): also send each /chat response's stage timings as a Server-Timing header
+METRICS_TIMING_HEADER: bool = os.getenv("METRICS_TIMING_HEADER", "false").strip().lower() in ("1", "true", "yes")
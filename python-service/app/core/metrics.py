@@ -0,0 +1,255 @@
+# app/core/metrics.py
+#
+# In-process Prometheus metrics (text exposition format 0.0.4, no client library).
+# Hot-path stages are timed with `stage(name)`, which feeds the process-wide
+# chat_stage_seconds histogram and, inside a request, that request's own timings.
+# Per-request state lives in a ContextVar, so it follows the request into threadpool
+# workers, tool-executor threads and asyncio tasks (they all run in a copy of its context
+# that shares the same RequestTimings object).
+
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from . import config
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 4, 6, 8, 12, 16, 24, 32)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _num(v: float) -> str:
+    if v == float("inf"):
+        return "+Inf"
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[LabelValues, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = tuple(labels[n] for n in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(self.labelnames, key)} {_num(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[LabelValues, List[float]] = {}  # per-bucket counts (+Inf last), then sum
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = tuple(labels[n] for n in self.labelnames)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[i] += 1
+            series[-1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = sorted((k, list(v)) for k, v in self._series.items())
+        for key, series in snapshot:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), series[:-1]):
+                cumulative += n
+                le = _labels(self.labelnames, key, f'le="{_num(bound)}"')
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_num(series[-1])}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+request_seconds = Histogram("chat_request_seconds", "End-to-end latency of chat requests.", ("route",))
+stage_seconds = Histogram(
+    "chat_stage_seconds", "Time spent in one stage of the chat hot path (tools as tool.<name>).", ("stage",)
+)
+request_db_round_trips = Histogram(
+    "chat_request_db_round_trips", "Postgres round trips made on behalf of one chat request.", ("route",),
+    buckets=COUNT_BUCKETS,
+)
+reply_path = Counter(
+    "chat_reply_path_total", "Chat replies by path: llm, rules (LLM disabled) or fallback (LLM failed).", ("path",)
+)
+db_round_trips = Counter("db_round_trips_total", "Postgres round trips (statements, BEGIN, COMMIT, ROLLBACK).")
+single_flight = Counter(
+    "single_flight_calls_total",
+    "Coalesced calls (core.cache.SingleFlight): leader ran it, shared waited for a leader's result.",
+    ("flight", "role"),
+)
+idempotent_requests = Counter(
+    "chat_idempotent_requests_total",
+    "/chat requests with an idempotency key by outcome: executed, attached (to one in flight), "
+    "replayed (stored response), conflict (key reused for another body), in_progress (gave up waiting).",
+    ("outcome",),
+)
+tool_fanout = Counter(
+    "chat_tool_fanout_total",
+    "Sync model turns with several read-only tool calls by how they ran: pooled (on the shared tool "
+    "pool) or inline (pool fully taken by other turns, calls run one after another).",
+    ("how",),
+)
+
+REGISTRY = (
+    request_seconds, stage_seconds, request_db_round_trips, reply_path, db_round_trips, single_flight,
+    idempotent_requests, tool_fanout,
+)
+
+# In-process caches (core.cache.TTLCache), reported from their own counters at render time
+_caches: List[Any] = []
+
+CACHE_SERIES = (
+    ("cache_hits_total", "counter", "Cache lookups that found a live entry.", "hits"),
+    ("cache_misses_total", "counter", "Cache lookups that found nothing (or an expired entry).", "misses"),
+    ("cache_evictions_total", "counter", "Entries evicted to stay within maxsize.", "evictions"),
+    ("cache_entries", "gauge", "Entries currently held.", "size"),
+)
+
+
+def register_cache(cache) -> None:
+    _caches.append(cache)
+
+
+def _render_caches() -> List[str]:
+    stats = [(cache.name, cache.stats()) for cache in _caches]
+    lines = []
+    for name, kind, help, field in CACHE_SERIES:
+        lines += [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+        lines += [f"{name}{_labels(('cache',), (cache,))} {s[field]}" for cache, s in stats]
+    return lines
+
+
+def render() -> str:
+    lines = [line for metric in REGISTRY for line in metric.render()]
+    return "\n".join(lines + _render_caches()) + "\n"
+
+
+# ---------- Per-request timings ----------
+
+class RequestTimings:
+    """Stage durations (summed per stage) and DB round trips of one request."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+        self.db_round_trips = 0
+        self._lock = threading.Lock()
+
+    def add(self, name: str, seconds: float) -> None:
+        with self._lock:
+            self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def count_round_trips(self, n: int) -> None:
+        with self._lock:
+            self.db_round_trips += n
+
+    def server_timing(self) -> str:
+        """Server-Timing header value (durations in ms)."""
+        with self._lock:
+            stages = list(self.stages.items())
+            trips = self.db_round_trips
+        parts = [f"{name};dur={seconds * 1000:.2f}" for name, seconds in stages]
+        parts.append(f'db;desc="{trips} round trips"')
+        parts.append(f"total;dur={(time.perf_counter() - self.started) * 1000:.2f}")
+        return ", ".join(parts)
+
+
+_current: ContextVar[Optional[RequestTimings]] = ContextVar("request_timings", default=None)
+
+
+def current() -> Optional[RequestTimings]:
+    return _current.get()
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Time a block (or, as a decorator, a function) as hot-path stage `name`."""
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - t0
+        stage_seconds.observe(elapsed, stage=name)
+        timings = _current.get()
+        if timings is not None:
+            timings.add(name, elapsed)
+
+
+def count_db_round_trips(n: int = 1) -> None:
+    db_round_trips.inc(n)
+    timings = _current.get()
+    if timings is not None:
+        timings.count_round_trips(n)
+
+
+class RequestMetricsMiddleware:
+    """
+    ASGI middleware: gives every request under `prefixes` its own RequestTimings, and
+    records its latency and DB round trips once the response body is complete. With
+    METRICS_TIMING_HEADER on, non-streaming responses carry a Server-Timing header (plus
+    X-DB-Round-Trips) with this request's stages.
+    """
+
+    def __init__(self, app, prefixes: Sequence[str] = ("/chat",)):
+        self.app = app
+        self.prefixes = tuple(prefixes)
+
+    async def __call__(self, scope, receive, send):
+        path = scope.get("path", "")
+        if scope["type"] != "http" or not path.startswith(self.prefixes):
+            await self.app(scope, receive, send)
+            return
+
+        timings = RequestTimings()
+        token = _current.set(timings)
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start" and config.METRICS_TIMING_HEADER:
+                headers = dict((k.lower(), v) for k, v in message.get("headers", []))
+                if not headers.get(b"content-type", b"").startswith(b"text/event-stream"):
+                    message["headers"] = list(message.get("headers", [])) + [
+                        (b"server-timing", timings.server_timing().encode("latin-1")),
+                        (b"x-db-round-trips", str(timings.db_round_trips).encode("latin-1")),
+                    ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
+            request_seconds.observe(time.perf_counter() - timings.started, route=path)
+            request_db_round_trips.observe(timings.db_round_trips, route=path)
@@ -1,16 +1,372 @@
-from typing import Generator
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Deque, Dict, Generator, Optional, Tuple
+
 import psycopg2
+from psycopg2 import extensions
 from psycopg2.extras import RealDictCursor
-from .core import config
+from psycopg2.pool import PoolError
+
+from .core import config, metrics
+
+logger = logging.getLogger("python-service.db")
+
+
+class PoolTimeout(PoolError):
+    """No connection became free within DB_POOL_TIMEOUT seconds."""
+
+
+# ---------- Round-trip accounting (metrics.count_db_round_trips) ----------
+#
+# Every statement is one round trip, plus the implicit BEGIN psycopg2 sends before the first
+# statement of a transaction, plus COMMIT/ROLLBACK of an open transaction.
+
+_counting_cursors: Dict[type, type] = {}
+
+
+def _counting_cursor(factory: type) -> type:
+    cls = _counting_cursors.get(factory)
+    if cls is None:
+        def _count(cur, statements: int = 1) -> None:
+            conn = cur.connection
+            begins = not conn.autocommit and conn.get_transaction_status() == extensions.TRANSACTION_STATUS_IDLE
+            metrics.count_db_round_trips(statements + int(begins))
+
+        def execute(cur, query, vars=None):
+            _count(cur)
+            return factory.execute(cur, query, vars)
+
+        def executemany(cur, query, vars_list):
+            vars_list = list(vars_list)
+            _count(cur, len(vars_list))
+            return factory.executemany(cur, query, vars_list)
+
+        def copy_expert(cur, sql, file, size=8192):
+            _count(cur)
+            return factory.copy_expert(cur, sql, file, size)
+
+        cls = type(
+            f"Counting{factory.__name__}", (factory,),
+            {"execute": execute, "executemany": executemany, "copy_expert": copy_expert},
+        )
+        _counting_cursors[factory] = cls
+    return cls
 
-def db_conn():
+
+class CountingConnection(extensions.connection):
+    """psycopg2 connection whose cursors (whatever their factory) count round trips."""
+
+    def cursor(self, *args, **kwargs):
+        factory = kwargs.get("cursor_factory") or self.cursor_factory or extensions.cursor
+        kwargs["cursor_factory"] = _counting_cursor(factory)
+        return super().cursor(*args, **kwargs)
+
+    def _ends_transaction(self) -> None:
+        if not self.closed and self.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+            metrics.count_db_round_trips()
+
+    def commit(self):
+        self._ends_transaction()
+        return super().commit()
+
+    def rollback(self):
+        self._ends_transaction()
+        return super().rollback()
+
+
+def _connect():
     return psycopg2.connect(
         host=config.DB_HOST,
         port=config.DB_PORT,
         user=config.DB_USER,
         password=config.DB_PASSWORD,
         dbname=config.DB_NAME,
+        connection_factory=CountingConnection,
     )
 
+
+class ConnectionPool:
+    """
+    Thread-safe, bounded psycopg2 pool.
+
+    - keeps between `minconn` and `maxconn` connections open
+    - blocks up to `timeout` seconds when exhausted, then raises PoolTimeout
+    - pings connections that sat idle longer than `ping_after` before handing them out
+    - closes connections idle longer than `max_idle` or older than `max_lifetime`
+    """
+
+    def __init__(
+        self,
+        connect: Callable[[], Any] = _connect,
+        minconn: int = config.DB_POOL_MIN,
+        maxconn: int = config.DB_POOL_MAX,
+        timeout: float = config.DB_POOL_TIMEOUT,
+        ping_after: float = config.DB_POOL_PING_AFTER,
+        max_idle: float = config.DB_POOL_MAX_IDLE,
+        max_lifetime: float = config.DB_POOL_MAX_LIFETIME,
+    ):
+        self._connect = connect
+        self.minconn = max(0, minconn)
+        self.maxconn = max(1, maxconn, self.minconn)
+        self.timeout = timeout
+        self.ping_after = ping_after
+        self.max_idle = max_idle
+        self.max_lifetime = max_lifetime
+
+        self._cond = threading.Condition()
+        self._idle: Deque[Tuple[Any, float]] = deque()  # (conn, last_used), most recent on the right
+        self._born: Dict[int, float] = {}                # id(conn) -> created_at
+        self._size = 0
+        self._waiting = 0
+        self._closed = False
+        self._counters = {
+            "checkouts": 0,
+            "created": 0,
+            "closed": 0,
+            "recycled_idle": 0,
+            "recycled_lifetime": 0,
+            "failed_health_checks": 0,
+            "waits": 0,
+            "exhausted": 0,
+        }
+        self._wait_seconds = 0.0
+
+    # ---------- lifecycle ----------
+
+    def open(self) -> None:
+        """Pre-open `minconn` connections; failures are logged, not raised."""
+        for _ in range(self.minconn):
+            with self._cond:
+                if self._size >= self.minconn:
+                    return
+                self._size += 1
+            try:
+                conn = self._new_conn()
+            except Exception as e:
+                with self._cond:
+                    self._size -= 1
+                    self._cond.notify()
+                logger.warning("db pool prefill failed: %s", e)
+                return
+            with self._cond:
+                self._idle.append((conn, time.monotonic()))
+                self._cond.notify()
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            idle = [c for c, _ in self._idle]
+            self._idle.clear()
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for conn in idle:
+            self._close_conn(conn)
+
+    # ---------- checkout / return ----------
+
+    def getconn(self):
+        deadline = time.monotonic() + self.timeout
+        waited_since: Optional[float] = None
+        while True:
+            stale = []
+            conn = None
+            with self._cond:
+                if self._closed:
+                    raise PoolError("connection pool is closed")
+                now = time.monotonic()
+                # Recycle connections that idled too long (oldest are on the left)
+                while self._idle and self._size > self.minconn and now - self._idle[0][1] > self.max_idle:
+                    stale.append(self._idle.popleft()[0])
+                    self._size -= 1
+                    self._counters["recycled_idle"] += 1
+
+                if self._idle:
+                    conn, last_used = self._idle.pop()
+                elif self._size < self.maxconn:
+                    self._size += 1
+                    last_used = None
+                else:
+                    if waited_since is None:
+                        waited_since = now
+                        self._counters["waits"] += 1
+                    remaining = deadline - now
+                    if remaining <= 0:
+                        self._counters["exhausted"] += 1
+                        self._wait_seconds += now - waited_since
+                        raise PoolTimeout(
+                            f"connection pool exhausted ({self.maxconn} in use) after {self.timeout:.1f}s"
+                        )
+                    self._waiting += 1
+                    try:
+                        self._cond.wait(remaining)
+                    finally:
+                        self._waiting -= 1
+                    continue
+
+            for s in stale:
+                self._close_conn(s)
+
+            if conn is None:
+                try:
+                    conn = self._new_conn()
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+            elif not self._healthy(conn, last_used):
+                self._discard(conn)
+                continue
+
+            with self._cond:
+                self._counters["checkouts"] += 1
+                if waited_since is not None:
+                    self._wait_seconds += time.monotonic() - waited_since
+            return conn
+
+    def putconn(self, conn, discard: bool = False) -> None:
+        if not discard and not conn.closed:
+            try:
+                if conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+                if conn.autocommit:
+                    conn.autocommit = False
+            except Exception:
+                discard = True
+        if discard or conn.closed:
+            self._discard(conn)
+            return
+        if time.monotonic() - self._born.get(id(conn), 0.0) > self.max_lifetime:
+            with self._cond:
+                self._counters["recycled_lifetime"] += 1
+            self._discard(conn)
+            return
+        with self._cond:
+            if self._closed:
+                self._size -= 1
+                to_close = conn
+            else:
+                self._idle.append((conn, time.monotonic()))
+                to_close = None
+            self._cond.notify()
+        if to_close is not None:
+            self._close_conn(to_close)
+
+    # ---------- metrics ----------
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            idle = len(self._idle)
+            return {
+                "size": self._size,
+                "idle": idle,
+                "in_use": self._size - idle,
+                "waiting": self._waiting,
+                "min": self.minconn,
+                "max": self.maxconn,
+                **self._counters,
+                "wait_seconds_total": round(self._wait_seconds, 6),
+            }
+
+    # ---------- internals ----------
+
+    def _new_conn(self):
+        conn = self._connect()
+        with self._cond:
+            self._born[id(conn)] = time.monotonic()
+            self._counters["created"] += 1
+        return conn
+
+    def _healthy(self, conn, last_used: float) -> bool:
+        if conn.closed:
+            return False
+        if time.monotonic() - last_used < self.ping_after:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except Exception as e:
+            with self._cond:
+                self._counters["failed_health_checks"] += 1
+            logger.warning("db pool health check failed, reconnecting: %s", e)
+            return False
+
+    def _discard(self, conn) -> None:
+        with self._cond:
+            self._size -= 1
+            self._cond.notify()
+        self._close_conn(conn)
+
+    def _close_conn(self, conn) -> None:
+        with self._cond:
+            self._born.pop(id(conn), None)
+            self._counters["closed"] += 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+
+_pool: Optional[ConnectionPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    """Process-wide pool, created (and prefilled) on first use."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                pool = ConnectionPool()
+                pool.open()
+                _pool = pool
+    return _pool
+
+
+def close_pool() -> None:
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.close()
+
+
+def pool_stats() -> Dict[str, Any]:
+    return _pool.stats() if _pool is not None else {}
+
+
+@contextmanager
+def db_conn(autocommit: bool = False) -> Generator[Any, None, None]:
+    """
+    Borrow a pooled connection. Same transaction semantics as `with psycopg2.connect() as conn`:
+    commit on success, rollback on error. The connection goes back to the pool afterwards.
+
+    autocommit=True skips the implicit BEGIN/COMMIT; use it for single statements that are
+    atomic on their own so they cost exactly one round trip.
+    """
+    pool = get_pool()
+    conn = pool.getconn()
+    if autocommit:
+        conn.autocommit = True
+    try:
+        yield conn
+        if not conn.closed:
+            conn.commit()
+    except BaseException:
+        if not conn.closed:
+            try:
+                conn.rollback()
+            except Exception:
+                pass
+        raise
+    finally:
+        pool.putconn(conn, discard=bool(conn.closed))
+
+
 def dict_cursor(conn):
     return conn.cursor(cursor_factory=RealDictCursor)
@@ -1,11 +1,64 @@
-from typing import Optional
+from datetime import date, datetime
+from typing import List, Optional
 from pydantic import BaseModel, Field
 
 class ChatRequest(BaseModel):
     userId: str = Field(..., description="UUID of the user")
     sessionId: Optional[str] = Field(None, description="UUID of the chat session")
     message: str
+    idempotencyKey: Optional[str] = Field(None, max_length=255, description="Retries with the same key replay the first response")
 
 class ChatResponse(BaseModel):
     reply: str
     sessionId: str
+
+class Slot(BaseModel):
+    start: datetime
+    end: datetime
+
+class DayAvailability(BaseModel):
+    date: date
+    slots: List[Slot]
+
+class AvailabilityRangeResponse(BaseModel):
+    provider: str
+    durationMinutes: int
+    days: List[DayAvailability]
+
+class NextAvailabilityResponse(BaseModel):
+    provider: str
+    durationMinutes: int
+    slots: List[Slot]
+
+class ProviderAvailability(BaseModel):
+    provider: str
+    days: List[DayAvailability]
+
+class LocationAvailabilityResponse(BaseModel):
+    location: str
+    durationMinutes: int
+    providers: List[ProviderAvailability]
+
+class ProviderSlot(Slot):
+    provider: str
+
+class AnyProviderAvailabilityResponse(BaseModel):
+    location: str
+    date: date
+    durationMinutes: int
+    slots: List[ProviderSlot]
+
+class ImportedAppointment(BaseModel):
+    row: int
+    id: Optional[str] = None  # None on a dry run
+
+class ImportRejection(BaseModel):
+    row: int
+    reason: str
+
+class AppointmentImportResponse(BaseModel):
+    received: int
+    imported: int
+    dryRun: bool
+    appointments: List[ImportedAppointment]
+    rejected: List[ImportRejection]
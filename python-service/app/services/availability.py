@@ -0,0 +1,407 @@
+# app/services/availability.py
+#
+# In-process occupancy index for list_available_slots.
+# One entry per (provider, clinic-local day): an int bitmask with bit i set when minute i
+# after local midnight is taken by a pending/confirmed appointment. Checking a slot is a
+# single AND against a precomputed mask, so repeated "slots tomorrow?" questions are served
+# without a DB round trip. Entries are warmed lazily from Postgres (a multi-day request loads
+# all of its uncached days in one range query), updated write-through by
+# create_appointment, updated the same way for other workers' bookings by the invalidation
+# listener (services/invalidation.py), and evicted by TTL/LRU (with CACHE_INVALIDATION off,
+# another worker's bookings show up after at most AVAILABILITY_CACHE_TTL seconds). Lookups
+# over several providers (a whole clinic) load all of their uncached provider-days with one
+# query too, and free slots for all of them are computed in one batched bitset pass
+# (free_starts).
+#
+# With OCCUPANCY_SUMMARY on, a miss reads the maintained per-(provider, day) summary
+# (appointment_occupancy, kept current by triggers on appointments; see
+# services/occupancy.py) – one small row per busy provider-day – instead of folding the raw
+# appointment rows. Without the summary tables, or with a summary cut in another time zone,
+# misses fall back to the appointment scan.
+
+import logging
+import threading
+from datetime import date, datetime, time, timedelta
+from functools import lru_cache
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from psycopg2.extras import RealDictCursor
+
+from ..core import config, metrics
+from ..core.cache import TTLCache
+from ..db import db_conn
+from ..adb import adb_conn, adict_cursor
+
+# Appointments of the given providers overlapping [window_start, window_end) – one clinic
+# day or a run of them.
+# The start_time lower bound (one day of slack for appointments running past midnight)
+# keeps it a range scan on idx_appointments_provider_time.
+APPOINTMENTS_IN_WINDOW_SQL = """
+    SELECT provider_name, start_time, end_time
+    FROM appointments
+    WHERE provider_name = ANY(%s)
+      AND status IN ('pending','confirmed')
+      AND start_time >= %s
+      AND start_time < %s
+      AND end_time > %s
+"""
+
+# Busy minutes per (provider, day) from the summary; the settings row always comes back, so
+# an empty result means the summary holds nothing for these provider-days (all free).
+OCCUPANCY_SUMMARY_SQL = """
+    SELECT s.tz, o.provider_name, o.day, o.occupancy::text AS occupancy
+    FROM appointment_occupancy_settings s
+    LEFT JOIN appointment_occupancy o
+      ON o.provider_name = ANY(%s) AND o.day = ANY(%s::date[])
+"""
+
+UNDEFINED_TABLE = "42P01"
+
+logger = logging.getLogger("python-service.availability")
+
+_index = TTLCache(config.AVAILABILITY_CACHE_SIZE, config.AVAILABILITY_CACHE_TTL, name="availability")
+metrics.register_cache(_index)
+
+# Bumped by every write-through; a warm-up that raced with a booking doesn't cache its
+# (possibly stale) snapshot.
+_write_seq = 0
+_write_lock = threading.Lock()
+
+# Cleared for the life of the process when the summary tables are missing
+_summary_available = config.OCCUPANCY_SUMMARY
+
+
+def day_bounds(day: date, tz) -> Tuple[datetime, datetime]:
+    """[local midnight, next local midnight) – 23/25 h on DST days."""
+    return (
+        datetime.combine(day, time(0, 0), tzinfo=tz),
+        datetime.combine(day + timedelta(days=1), time(0, 0), tzinfo=tz),
+    )
+
+
+def _key(provider: str, day: date, tz) -> Tuple[str, date, str]:
+    return (provider, day, str(tz))
+
+
+def _minute_span(start: datetime, end: datetime, day_start: datetime, day_end: datetime) -> Tuple[int, int]:
+    """Minute offsets of [start, end) clipped to the day; partial minutes count as taken."""
+    lo = max(start, day_start)
+    hi = min(end, day_end)
+    first = int((lo - day_start).total_seconds() // 60)
+    last = -int(-(hi - day_start).total_seconds() // 60)
+    return first, last
+
+
+def _span_mask(first: int, last: int) -> int:
+    return ((1 << (last - first)) - 1) << first if last > first else 0
+
+
+def _as_tz(dt: datetime, tz) -> datetime:
+    # DB may store naive timestamps; reattach tz. Aware ones are converted so all minute
+    # arithmetic happens in the clinic zone.
+    return dt.replace(tzinfo=tz) if dt.tzinfo is None else dt.astimezone(tz)
+
+
+def occupancy_by_day(rows: Iterable[Dict[str, Any]], days: Iterable[date], tz) -> Dict[date, int]:
+    """Fold appointment rows into one bitmask per requested clinic-local day."""
+    occ = {d: 0 for d in days}
+    for r in rows:
+        _fold(occ, lambda day: day, r, tz)
+    return occ
+
+
+def occupancy_by_provider_day(
+    rows: Iterable[Dict[str, Any]], providers: Iterable[str], days: Iterable[date], tz
+) -> Dict[Tuple[str, date], int]:
+    """Same, per (provider, day) for rows carrying provider_name."""
+    days = list(days)
+    occ = {(p, d): 0 for p in providers for d in days}
+    for r in rows:
+        provider = r["provider_name"]
+        _fold(occ, lambda day: (provider, day), r, tz)
+    return occ
+
+
+def _fold(occ: Dict[Any, int], key, row: Dict[str, Any], tz) -> None:
+    start, end = _as_tz(row["start_time"], tz), _as_tz(row["end_time"], tz)
+    day = start.date()
+    while day <= end.date():
+        k = key(day)
+        if k in occ:
+            day_start, day_end = day_bounds(day, tz)
+            occ[k] |= _span_mask(*_minute_span(start, end, day_start, day_end))
+        day += timedelta(days=1)
+
+
+def _window_params(providers: List[str], window_start: datetime, window_end: datetime):
+    return (providers, window_start - timedelta(days=1), window_end, window_start)
+
+
+def _bits(text: str) -> int:
+    """VARBIT text ('0011…', minute 0 first) -> the bitmask used here (bit i = minute i)."""
+    return int(text[::-1], 2) if text else 0
+
+
+def occupancy_from_summary(
+    rows: List[Dict[str, Any]], providers: Iterable[str], days: Iterable[date], tz
+) -> Optional[Dict[Tuple[str, date], int]]:
+    """Masks from OCCUPANCY_SUMMARY_SQL rows; None when the summary is cut in another zone."""
+    if not rows or rows[0]["tz"] != str(tz):
+        return None
+    days = list(days)
+    occ = {(p, d): 0 for p in providers for d in days}
+    for r in rows:
+        if r["provider_name"] is not None:
+            occ[(r["provider_name"], r["day"])] = _bits(r["occupancy"])
+    return occ
+
+
+def _summary_missing(exc: Exception) -> bool:
+    global _summary_available
+    if (getattr(exc, "pgcode", None) or getattr(exc, "sqlstate", None)) != UNDEFINED_TABLE:
+        return False
+    _summary_available = False
+    logger.warning("occupancy summary missing (run migrations/003_appointment_occupancy.sql); scanning appointments")
+    return True
+
+
+def _load(providers: List[str], days: List[date], tz) -> Dict[Tuple[str, date], int]:
+    """Occupancy of every (provider, day), from the summary if possible, else the appointments."""
+    with db_conn() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+        if _summary_available:
+            try:
+                cur.execute(OCCUPANCY_SUMMARY_SQL, (providers, days))
+                occ = occupancy_from_summary(cur.fetchall(), providers, days, tz)
+            except Exception as e:
+                if not _summary_missing(e):
+                    raise
+                conn.rollback()
+                occ = None
+            if occ is not None:
+                return occ
+        window_start, window_end = _missing_window(days, tz)
+        cur.execute(APPOINTMENTS_IN_WINDOW_SQL, _window_params(providers, window_start, window_end))
+        return occupancy_by_provider_day(cur.fetchall(), providers, days, tz)
+
+
+async def _aload(providers: List[str], days: List[date], tz) -> Dict[Tuple[str, date], int]:
+    """Async variant of _load."""
+    async with adb_conn() as conn, adict_cursor(conn) as cur:
+        if _summary_available:
+            try:
+                await cur.execute(OCCUPANCY_SUMMARY_SQL, (providers, days))
+                occ = occupancy_from_summary(await cur.fetchall(), providers, days, tz)
+            except Exception as e:
+                if not _summary_missing(e):
+                    raise
+                await conn.rollback()
+                occ = None
+            if occ is not None:
+                return occ
+        window_start, window_end = _missing_window(days, tz)
+        await cur.execute(APPOINTMENTS_IN_WINDOW_SQL, _window_params(providers, window_start, window_end))
+        return occupancy_by_provider_day(await cur.fetchall(), providers, days, tz)
+
+
+def _split_cached(
+    providers: List[str], days: List[date], tz
+) -> Tuple[Dict[Tuple[str, date], int], List[str], List[date]]:
+    """Cached (provider, day) masks, plus the providers and days that still need loading."""
+    cached: Dict[Tuple[str, date], int] = {}
+    missing_providers: Dict[str, None] = {}
+    missing_days = set()
+    for provider in providers:
+        for day in days:
+            occ = _index.get(_key(provider, day, tz))
+            if occ is None:
+                missing_providers[provider] = None
+                missing_days.add(day)
+            else:
+                cached[(provider, day)] = occ
+    return cached, list(missing_providers), sorted(missing_days)
+
+
+def _missing_window(missing: List[date], tz) -> Tuple[datetime, datetime]:
+    """One [start, end) covering every missing day (cached days in between are re-read but not stored)."""
+    return day_bounds(missing[0], tz)[0], day_bounds(missing[-1], tz)[1]
+
+
+def _store(fresh: Dict[Tuple[str, date], int], cached: Dict[Tuple[str, date], int], tz, seq_before: int) -> None:
+    with _write_lock:
+        if _write_seq == seq_before:
+            for (provider, day), occ in fresh.items():
+                if (provider, day) not in cached:
+                    _index.set(_key(provider, day, tz), occ)
+
+
+def providers_days_occupancy(providers: Iterable[str], days: Iterable[date], tz) -> Dict[Tuple[str, date], int]:
+    """
+    Occupancy bitmask per (provider, clinic-local day). Cached entries come from the index;
+    everything else is loaded with a single query over all missing providers/days.
+    """
+    providers = list(dict.fromkeys(providers))
+    days = sorted(set(days))
+    out, missing_providers, missing_days = _split_cached(providers, days, tz)
+    if not missing_providers:
+        return out
+
+    seq_before = _write_seq
+    fresh = _load(missing_providers, missing_days, tz)
+    _store(fresh, out, tz, seq_before)
+    out.update((k, v) for k, v in fresh.items() if k not in out)
+    return out
+
+
+async def aproviders_days_occupancy(providers: Iterable[str], days: Iterable[date], tz) -> Dict[Tuple[str, date], int]:
+    """Async variant of providers_days_occupancy."""
+    providers = list(dict.fromkeys(providers))
+    days = sorted(set(days))
+    out, missing_providers, missing_days = _split_cached(providers, days, tz)
+    if not missing_providers:
+        return out
+
+    seq_before = _write_seq
+    fresh = await _aload(missing_providers, missing_days, tz)
+    _store(fresh, out, tz, seq_before)
+    out.update((k, v) for k, v in fresh.items() if k not in out)
+    return out
+
+
+def days_occupancy(provider: str, days: Iterable[date], tz) -> Dict[date, int]:
+    """Occupancy bitmask per clinic-local day of one provider."""
+    return {day: occ for (_, day), occ in providers_days_occupancy([provider], days, tz).items()}
+
+
+async def adays_occupancy(provider: str, days: Iterable[date], tz) -> Dict[date, int]:
+    """Async variant of days_occupancy."""
+    return {day: occ for (_, day), occ in (await aproviders_days_occupancy([provider], days, tz)).items()}
+
+
+def day_occupancy(provider: str, day: date, tz) -> int:
+    """Occupancy bitmask for the provider's clinic-local day (index hit, else one DB query)."""
+    return days_occupancy(provider, [day], tz)[day]
+
+
+async def aday_occupancy(provider: str, day: date, tz) -> int:
+    """Async variant of day_occupancy."""
+    return (await adays_occupancy(provider, [day], tz))[day]
+
+
+def write_seq() -> int:
+    """Bumped by every booking written through, lost slot and clear(); lookups key on it."""
+    return _write_seq
+
+
+def mark_booked(provider: str, start: datetime, end: datetime) -> None:
+    """Write-through after a committed booking: set its minutes in every cached day it touches."""
+    global _write_seq
+    tz = start.tzinfo
+    with _write_lock:
+        _write_seq += 1
+        day = start.date()
+        while day <= end.date():
+            day_start, day_end = day_bounds(day, tz)
+            if start < day_end and end > day_start:
+                mask = _span_mask(*_minute_span(start, end, day_start, day_end))
+                _index.update(_key(provider, day, tz), lambda occ: occ | mask)
+            day += timedelta(days=1)
+
+
+def invalidate(provider: str, day: date, tz) -> None:
+    _index.pop(_key(provider, day, tz))
+
+
+def clear() -> None:
+    """Drop every entry; loads already in flight don't store their snapshot."""
+    global _write_seq
+    with _write_lock:
+        _write_seq += 1
+        _index.clear()
+
+
+def invalidate_if_free(provider: str, start: datetime, end: datetime) -> None:
+    """
+    After the database rejected [start, end) as overlapping, drop cached days that still
+    show it free (someone else booked it). Days that already know are kept, so a burst of
+    losers for one slot doesn't reload the day over and over.
+    """
+    global _write_seq
+    tz = start.tzinfo
+    with _write_lock:
+        _write_seq += 1
+    day = start.date()
+    while day <= end.date():
+        key = _key(provider, day, tz)
+        occ = _index.get(key)
+        if occ is not None:
+            day_start, day_end = day_bounds(day, tz)
+            if not occ & _span_mask(*_minute_span(start, end, day_start, day_end)):
+                _index.pop(key)
+        day += timedelta(days=1)
+
+
+# ---------- Batched free-slot search ----------
+#
+# A query over many provider-days (every dentist of a clinic, a month of days) is answered
+# in one pass over a single packed bitset instead of a loop per slot: each (provider, day)
+# is a fixed-width row of ROW_BITS minute bits, rows are concatenated into one int, and the
+# "all minutes of [s, s + duration) are free" test is done for every minute of every row at
+# once with O(log duration) shift/AND steps. The slot grid of each row (business-hours spans
+# of that provider on that weekday) is a second packed mask ANDed in at the end; since no
+# grid start runs past its span, nothing leaks across row boundaries.
+
+ROW_BITS = 24 * 60
+_ROW_BYTES = ROW_BITS // 8
+_ROW_MASK = (1 << ROW_BITS) - 1
+
+Spans = Tuple[Tuple[int, int], ...]  # [start, end) minutes after local midnight
+
+
+@lru_cache(maxsize=1024)
+def grid_mask(spans: Spans, duration_minutes: int) -> int:
+    """Bits of the slot starts of a day: each span's start + k * duration, ending within the span."""
+    mask = 0
+    for first, last in spans:
+        for start in range(first, last - duration_minutes + 1, duration_minutes):
+            mask |= 1 << start
+    return mask
+
+
+def _pack(rows: Iterable[int]) -> int:
+    return int.from_bytes(b"".join((r & _ROW_MASK).to_bytes(_ROW_BYTES, "little") for r in rows), "little")
+
+
+def _unpack(packed: int, n: int) -> List[int]:
+    raw = packed.to_bytes(n * _ROW_BYTES, "little")
+    return [int.from_bytes(raw[i * _ROW_BYTES:(i + 1) * _ROW_BYTES], "little") for i in range(n)]
+
+
+def free_starts(occupancy: Sequence[int], spans: Sequence[Spans], duration_minutes: int) -> List[int]:
+    """
+    For row i (occupancy mask occupancy[i], business hours spans[i]): a bitmask of the minute
+    offsets at which a `duration_minutes` appointment fits the grid and no taken minute.
+    """
+    n = len(occupancy)
+    if n == 0:
+        return []
+    free = ~_pack(occupancy) & ((1 << (n * ROW_BITS)) - 1)
+    # run bit s <=> minutes s .. s + width - 1 all free; doubling width each step
+    run, width = free, 1
+    while width < duration_minutes:
+        shift = min(width, duration_minutes - width)
+        run &= run >> shift
+        width += shift
+    return _unpack(run & _pack(grid_mask(s, duration_minutes) for s in spans), n)
+
+
+def iter_bits(mask: int, limit: int) -> Iterator[int]:
+    """Positions of the lowest `limit` set bits, ascending."""
+    while mask and limit > 0:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+        limit -= 1
+
+
+def availability_stats() -> Dict[str, Any]:
+    return _index.stats()
@@ -0,0 +1,499 @@
+# app/services/bulk.py
+#
+# Bulk appointment import/export for the front desk (schedule migrations, daily rosters).
+#
+# Import: rows (CSV with a header, or NDJSON) are validated in Python, COPYed into a
+# temporary staging table and checked there – unknown users, overlaps with existing
+# pending/confirmed appointments of the same provider (answered by the appointments_no_overlap
+# GiST index) and overlaps with an earlier accepted row of the same file.
+# Everything that passes goes in with one INSERT ... SELECT; every other row comes back with
+# its reason. A booking that slips in between the check and the INSERT trips the exclusion
+# constraint, and the whole import is retried (the check then sees it); if that still happens
+# on the last attempt the import fails with ImportConflict (HTTP 409). The imported
+# bookings are written through to this worker's caches and published to the other workers
+# in the import's transaction (services/invalidation.py).
+#
+# Export: appointments of one provider over a range of clinic-local days, streamed as CSV or
+# NDJSON from a server-side cursor, EXPORT_FETCH_SIZE rows at a time.
+
+import csv
+import io
+import json
+import uuid
+from datetime import date, datetime, timedelta
+from typing import Any, AsyncIterator, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple, Union
+
+from ..core import config
+from ..db import db_conn
+from ..adb import adb_conn
+from . import availability, invalidation, providers, response_cache
+from .scheduling import INSERT_ATTEMPTS, _clinic_tz, _is_overlap, _retryable, _to_tz
+
+CSV = "csv"
+NDJSON = "ndjson"
+FORMATS = (CSV, NDJSON)
+MEDIA_TYPES = {CSV: "text/csv; charset=utf-8", NDJSON: "application/x-ndjson"}
+
+ACTIVE_STATUSES = ("pending", "confirmed")
+IMPORT_STATUSES = ACTIVE_STATUSES + ("cancelled",)
+IMPORT_COLUMNS = (
+    "user_id", "user_email", "start_time", "end_time", "duration_minutes",
+    "status", "provider_name", "location", "notes",
+)
+# Export-only columns, accepted and ignored so an export can be imported elsewhere
+IGNORED_COLUMNS = ("id", "created_at")
+EXPORT_COLUMNS = (
+    "id", "user_id", "user_email", "start_time", "end_time",
+    "status", "provider_name", "location", "notes", "created_at",
+)
+MAX_APPOINTMENT = timedelta(days=1)
+
+STAGING_COLUMNS = (
+    "row_no", "id", "user_id", "user_email", "start_time", "end_time", "status", "notes", "provider_name", "location",
+)
+
+# Dropped with the transaction, so a retry (or the next borrower of the connection) starts clean
+CREATE_STAGING_SQL = """
+    CREATE TEMP TABLE appointment_import (
+        row_no        INT PRIMARY KEY,
+        id            UUID NOT NULL,
+        user_id       UUID,
+        user_email    TEXT,
+        start_time    TIMESTAMPTZ NOT NULL,
+        end_time      TIMESTAMPTZ NOT NULL,
+        status        TEXT NOT NULL,
+        notes         TEXT,
+        provider_name TEXT NOT NULL,
+        location      TEXT,
+        reason        TEXT
+    ) ON COMMIT DROP
+"""
+
+COPY_STAGING_SQL = f"COPY appointment_import ({', '.join(STAGING_COLUMNS)}) FROM STDIN"
+
+INDEX_STAGING_SQL = """
+    CREATE INDEX ON appointment_import USING gist (provider_name, tstzrange(start_time, end_time, '[)'));
+    ANALYZE appointment_import
+"""
+
+RESOLVE_USERS_SQL = """
+    UPDATE appointment_import s
+    SET user_id = u.id
+    FROM users u
+    WHERE s.user_id IS NULL AND u.email = s.user_email;
+
+    UPDATE appointment_import s
+    SET reason = 'unknown user'
+    WHERE NOT EXISTS (SELECT 1 FROM users u WHERE u.id = s.user_id)
+"""
+
+# Overlaps are checked in two steps. First, set-based: each staged active row that overlaps an
+# existing appointment is rejected with the first one found. Then the rows still standing
+# are taken in file order, and a row is rejected for the first earlier row it overlaps
+# that is still accepted at that point. A row that overlaps only rejected rows goes in.
+# The loop only visits rows that overlap any other surviving row, found with one sort in
+# time order: a row overlaps another exactly when it starts before the latest end among
+# the rows that start before it, or ends after the next one starts. Each visit is one
+# lookup on the staging index.
+CHECK_CONFLICTS_SQL = """
+    UPDATE appointment_import s
+    SET reason = 'overlaps existing appointment ' || c.existing_id
+    FROM (
+        SELECT s.row_no,
+               (SELECT a.id FROM appointments a
+                WHERE a.provider_name = s.provider_name
+                  AND a.status IN ('pending', 'confirmed')
+                  AND tstzrange(a.start_time, a.end_time, '[)') && tstzrange(s.start_time, s.end_time, '[)')
+                LIMIT 1) AS existing_id
+        FROM appointment_import s
+        WHERE s.reason IS NULL AND s.status IN ('pending', 'confirmed')
+    ) c
+    WHERE s.row_no = c.row_no AND c.existing_id IS NOT NULL;
+
+    DO $$
+    DECLARE
+        r RECORD;
+        earlier INT;
+    BEGIN
+        FOR r IN
+            SELECT row_no, provider_name, start_time, end_time
+            FROM (
+                SELECT row_no, provider_name, start_time, end_time,
+                       max(end_time) OVER (PARTITION BY provider_name ORDER BY start_time, row_no
+                                           ROWS BETWEEN UNBOUNDED PRECEDING AND 1 PRECEDING) AS prev_end,
+                       lead(start_time) OVER (PARTITION BY provider_name ORDER BY start_time, row_no) AS next_start
+                FROM appointment_import
+                WHERE reason IS NULL AND status IN ('pending', 'confirmed')
+            ) w
+            WHERE prev_end > start_time OR next_start < end_time
+            ORDER BY row_no
+        LOOP
+            -- Sees the rejections made by earlier iterations. EXECUTE plans it for this row's
+            -- values: the cached generic plan walks the primary key for row_no < $1 instead of
+            -- the range index, which is quadratic over the file.
+            EXECUTE $q$
+                SELECT min(o.row_no) FROM appointment_import o
+                WHERE o.row_no < $1
+                  AND o.reason IS NULL
+                  AND o.status IN ('pending', 'confirmed')
+                  AND o.provider_name = $2
+                  AND tstzrange(o.start_time, o.end_time, '[)') && tstzrange($3, $4, '[)')
+            $q$ INTO earlier USING r.row_no, r.provider_name, r.start_time, r.end_time;
+            IF earlier IS NOT NULL THEN
+                UPDATE appointment_import SET reason = 'overlaps row ' || earlier WHERE row_no = r.row_no;
+            END IF;
+        END LOOP;
+    END $$
+"""
+
+INSERT_ACCEPTED_SQL = """
+    INSERT INTO appointments
+        (id, user_id, chat_session_id, start_time, end_time, status, notes, provider_name, location)
+    SELECT id, user_id, NULL, start_time, end_time, status, notes, provider_name, location
+    FROM appointment_import
+    WHERE reason IS NULL
+"""
+
+REPORT_SQL = "SELECT row_no, id, reason FROM appointment_import ORDER BY row_no"
+
+EXPORT_SQL = """
+    SELECT a.id, a.user_id, u.email AS user_email, a.start_time, a.end_time,
+           a.status, a.provider_name, a.location, a.notes, a.created_at
+    FROM appointments a
+    JOIN users u ON u.id = a.user_id
+    WHERE a.provider_name = %s
+      AND a.start_time >= %s
+      AND a.start_time < %s
+      AND (%s::text[] IS NULL OR a.status = ANY(%s::text[]))
+    ORDER BY a.start_time, a.id
+"""
+
+
+class ImportConflict(Exception):
+    """Bookings kept landing on the import's slots between its check and its INSERT."""
+
+
+IMPORT_CONFLICT_DETAIL = (
+    f"appointments kept being booked over the imported rows ({INSERT_ATTEMPTS} attempts); nothing was imported"
+)
+
+
+class StagedRow(NamedTuple):
+    row_no: int
+    id: str
+    user_id: Optional[str]
+    user_email: Optional[str]
+    start_time: datetime
+    end_time: datetime
+    status: str
+    notes: Optional[str]
+    provider_name: str
+    location: Optional[str]
+
+
+class Rejection(NamedTuple):
+    row: int
+    reason: str
+
+
+# ---------- Import: parsing and validation ----------
+
+def _text(value: Any) -> Optional[str]:
+    if value is None:
+        return None
+    value = str(value).strip()
+    return value or None
+
+
+def _records(body: bytes, fmt: str) -> Iterator[Union[Dict[str, Any], Rejection]]:
+    """Records in file order (blank NDJSON lines skipped); undecodable ones as Rejection."""
+    try:
+        text = body.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        raise ValueError("body is not UTF-8")
+    if fmt == CSV:
+        reader = csv.DictReader(io.StringIO(text))
+        unknown = set(reader.fieldnames or ()) - set(IMPORT_COLUMNS) - set(IGNORED_COLUMNS)
+        if unknown:
+            raise ValueError(f"unknown columns: {', '.join(sorted(unknown))}")
+        yield from reader
+        return
+    row_no = 0
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        row_no += 1
+        try:
+            record = json.loads(line)
+        except ValueError:
+            yield Rejection(row_no, "invalid JSON")
+            continue
+        yield record if isinstance(record, dict) else Rejection(row_no, "not a JSON object")
+
+
+def _timestamp(value: str, tz) -> datetime:
+    return _to_tz(datetime.fromisoformat(value), tz)
+
+
+def _validate(row_no: int, record: Dict[str, Any], directory: Dict[str, providers.Provider], tz) -> Union[StagedRow, Rejection]:
+    user_id, user_email = _text(record.get("user_id")), _text(record.get("user_email"))
+    if user_id is None and user_email is None:
+        return Rejection(row_no, "user_id or user_email is required")
+    if user_id is not None:
+        try:
+            user_id = str(uuid.UUID(user_id))
+        except ValueError:
+            return Rejection(row_no, f"invalid user_id {user_id!r}")
+
+    start_text, end_text = _text(record.get("start_time")), _text(record.get("end_time"))
+    if start_text is None:
+        return Rejection(row_no, "start_time is required")
+    try:
+        start = _timestamp(start_text, tz)
+        if end_text is not None:
+            end = _timestamp(end_text, tz)
+        else:
+            end = start + timedelta(minutes=int(_text(record.get("duration_minutes")) or config.DEFAULT_APPT_MIN))
+    except ValueError as e:
+        return Rejection(row_no, f"invalid time: {e}")
+    if not start < end <= start + MAX_APPOINTMENT:
+        return Rejection(row_no, "end_time must be after start_time (and at most a day later)")
+
+    status = (_text(record.get("status")) or "pending").lower()
+    if status not in IMPORT_STATUSES:
+        return Rejection(row_no, f"status must be one of {', '.join(IMPORT_STATUSES)}")
+
+    provider = _text(record.get("provider_name")) or config.DEFAULT_PROVIDER
+    location = _text(record.get("location")) or providers.lookup(directory, provider).location
+    return StagedRow(
+        row_no, str(uuid.uuid4()), user_id, user_email, start, end, status,
+        _text(record.get("notes")), provider, location,
+    )
+
+
+def stage_rows(body: bytes, fmt: str, directory: Dict[str, providers.Provider]) -> Tuple[List[StagedRow], List[Rejection]]:
+    """
+    Parse and validate an import body. Raises ValueError for a body that can't be read at all
+    (bad format/encoding, unknown CSV columns, more than IMPORT_MAX_ROWS rows).
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"format must be one of {', '.join(FORMATS)}")
+    tz = _clinic_tz()
+    staged: List[StagedRow] = []
+    rejected: List[Rejection] = []
+    for row_no, record in enumerate(_records(body, fmt), start=1):
+        if row_no > config.IMPORT_MAX_ROWS:
+            raise ValueError(f"too many rows (max {config.IMPORT_MAX_ROWS})")
+        result = record if isinstance(record, Rejection) else _validate(row_no, record, directory, tz)
+        (rejected if isinstance(result, Rejection) else staged).append(result)
+    return staged, rejected
+
+
+def _copy_buffer(rows: Iterable[StagedRow]) -> io.StringIO:
+    """Staged rows in COPY text format (tab-separated, \\N for NULL)."""
+    buf = io.StringIO()
+    for row in rows:
+        buf.write("\t".join(_copy_value(v) for v in row))
+        buf.write("\n")
+    buf.seek(0)
+    return buf
+
+
+def _copy_value(value: Any) -> str:
+    if value is None:
+        return "\\N"
+    text = value.isoformat() if isinstance(value, datetime) else str(value)
+    return text.replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n").replace("\r", "\\r")
+
+
+def _report(
+    received: int, staged: List[StagedRow], rejected: List[Rejection], outcome: List[Tuple[int, Any, Optional[str]]],
+    dry_run: bool,
+) -> Dict[str, Any]:
+    accepted = []
+    for row_no, appt_id, reason in outcome:
+        if reason is None:
+            accepted.append({"row": row_no, "id": None if dry_run else str(appt_id)})
+        else:
+            rejected.append(Rejection(row_no, reason))
+    return {
+        "received": received,
+        "imported": 0 if dry_run else len(accepted),
+        "dryRun": dry_run,
+        "appointments": accepted,
+        "rejected": [{"row": r.row, "reason": r.reason} for r in sorted(rejected)],
+    }
+
+
+def _active_imported(staged: List[StagedRow], outcome: List[Tuple[int, Any, Optional[str]]]) -> List[StagedRow]:
+    ok = {row_no for row_no, _, reason in outcome if reason is None}
+    return [row for row in staged if row.row_no in ok and row.status in ACTIVE_STATUSES]
+
+
+def _notify_params(staged: List[StagedRow], outcome: List[Tuple[int, Any, Optional[str]]]):
+    """NOTIFY_SQL parameters telling the other workers about the imported bookings."""
+    rows = _active_imported(staged, outcome)
+    return invalidation.notify_many_params(
+        invalidation.booked_events((r.provider_name, r.start_time, r.end_time) for r in rows)
+    )
+
+
+def _booked(staged: List[StagedRow], outcome: List[Tuple[int, Any, Optional[str]]]) -> None:
+    """Write the imported active rows through to the availability caches."""
+    for row in _active_imported(staged, outcome):
+        availability.mark_booked(row.provider_name, row.start_time, row.end_time)
+        response_cache.invalidate_availability(row.provider_name, row.start_time, row.end_time)
+
+
+def import_appointments(body: bytes, fmt: str, dry_run: bool = False) -> Dict[str, Any]:
+    """
+    Import appointments from a CSV/NDJSON body in one transaction. Returns the report:
+    imported rows with their new ids, rejected rows with the reason (rows numbered from 1 in
+    file order). dry_run runs every check and rolls back. Raises ImportConflict when
+    concurrent bookings beat the import on every attempt.
+    """
+    staged, rejected = stage_rows(body, fmt, providers.directory())
+    received = len(staged) + len(rejected)
+    outcome: List[Tuple[int, Any, Optional[str]]] = []
+    if staged:
+        for attempt in range(INSERT_ATTEMPTS):
+            try:
+                with db_conn() as conn, conn.cursor() as cur:
+                    cur.execute(CREATE_STAGING_SQL)
+                    cur.copy_expert(COPY_STAGING_SQL, _copy_buffer(staged))
+                    cur.execute(INDEX_STAGING_SQL)
+                    cur.execute(RESOLVE_USERS_SQL)
+                    cur.execute(CHECK_CONFLICTS_SQL)
+                    if not dry_run:
+                        cur.execute(INSERT_ACCEPTED_SQL)
+                    cur.execute(REPORT_SQL)
+                    outcome = cur.fetchall()
+                    if dry_run:
+                        conn.rollback()
+                    elif config.CACHE_INVALIDATION:
+                        cur.execute(invalidation.NOTIFY_SQL, _notify_params(staged, outcome))
+                break
+            except Exception as e:
+                if _is_overlap(e) and attempt + 1 == INSERT_ATTEMPTS:
+                    raise ImportConflict(IMPORT_CONFLICT_DETAIL) from e
+                if not (_is_overlap(e) or _retryable(e, attempt)):
+                    raise
+        if not dry_run:
+            _booked(staged, outcome)
+    return _report(received, staged, rejected, outcome, dry_run)
+
+
+async def aimport_appointments(body: bytes, fmt: str, dry_run: bool = False) -> Dict[str, Any]:
+    """Async variant of import_appointments."""
+    staged, rejected = stage_rows(body, fmt, await providers.adirectory())
+    received = len(staged) + len(rejected)
+    outcome: List[Tuple[int, Any, Optional[str]]] = []
+    if staged:
+        for attempt in range(INSERT_ATTEMPTS):
+            try:
+                async with adb_conn() as conn, conn.cursor() as cur:
+                    await cur.execute(CREATE_STAGING_SQL)
+                    async with cur.copy(COPY_STAGING_SQL) as copy:
+                        for row in staged:
+                            await copy.write_row(row)
+                    await cur.execute(INDEX_STAGING_SQL)
+                    await cur.execute(RESOLVE_USERS_SQL)
+                    await cur.execute(CHECK_CONFLICTS_SQL)
+                    if not dry_run:
+                        await cur.execute(INSERT_ACCEPTED_SQL)
+                    await cur.execute(REPORT_SQL)
+                    outcome = await cur.fetchall()
+                    if dry_run:
+                        await conn.rollback()
+                    elif config.CACHE_INVALIDATION:
+                        await cur.execute(invalidation.NOTIFY_SQL, _notify_params(staged, outcome))
+                break
+            except Exception as e:
+                if _is_overlap(e) and attempt + 1 == INSERT_ATTEMPTS:
+                    raise ImportConflict(IMPORT_CONFLICT_DETAIL) from e
+                if not (_is_overlap(e) or _retryable(e, attempt)):
+                    raise
+        if not dry_run:
+            _booked(staged, outcome)
+    return _report(received, staged, rejected, outcome, dry_run)
+
+
+# ---------- Export ----------
+
+def export_window(start_day: date, end_day: date) -> Tuple[datetime, datetime]:
+    """[local midnight of start_day, of end_day); ValueError for an empty or over-long range."""
+    n = (end_day - start_day).days
+    if n <= 0:
+        raise ValueError("end date must be after start date")
+    if n > config.EXPORT_MAX_RANGE_DAYS:
+        raise ValueError(f"range too long ({n} days; max {config.EXPORT_MAX_RANGE_DAYS})")
+    tz = _clinic_tz()
+    return availability.day_bounds(start_day, tz)[0], availability.day_bounds(end_day, tz)[0]
+
+
+def _export_params(provider: str, window: Tuple[datetime, datetime], statuses: Optional[List[str]]):
+    return (provider, window[0], window[1], statuses, statuses)
+
+
+def _export_value(value: Any, tz) -> Any:
+    if isinstance(value, datetime):
+        return _to_tz(value, tz).isoformat()
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    return value
+
+
+class _Encoder:
+    """Rows (tuples in EXPORT_COLUMNS order) -> text chunks of up to EXPORT_FETCH_SIZE rows."""
+
+    def __init__(self, fmt: str):
+        self.fmt = fmt
+        self.tz = _clinic_tz()
+        self.rows: List[List[Any]] = []
+
+    def header(self) -> str:
+        return ",".join(EXPORT_COLUMNS) + "\r\n" if self.fmt == CSV else ""
+
+    def add(self, row) -> Optional[str]:
+        self.rows.append([_export_value(v, self.tz) for v in row])
+        return self.flush() if len(self.rows) >= config.EXPORT_FETCH_SIZE else None
+
+    def flush(self) -> str:
+        rows, self.rows = self.rows, []
+        if self.fmt == NDJSON:
+            return "".join(json.dumps(dict(zip(EXPORT_COLUMNS, r))) + "\n" for r in rows)
+        buf = io.StringIO()
+        csv.writer(buf).writerows(rows)
+        return buf.getvalue()
+
+
+def export_appointments(
+    provider: str, window: Tuple[datetime, datetime], statuses: Optional[List[str]], fmt: str
+) -> Iterator[str]:
+    """Stream the provider's appointments starting in `window` (see export_window), oldest first."""
+    encoder = _Encoder(fmt)
+    yield encoder.header()
+    with db_conn() as conn, conn.cursor(name="appointments_export") as cur:
+        cur.itersize = config.EXPORT_FETCH_SIZE
+        cur.execute(EXPORT_SQL, _export_params(provider, window, statuses))
+        for row in cur:
+            chunk = encoder.add(row)
+            if chunk:
+                yield chunk
+    yield encoder.flush()
+
+
+async def aexport_appointments(
+    provider: str, window: Tuple[datetime, datetime], statuses: Optional[List[str]], fmt: str
+) -> AsyncIterator[str]:
+    """Async variant of export_appointments."""
+    encoder = _Encoder(fmt)
+    yield encoder.header()
+    async with adb_conn() as conn, conn.cursor(name="appointments_export") as cur:
+        cur.itersize = config.EXPORT_FETCH_SIZE
+        await cur.execute(EXPORT_SQL, _export_params(provider, window, statuses))
+        async for row in cur:
+            chunk = encoder.add(row)
+            if chunk:
+                yield chunk
+    yield encoder.flush()
@@ -0,0 +1,307 @@
+# app/services/chat_archive.py
+#
+# Upkeep of the monthly partitions of chat_messages (schema.sql,
+# migrations/004_chat_messages_partitioning.sql):
+#
+#   - keeps CHAT_PARTITIONS_AHEAD months of future partitions created, so inserts never find
+#     their month missing (there is no default partition to catch them)
+#   - with CHAT_MESSAGES_RETENTION_DAYS set, compacts each month that ended longer ago than
+#     that into chat_transcripts (one JSONB transcript per session) and drops it
+#
+# Every worker runs both on startup and every CHAT_ARCHIVE_INTERVAL seconds; an advisory lock
+# keeps compaction to one worker at a time. By hand:
+#
+#   python -m app.services.chat_archive status
+#   python -m app.services.chat_archive add-partitions [--ahead 3]
+#   python -m app.services.chat_archive compact [--retention-days 180] [--dry-run]
+#
+# A cold partition is detached CONCURRENTLY (chat traffic keeps going), then copied and
+# dropped in one transaction. A run interrupted in between leaves either a pending detach
+# (finalized by the next run) or a detached chat_messages_* table (compacted by the next
+# run, before anything else). History windows only read chat_messages, so a session whose
+# messages have all been compacted starts over with an empty window.
+
+import argparse
+import logging
+import sys
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+import psycopg2
+from psycopg2 import sql
+from psycopg2.extras import RealDictCursor
+
+from ..core import config
+from ..db import db_conn
+
+logger = logging.getLogger("python-service.chat_archive")
+
+# Creating a partition locks chat_messages; give up rather than queue chat traffic behind
+# a long transaction (the next run tries again, months ahead of need)
+LOCK_TIMEOUT = "5s"
+
+ADD_PARTITIONS_SQL = "SELECT chat_messages_add_partitions(%s) AS created"
+
+PARTITIONED_SQL = "SELECT relkind = 'p' AS partitioned FROM pg_class WHERE oid = 'chat_messages'::regclass"
+
+PARTITIONS_SQL = """
+    SELECT c.relname AS name, p.lower_bound, p.upper_bound, i.inhdetachpending AS pending,
+           greatest(c.reltuples, 0)::bigint AS estimated_rows
+      FROM chat_messages_partitions() p
+      JOIN pg_class c ON c.oid = p.partition
+      JOIN pg_inherits i ON i.inhrelid = p.partition
+     ORDER BY p.upper_bound
+"""
+
+# Detached by an earlier run that didn't get to compact them
+LEFTOVERS_SQL = """
+    SELECT c.relname AS name, greatest(c.reltuples, 0)::bigint AS estimated_rows
+      FROM pg_class c
+     WHERE c.relkind = 'r' AND NOT c.relispartition
+       AND c.relnamespace = (SELECT relnamespace FROM pg_class WHERE oid = 'chat_messages'::regclass)
+       AND c.relname ~ '^chat_messages_(legacy|y[0-9]{4}m[0-9]{2})$'
+     ORDER BY c.relname <> 'chat_messages_legacy', c.relname
+"""
+
+LOCK_SQL = "SELECT pg_try_advisory_lock(hashtext('chat_archive')) AS locked"
+UNLOCK_SQL = "SELECT pg_advisory_unlock(hashtext('chat_archive'))"
+
+# One transcript per session: {"t": created_at, "s": sender_type, "c": content, "m": metadata}
+# in order. Months don't overlap, so a session's next month goes before or after what its
+# transcript holds as a whole (a leftover can be compacted before an older month).
+COMPACT_SQL = """
+    WITH agg AS (
+        SELECT chat_session_id,
+               jsonb_agg(
+                   jsonb_strip_nulls(jsonb_build_object('t', created_at, 's', sender_type, 'c', content, 'm', metadata))
+                   ORDER BY created_at, id
+               ) AS messages,
+               count(*) AS message_count,
+               min(created_at) AS first_message_at,
+               max(created_at) AS last_message_at
+          FROM {table}
+         GROUP BY chat_session_id
+    ), ins AS (
+        INSERT INTO chat_transcripts AS t (chat_session_id, messages, message_count, first_message_at, last_message_at)
+        SELECT chat_session_id, messages, message_count, first_message_at, last_message_at FROM agg
+        ON CONFLICT (chat_session_id) DO UPDATE SET
+            messages = CASE WHEN EXCLUDED.first_message_at < t.first_message_at
+                            THEN EXCLUDED.messages || t.messages
+                            ELSE t.messages || EXCLUDED.messages END,
+            message_count = t.message_count + EXCLUDED.message_count,
+            first_message_at = least(t.first_message_at, EXCLUDED.first_message_at),
+            last_message_at = greatest(t.last_message_at, EXCLUDED.last_message_at),
+            compacted_at = NOW()
+    )
+    SELECT count(*) AS sessions, coalesce(sum(message_count), 0) AS messages FROM agg
+"""
+
+
+def add_partitions(ahead: int = config.CHAT_PARTITIONS_AHEAD) -> int:
+    """Create the missing partitions up to `ahead` months after this one; returns how many."""
+    with db_conn() as conn, conn.cursor() as cur:
+        cur.execute("SET LOCAL lock_timeout = %s", (LOCK_TIMEOUT,))
+        cur.execute(ADD_PARTITIONS_SQL, (ahead,))
+        return cur.fetchone()[0]
+
+
+def partitions() -> List[Dict[str, Any]]:
+    """The attached partitions, oldest first, then the detached leftovers (no bounds)."""
+    with db_conn() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute(PARTITIONS_SQL)
+        attached = [dict(r) for r in cur.fetchall()]
+        cur.execute(LEFTOVERS_SQL)
+        detached = [dict(r, detached=True) for r in cur.fetchall()]
+    return attached + detached
+
+
+def _connect():
+    # Its own connection: DETACH CONCURRENTLY needs autocommit, and compacting a month can
+    # take a while without holding a pooled connection
+    conn = psycopg2.connect(
+        host=config.DB_HOST,
+        port=config.DB_PORT,
+        user=config.DB_USER,
+        password=config.DB_PASSWORD,
+        dbname=config.DB_NAME,
+        application_name="python-service chat archive",
+    )
+    conn.autocommit = True
+    return conn
+
+
+def _detach(cur, name: str, pending: bool) -> None:
+    mode = "FINALIZE" if pending else "CONCURRENTLY"
+    cur.execute(sql.SQL("ALTER TABLE chat_messages DETACH PARTITION {} " + mode).format(sql.Identifier(name)))
+
+
+def _compact_table(conn, name: str) -> Dict[str, Any]:
+    t0 = time.perf_counter()
+    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute("BEGIN")
+        try:
+            cur.execute("SET LOCAL lock_timeout = %s", (LOCK_TIMEOUT,))
+            cur.execute(sql.SQL(COMPACT_SQL).format(table=sql.Identifier(name)))
+            row = cur.fetchone()
+            cur.execute(sql.SQL("DROP TABLE {}").format(sql.Identifier(name)))
+            cur.execute("COMMIT")
+        except BaseException:
+            cur.execute("ROLLBACK")
+            raise
+    return {"partition": name, "sessions": row["sessions"], "messages": int(row["messages"]),
+            "seconds": round(time.perf_counter() - t0, 3)}
+
+
+def compact(retention_days: int = config.CHAT_MESSAGES_RETENTION_DAYS, dry_run: bool = False) -> Dict[str, Any]:
+    """
+    Compact and drop every partition whose month ended more than `retention_days` ago
+    (oldest first, after any leftovers of an interrupted run). Skipped, with "locked": False,
+    when another worker is already at it. With dry_run only lists what it would do.
+    """
+    cutoff = datetime.now(timezone.utc) - timedelta(days=retention_days)
+    out: Dict[str, Any] = {"cutoff": cutoff, "locked": True, "compacted": [], "planned": []}
+    conn = _connect()
+    try:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute(PARTITIONED_SQL)
+            if not cur.fetchone()["partitioned"]:
+                raise RuntimeError("chat_messages isn't partitioned; apply migrations/004_chat_messages_partitioning.sql")
+            cur.execute(LOCK_SQL)
+            if not cur.fetchone()["locked"]:
+                out["locked"] = False
+                return out
+            try:
+                cur.execute(LEFTOVERS_SQL)
+                leftovers = [dict(r) for r in cur.fetchall()]
+                cur.execute(PARTITIONS_SQL)
+                cold = [dict(r) for r in cur.fetchall() if r["upper_bound"] <= cutoff]
+                if dry_run:
+                    out["planned"] = leftovers + cold
+                    return out
+                for p in leftovers:
+                    out["compacted"].append(_compact_table(conn, p["name"]))
+                for p in cold:
+                    _detach(cur, p["name"], p["pending"])
+                    out["compacted"].append(_compact_table(conn, p["name"]))
+                    logger.info("compacted chat partition %s", out["compacted"][-1])
+            finally:
+                cur.execute(UNLOCK_SQL)
+    finally:
+        conn.close()
+    return out
+
+
+# ---------- Background upkeep (every worker) ----------
+
+_stats: Dict[str, Any] = {
+    "runs": 0,
+    "partitions_created": 0,
+    "partitions_compacted": 0,
+    "messages_compacted": 0,
+    "errors": 0,
+    "last_run": None,
+    "last_error": None,
+}
+_stats_lock = threading.Lock()
+_stopping = threading.Event()
+_thread: Optional[threading.Thread] = None
+
+
+def run_maintenance() -> None:
+    """One round: create upcoming partitions, then compact if retention is configured."""
+    created, compacted, error = 0, [], None
+    try:
+        created = add_partitions()
+        if config.CHAT_MESSAGES_RETENTION_DAYS > 0:
+            compacted = compact()["compacted"]
+    except Exception as e:
+        error = str(e)
+        logger.warning("chat partition maintenance failed: %s", e)
+    with _stats_lock:
+        _stats["runs"] += 1
+        _stats["partitions_created"] += created
+        _stats["partitions_compacted"] += len(compacted)
+        _stats["messages_compacted"] += sum(c["messages"] for c in compacted)
+        _stats["last_run"] = datetime.now(timezone.utc).isoformat()
+        if error is not None:
+            _stats["errors"] += 1
+            _stats["last_error"] = error
+
+
+def _run() -> None:
+    while not _stopping.is_set():
+        run_maintenance()
+        _stopping.wait(config.CHAT_ARCHIVE_INTERVAL)
+
+
+def start_maintenance() -> None:
+    """Start this worker's upkeep thread (no-op with CHAT_ARCHIVE_INTERVAL <= 0 or if running)."""
+    global _thread
+    if config.CHAT_ARCHIVE_INTERVAL <= 0 or (_thread is not None and _thread.is_alive()):
+        return
+    _stopping.clear()
+    _thread = threading.Thread(target=_run, name="chat-archive", daemon=True)
+    _thread.start()
+
+
+def stop_maintenance() -> None:
+    # A compaction in progress isn't interrupted; the daemon thread dies with the process
+    # and the next run picks up after it
+    global _thread
+    _stopping.set()
+    if _thread is not None:
+        _thread.join(1.0)
+        _thread = None
+
+
+def chat_archive_stats() -> Dict[str, Any]:
+    with _stats_lock:
+        return {
+            "retention_days": config.CHAT_MESSAGES_RETENTION_DAYS,
+            "partitions_ahead": config.CHAT_PARTITIONS_AHEAD,
+            **_stats,
+        }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Create, list and compact the monthly chat_messages partitions.")
+    ap.add_argument("command", choices=("status", "add-partitions", "compact"))
+    ap.add_argument("--ahead", type=int, default=config.CHAT_PARTITIONS_AHEAD, help="months after this one")
+    ap.add_argument(
+        "--retention-days", type=int, default=config.CHAT_MESSAGES_RETENTION_DAYS,
+        help="compact months that ended longer ago than this (default CHAT_MESSAGES_RETENTION_DAYS)",
+    )
+    ap.add_argument("--dry-run", action="store_true", help="only list what compact would do")
+    args = ap.parse_args(argv)
+
+    if args.command == "add-partitions":
+        print(f"created {add_partitions(args.ahead)} partitions")
+        return 0
+
+    if args.command == "status":
+        for p in partitions():
+            if p.get("detached"):
+                span = "detached, not yet compacted"
+            else:
+                span = f"[{p['lower_bound'] or 'MINVALUE'}, {p['upper_bound']})" + (" detaching" if p["pending"] else "")
+            print(f"{p['name']:24s} ~{p['estimated_rows']:>12,} rows  {span}")
+        return 0
+
+    if args.retention_days <= 0:
+        ap.error("compact needs --retention-days (or CHAT_MESSAGES_RETENTION_DAYS) > 0")
+    out = compact(args.retention_days, args.dry_run)
+    if not out["locked"]:
+        print("another worker is compacting; nothing done")
+        return 1
+    for p in out["planned"]:
+        print(f"would compact {p['name']} (~{p['estimated_rows']:,} rows)")
+    for c in out["compacted"]:
+        print(f"compacted {c['partition']}: {c['messages']} messages of {c['sessions']} sessions in {c['seconds']:.1f}s")
+    print(f"cutoff {out['cutoff']:%Y-%m-%d %H:%M} UTC: {len(out['compacted'])} partitions compacted")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,257 @@
+# app/services/dates.py
+#
+# Timezone-aware, future-biased parsing of user dates/times. Three tiers:
+#   1. compiled fast path for strict ISO and "today/tomorrow/[next] <weekday> [at] [HH:MM|Ham]"
+#   2. bounded LRU of dateparser results keyed on (text, clinic-local date, TZ_NAME)
+#   3. dateparser itself (then the old today/tomorrow/dateutil fallback)
+# Every tier feeds the same _coerce_future, so the future-bias semantics are unchanged.
+
+import logging
+import os
+import re
+import threading
+from collections import OrderedDict
+from datetime import date, datetime, time, timedelta
+from typing import Any, Dict, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+from ..core import config, metrics
+
+logger = logging.getLogger("python-service.dates")
+
+def _now_tz() -> datetime:
+    tz_name = os.getenv("TZ_NAME", "Asia/Dubai")  # set in docker-compose
+    try:
+        tz = ZoneInfo(tz_name)
+    except Exception:
+        tz = ZoneInfo("UTC")
+    return datetime.now(tz)
+
+def clinic_now() -> datetime:
+    """The current time in the clinic timezone."""
+    return _now_tz()
+
+def clinic_today() -> date:
+    """Today's date in the clinic timezone."""
+    return _now_tz().date()
+
+_YEAR_RE = re.compile(r"\b20\d{2}\b")
+
+def _has_year(text: str) -> bool:
+    return bool(_YEAR_RE.search(text or ""))
+
+def _coerce_future(dt: datetime, now: datetime, original_text: str) -> datetime:
+    if dt >= now:
+        return dt
+    if not _has_year(original_text):
+        for _ in range(3):
+            try:
+                dt = dt.replace(year=dt.year + 1)
+            except ValueError:
+                dt = dt + timedelta(days=365)
+            if dt >= now:
+                return dt
+    while dt < now:
+        dt += timedelta(days=1)
+    return dt
+
+# ---------- Tier 1: compiled fast path ----------
+#
+# Only forms whose dateparser result we reproduce exactly (PREFER_DATES_FROM=future):
+# bare today/tomorrow keep the current time of day, a weekday means the next one strictly
+# after today, and anything odd (bad hour, "13pm", punctuation) falls through to dateparser.
+
+_WEEKDAYS = ("monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday")
+
+_ISO_DATE_RE = re.compile(r"\d{4}-\d{2}-\d{2}")
+_ISO_DATETIME_RE = re.compile(r"\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}(?::\d{2}(?:\.\d{1,6})?)?(?:Z|[+-]\d{2}:?\d{2})?")
+_RELATIVE_RE = re.compile(
+    r"(?P<day>today|tomorrow|(?P<next>next\s+)?(?P<weekday>" + "|".join(_WEEKDAYS) + r"))"
+    r"(?:\s+(?:at\s+)?(?P<hour>\d{1,2})(?::(?P<minute>\d{2}))?\s*(?P<ampm>am|pm)?)?",
+    re.IGNORECASE,
+)
+
+def _clock(hour: str, minute: Optional[str], ampm: Optional[str]) -> Optional[time]:
+    h = int(hour)
+    m = int(minute) if minute is not None else 0
+    if ampm:
+        if not 1 <= h <= 12:
+            return None
+        h = h % 12 + (12 if ampm.lower() == "pm" else 0)
+    elif minute is None or h > 23:
+        return None  # "tomorrow 9" is ambiguous; leave it to dateparser
+    if m > 59:
+        return None
+    return time(h, m)
+
+def _fast_parse(text: str, now: datetime) -> Optional[datetime]:
+    s = (text or "").strip()
+    if not s:
+        return None
+    tz = now.tzinfo
+
+    if _ISO_DATE_RE.fullmatch(s):
+        try:
+            return datetime.combine(date.fromisoformat(s), time(0, 0), tzinfo=tz)
+        except ValueError:
+            return None
+    if _ISO_DATETIME_RE.fullmatch(s):
+        try:
+            dt = datetime.fromisoformat(s)
+        except ValueError:
+            return None
+        return dt.replace(tzinfo=tz) if dt.tzinfo is None else dt.astimezone(tz)
+
+    m = _RELATIVE_RE.fullmatch(s)
+    if not m:
+        return None
+    at: Optional[time] = None
+    if m.group("hour") is not None:
+        at = _clock(m.group("hour"), m.group("minute"), m.group("ampm"))
+        if at is None:
+            return None
+
+    day = m.group("day").lower()
+    if day == "today":
+        base = now
+    elif day == "tomorrow":
+        base = now + timedelta(days=1)
+    else:
+        ahead = (_WEEKDAYS.index(m.group("weekday").lower()) - now.weekday()) % 7 or 7
+        base = datetime.combine(now.date() + timedelta(days=ahead), time(0, 0), tzinfo=tz)
+
+    if at is None:
+        return base
+    return base.replace(hour=at.hour, minute=at.minute, second=0, microsecond=0)
+
+# ---------- Tier 2/3: memoized dateparser ----------
+
+# Offsets smaller than a day shift the clock itself ("in 2 hours"); those results can't be
+# reused later in the day. Day-or-larger offsets keep the clock and are handled below.
+_CLOCK_RELATIVE_RE = re.compile(r"\b(hours?|hrs?|minutes?|mins?|seconds?|secs?)\b", re.IGNORECASE)
+
+_MISS = object()
+_dp_cache: "OrderedDict[Tuple[str, date, str], Optional[Tuple[datetime, bool]]]" = OrderedDict()
+_dp_cache_lock = threading.Lock()
+_stats = {"fast_path": 0, "cache_hits": 0, "cache_misses": 0, "dateparser_calls": 0}
+_stats_lock = threading.Lock()
+
+def _count(name: str) -> None:
+    # Parses run on request threads and the tool pool at once; += on the dict isn't atomic.
+    with _stats_lock:
+        _stats[name] += 1
+
+def _try_dateparser(text: str, now: datetime) -> Optional[datetime]:
+    try:
+        import dateparser as dp
+    except Exception:
+        return None
+    settings = {
+        "PREFER_DATES_FROM": "future",
+        "RELATIVE_BASE": now,
+        "TIMEZONE": str(now.tzinfo) if now.tzinfo else "UTC",
+        "RETURN_AS_TIMEZONE_AWARE": True,
+    }
+    _count("dateparser_calls")
+    return dp.parse(text, settings=settings)
+
+def _cached_dateparser(text: str, now: datetime) -> Optional[datetime]:
+    if config.DATE_PARSE_CACHE_SIZE <= 0 or _CLOCK_RELATIVE_RE.search(text or ""):
+        return _try_dateparser(text, now)
+
+    key = (text, now.date(), str(now.tzinfo))
+    with _dp_cache_lock:
+        entry = _dp_cache.get(key, _MISS)
+        if entry is not _MISS:
+            _dp_cache.move_to_end(key)
+    if entry is not _MISS:
+        _count("cache_hits")
+    else:
+        _count("cache_misses")
+        dt = _try_dateparser(text, now)
+        # dateparser fills a missing time of day from RELATIVE_BASE ("tomorrow", "next week");
+        # remember that so a later hit takes the clock from its own `now`.
+        entry = None if dt is None else (dt, dt.time() == now.time())
+        with _dp_cache_lock:
+            _dp_cache[key] = entry
+            while len(_dp_cache) > config.DATE_PARSE_CACHE_SIZE:
+                _dp_cache.popitem(last=False)
+
+    if entry is None:
+        return None
+    dt, borrowed_clock = entry
+    if borrowed_clock:
+        dt = dt.replace(hour=now.hour, minute=now.minute, second=now.second, microsecond=now.microsecond)
+    return dt
+
+def _parse(text: str, now: datetime) -> Optional[datetime]:
+    dt = _fast_parse(text, now)
+    if dt is not None:
+        _count("fast_path")
+        return dt
+    return _cached_dateparser(text, now)
+
+def warm_date_parser() -> None:
+    """
+    Import dateparser and load its language data, which the first parse otherwise does
+    inside a request (seconds). Goes straight to dateparser: no cache entry, no stats.
+    """
+    import dateparser as dp
+
+    now = _now_tz()
+    dp.parse("next friday at 3pm", settings={
+        "PREFER_DATES_FROM": "future",
+        "RELATIVE_BASE": now,
+        "TIMEZONE": str(now.tzinfo),
+        "RETURN_AS_TIMEZONE_AWARE": True,
+    })
+
+def date_parse_stats() -> Dict[str, Any]:
+    with _dp_cache_lock:
+        size = len(_dp_cache)
+    with _stats_lock:
+        counts = dict(_stats)
+    return {**counts, "cache_size": size, "cache_max": config.DATE_PARSE_CACHE_SIZE}
+
+@metrics.stage("date_parse")
+def parse_user_date(text: str) -> datetime:
+    """Parse natural language date → midnight in clinic TZ, coerced to future."""
+    now = _now_tz()
+    dt = _parse(text, now)
+    if dt is None:
+        lower = (text or "").lower()
+        if "tomorrow" in lower:
+            dt = (now + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+        elif "today" in lower:
+            dt = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        else:
+            from dateutil import parser as du
+            dt = du.parse(text, default=now)
+            if dt.tzinfo is None:
+                dt = dt.replace(tzinfo=now.tzinfo)
+            dt = dt.replace(hour=0, minute=0, second=0, microsecond=0)
+    dt = _coerce_future(dt, now, text)
+    parsed = dt.replace(hour=0, minute=0, second=0, microsecond=0)
+    logger.info("[parse_user_date] raw=%r -> parsed=%s", text, parsed.isoformat())
+    return parsed
+
+@metrics.stage("date_parse")
+def parse_user_datetime(text: str) -> datetime:
+    """Parse natural language datetime → tz-aware, coerced to future."""
+    now = _now_tz()
+    dt = _parse(text, now)
+    if dt is None:
+        lower = (text or "").lower()
+        if "tomorrow" in lower:
+            base = (now + timedelta(days=1)).replace(minute=0, second=0, microsecond=0)
+            dt = base.replace(hour=9)  # default hour if none provided
+        elif "today" in lower:
+            dt = now.replace(minute=0, second=0, microsecond=0)
+        else:
+            from dateutil import parser as du
+            dt = du.parse(text, default=now)
+            if dt.tzinfo is None:
+                dt = dt.replace(tzinfo=now.tzinfo)
+    dt = _coerce_future(dt, now, text)
+    logger.info("[parse_user_datetime] raw=%r -> parsed=%s", text, dt.isoformat())
+    return dt
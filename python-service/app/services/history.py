@@ -0,0 +1,64 @@
+# app/services/history.py
+#
+# In-process ring buffer of the last HISTORY_WINDOW messages per active session.
+# The logging path appends to it, so a turn on a cached session needs no history read.
+# Entries are filled from a "latest K" DB query on a miss and evicted by LRU or after
+# HISTORY_CACHE_IDLE seconds without a message. Another worker writing to the same session
+# drops this worker's entry through the invalidation listener (services/invalidation.py);
+# without it (CACHE_INVALIDATION off) that write is only seen once the entry goes idle.
+#
+# A window is an immutable tuple, replaced (under the cache lock) on every append: a turn
+# reading it while another turn of the same session appends keeps a consistent snapshot.
+
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from ..core import config, metrics
+from ..core.cache import TTLCache
+
+_cache = TTLCache(config.HISTORY_CACHE_SIZE, config.HISTORY_CACHE_IDLE, name="history")
+metrics.register_cache(_cache)
+
+
+def _row(sender_type: str, content: str) -> Dict[str, Any]:
+    return {"sender_type": sender_type, "content": content}
+
+
+def _trim(window: Tuple[Dict[str, Any], ...]) -> Tuple[Dict[str, Any], ...]:
+    return window[max(len(window) - config.HISTORY_WINDOW, 0):]
+
+
+def get(session_id: str, limit: int) -> Optional[List[Dict[str, Any]]]:
+    """Last `limit` messages (oldest first), or None on a miss / window smaller than `limit`."""
+    if limit > config.HISTORY_WINDOW:
+        return None
+    window: Optional[Tuple[Dict[str, Any], ...]] = _cache.get(str(session_id))
+    if window is None:
+        return None
+    return list(window[-limit:]) if limit > 0 else []
+
+
+def put(session_id: str, rows: Iterable[Dict[str, Any]]) -> None:
+    """Seed the window from DB rows (oldest first)."""
+    window = tuple(_row(r["sender_type"], r["content"]) for r in rows)
+    _cache.set(str(session_id), _trim(window))
+
+
+def append(session_id: str, sender_type: str, content: str) -> None:
+    """Record a message of a cached session and restart its idle timer; no-op on a miss."""
+    def push(window: Tuple[Dict[str, Any], ...]) -> Tuple[Dict[str, Any], ...]:
+        return _trim(window + (_row(sender_type, content),))
+
+    _cache.update(str(session_id), push, refresh=True)
+
+
+def forget(session_id: str) -> None:
+    """Drop the session's window (another worker wrote to it)."""
+    _cache.pop(str(session_id))
+
+
+def clear() -> None:
+    _cache.clear()
+
+
+def history_stats() -> Dict[str, Any]:
+    return {**_cache.stats(), "window": config.HISTORY_WINDOW}
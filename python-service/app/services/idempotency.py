@@ -0,0 +1,236 @@
+# app/services/idempotency.py
+#
+# Idempotency keys for /chat (ChatRequest.idempotencyKey or an Idempotency-Key header).
+# A client that retries a request under the same key gets the first request's response
+# instead of a second turn: no second model call, no second booking.
+#
+# Keys are scoped to the user and recorded in chat_requests (schema.sql,
+# migrations/005_chat_requests.sql), so a retry landing on another worker is covered too:
+#   - the first request claims the key (one INSERT), runs the turn and stores its response
+#   - a retry while it runs attaches to it: in the same worker it waits on the call itself
+#     (core.cache.SingleFlight); elsewhere it polls the row for up to IDEMPOTENCY_WAIT
+#     seconds, then gives up with InProgress (409)
+#   - a retry after it finished gets the stored response, until IDEMPOTENCY_TTL expires it
+#   - the same key with a different body is refused with KeyReused (422)
+# A request that fails releases its claim, so the retry runs the turn. A claim whose worker
+# died is taken over once it is IDEMPOTENCY_STALE seconds old.
+
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from ..core import config, metrics
+from ..core.cache import SingleFlight
+from ..db import db_conn, dict_cursor
+from ..adb import adb_conn, adict_cursor
+
+logger = logging.getLogger("python-service.idempotency")
+
+# Claims the key, or takes over an abandoned or expired claim, and reads what's there in the
+# same round trip. A row committed by a concurrent claim after this statement's snapshot
+# isn't seen by the outer read: neither claimed nor found, the caller polls.
+CLAIM_SQL = """
+    WITH claim AS (
+        INSERT INTO chat_requests (user_id, idempotency_key, request_hash)
+        VALUES (%(user_id)s, %(key)s, %(request_hash)s)
+        ON CONFLICT (user_id, idempotency_key) DO UPDATE
+            SET request_hash = EXCLUDED.request_hash, response = NULL, claimed_at = NOW(), completed_at = NULL
+            WHERE (chat_requests.response IS NULL AND chat_requests.claimed_at < NOW() - make_interval(secs => %(stale)s))
+               OR chat_requests.claimed_at < NOW() - make_interval(secs => %(ttl)s)
+        RETURNING 1
+    )
+    SELECT EXISTS (SELECT 1 FROM claim) AS claimed, r.request_hash, r.response
+      FROM (SELECT 1) one
+      LEFT JOIN chat_requests r ON r.user_id = %(user_id)s AND r.idempotency_key = %(key)s
+"""
+
+COMPLETE_SQL = """
+    UPDATE chat_requests SET response = %(response)s, completed_at = NOW()
+     WHERE user_id = %(user_id)s AND idempotency_key = %(key)s AND request_hash = %(request_hash)s
+"""
+
+RELEASE_SQL = """
+    DELETE FROM chat_requests
+     WHERE user_id = %(user_id)s AND idempotency_key = %(key)s AND response IS NULL
+"""
+
+PURGE_SQL = "DELETE FROM chat_requests WHERE claimed_at < NOW() - make_interval(secs => %s)"
+
+# How often a retry on another worker looks at the row again (seconds)
+POLL_INTERVAL = 0.1
+# Expired keys are deleted at most this often per worker (seconds)
+PURGE_INTERVAL = 300.0
+
+# Retries of a request running in this worker wait for it directly
+_flights = SingleFlight("chat_idempotency")
+_last_purge = time.monotonic()
+
+
+class KeyReused(Exception):
+    """The idempotency key was already used for a request with a different body."""
+
+
+class InProgress(Exception):
+    """The request under this key is still running elsewhere after IDEMPOTENCY_WAIT seconds."""
+
+
+# Left out of the fingerprint besides the key itself: the gateway opens a new session for
+# each attempt of a request sent without one, so a retry may carry a different sessionId
+UNHASHED_FIELDS = ("idempotencyKey", "sessionId")
+
+
+def request_hash(body: Dict[str, Any]) -> str:
+    """Fingerprint of a request body, as compared between a key's first request and retries."""
+    data = {k: v for k, v in body.items() if k not in UNHASHED_FIELDS}
+    return hashlib.sha256(json.dumps(data, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def _params(user_id: str, key: str, fingerprint: str) -> Dict[str, Any]:
+    return {
+        "user_id": user_id,
+        "key": key,
+        "request_hash": fingerprint,
+        "stale": config.IDEMPOTENCY_STALE,
+        "ttl": config.IDEMPOTENCY_TTL,
+    }
+
+
+def _outcome(row: Dict[str, Any], fingerprint: str) -> Optional[Dict[str, Any]]:
+    """The stored response, None while the request is in flight; raises KeyReused."""
+    if row["request_hash"] is not None and row["request_hash"] != fingerprint:
+        metrics.idempotent_requests.inc(outcome="conflict")
+        raise KeyReused("idempotency key already used for a different request")
+    return row["response"]
+
+
+def _purge_due() -> bool:
+    global _last_purge
+    now = time.monotonic()
+    if now - _last_purge < PURGE_INTERVAL:
+        return False
+    _last_purge = now
+    return True
+
+
+def _release(params: Dict[str, Any]) -> None:
+    # Best effort: if this fails too, the claim goes stale and a retry takes it over
+    try:
+        with db_conn(autocommit=True) as conn, conn.cursor() as cur:
+            cur.execute(RELEASE_SQL, params)
+    except Exception as e:
+        logger.warning("couldn't release idempotency key %r: %s", params["key"], e)
+
+
+def _run(user_id: str, key: str, fingerprint: str, fn: Callable[[], Dict[str, Any]]) -> Tuple[Dict[str, Any], bool]:
+    params = _params(user_id, key, fingerprint)
+    deadline = time.monotonic() + config.IDEMPOTENCY_WAIT
+    while True:
+        with db_conn(autocommit=True) as conn, dict_cursor(conn) as cur:
+            cur.execute(CLAIM_SQL, params)
+            row = cur.fetchone()
+        if row["claimed"]:
+            break
+        response = _outcome(row, fingerprint)
+        if response is not None:
+            metrics.idempotent_requests.inc(outcome="replayed")
+            return response, True
+        if time.monotonic() >= deadline:
+            metrics.idempotent_requests.inc(outcome="in_progress")
+            raise InProgress("a request with this idempotency key is still in progress")
+        time.sleep(POLL_INTERVAL)
+
+    try:
+        response = fn()
+    except BaseException:
+        _release(params)
+        raise
+    metrics.idempotent_requests.inc(outcome="executed")
+    with db_conn(autocommit=True) as conn, conn.cursor() as cur:
+        cur.execute(COMPLETE_SQL, {**params, "response": json.dumps(response, default=str)})
+        if _purge_due():
+            cur.execute(PURGE_SQL, (config.IDEMPOTENCY_TTL,))
+    return response, False
+
+
+def run(user_id: str, key: str, fingerprint: str, fn: Callable[[], Dict[str, Any]]) -> Tuple[Dict[str, Any], bool]:
+    """
+    Run fn() (which returns the JSON-able response) once per (user, key): returns the
+    response and whether it was replayed rather than produced by this call. Raises KeyReused
+    or InProgress.
+    """
+    shared = []
+
+    def call():
+        shared.append(True)
+        return _run(user_id, key, fingerprint, fn)
+
+    response, replayed = _flights.do((user_id, key, fingerprint), call)
+    if not shared:
+        metrics.idempotent_requests.inc(outcome="attached")
+        return response, True
+    return response, replayed
+
+
+async def _arelease(params: Dict[str, Any]) -> None:
+    try:
+        async with adb_conn(autocommit=True) as conn, conn.cursor() as cur:
+            await cur.execute(RELEASE_SQL, params)
+    except Exception as e:
+        logger.warning("couldn't release idempotency key %r: %s", params["key"], e)
+
+
+async def _arun(
+    user_id: str, key: str, fingerprint: str, fn: Callable[[], Awaitable[Dict[str, Any]]]
+) -> Tuple[Dict[str, Any], bool]:
+    params = _params(user_id, key, fingerprint)
+    deadline = time.monotonic() + config.IDEMPOTENCY_WAIT
+    while True:
+        async with adb_conn(autocommit=True) as conn, adict_cursor(conn) as cur:
+            await cur.execute(CLAIM_SQL, params)
+            row = await cur.fetchone()
+        if row["claimed"]:
+            break
+        response = _outcome(row, fingerprint)
+        if response is not None:
+            metrics.idempotent_requests.inc(outcome="replayed")
+            return response, True
+        if time.monotonic() >= deadline:
+            metrics.idempotent_requests.inc(outcome="in_progress")
+            raise InProgress("a request with this idempotency key is still in progress")
+        await asyncio.sleep(POLL_INTERVAL)
+
+    try:
+        response = await fn()
+    except BaseException:
+        await _arelease(params)
+        raise
+    metrics.idempotent_requests.inc(outcome="executed")
+    async with adb_conn(autocommit=True) as conn, conn.cursor() as cur:
+        await cur.execute(COMPLETE_SQL, {**params, "response": json.dumps(response, default=str)})
+        if _purge_due():
+            await cur.execute(PURGE_SQL, (config.IDEMPOTENCY_TTL,))
+    return response, False
+
+
+async def arun(
+    user_id: str, key: str, fingerprint: str, fn: Callable[[], Awaitable[Dict[str, Any]]]
+) -> Tuple[Dict[str, Any], bool]:
+    """Async variant of run."""
+    shared = []
+
+    async def call():
+        shared.append(True)
+        return await _arun(user_id, key, fingerprint, fn)
+
+    response, replayed = await _flights.ado((user_id, key, fingerprint), call)
+    if not shared:
+        metrics.idempotent_requests.inc(outcome="attached")
+        return response, True
+    return response, replayed
+
+
+def idempotency_stats() -> Dict[str, Any]:
+    return {"ttl": config.IDEMPOTENCY_TTL, "wait": config.IDEMPOTENCY_WAIT, **_flights.stats()}
@@ -0,0 +1,194 @@
+# app/services/intents.py
+#
+# Intent/slot extraction for the rule-based fallback. One precompiled pattern is run once
+# over the lowercased message; every match is a keyword (booking / availability), a date
+# span (ISO, today/tomorrow/day after tomorrow, [next] weekday, "nov 15" / "15th of november",
+# "the 20th") or a time span ("10:30", "3pm", "noon", "at 10"). Spans resolve against the
+# clinic-local date with the same future bias as dates.py (a weekday is the next one strictly
+# after today, "the 20th" the next 20th on or after today), so nothing here calls
+# dateutil/dateparser or touches the database. A booking time that isn't after the clinic's
+# current time is dropped rather than booked.
+
+import re
+from datetime import date, datetime, time, timedelta
+from typing import NamedTuple, Optional
+
+from .dates import clinic_now
+
+AVAILABILITY = "availability"
+BOOKING = "booking"
+UNKNOWN = "unknown"
+
+_WEEKDAYS = {
+    "mon": 0, "monday": 0, "tue": 1, "tues": 1, "tuesday": 1, "wed": 2, "wednesday": 2,
+    "thu": 3, "thur": 3, "thurs": 3, "thursday": 3, "fri": 4, "friday": 4,
+    "sat": 5, "saturday": 5, "sun": 6, "sunday": 6,
+}
+_MONTHS = {
+    "jan": 1, "january": 1, "feb": 2, "february": 2, "mar": 3, "march": 3, "apr": 4, "april": 4,
+    "may": 5, "jun": 6, "june": 6, "jul": 7, "july": 7, "aug": 8, "august": 8,
+    "sep": 9, "sept": 9, "september": 9, "oct": 10, "october": 10, "nov": 11, "november": 11,
+    "dec": 12, "december": 12,
+}
+
+
+def _alternation(words) -> str:
+    # Longest first so "tuesday" wins over "tue"
+    return "|".join(sorted(words, key=len, reverse=True))
+
+
+_WD = _alternation(_WEEKDAYS)
+_MON = _alternation(_MONTHS)
+_ORD = r"(?:st|nd|rd|th)?"
+
+_TOKEN_RE = re.compile(
+    r"\b(?:"
+    r"(?P<iso>\d{4}-\d{2}-\d{2})(?:[t ](?P<iso_h>\d{2}):(?P<iso_m>\d{2}))?"
+    r"|(?P<after>(?:the\s+)?day\s+after\s+tomorrow)"
+    r"|(?P<rel>today|tonight|tomorrow|tmrw|tmr)"
+    rf"|(?:next\s+)?(?P<wd>{_WD})"
+    rf"|(?P<mon>{_MON})\.?\s+(?P<mday>\d{{1,2}}){_ORD}"
+    rf"|(?P<mday2>\d{{1,2}}){_ORD}\s+(?:of\s+)?(?P<mon2>{_MON})"
+    rf"|(?:the\s+)?(?P<mday3>\d{{1,2}})(?:st|nd|rd|th)(?!\s+(?:of\s+)?(?:{_MON})\b)"
+    r"|(?P<h>\d{1,2}):(?P<m>\d{2})(?:\s*(?P<ampm>[ap]\.?m\.?))?"
+    r"|(?P<h2>\d{1,2})\s*(?P<ampm2>[ap]\.?m\.?)"
+    r"|at\s+(?P<h3>\d{1,2})(?![:\d])(?!\s*[ap]\.?m\b)"
+    r"|(?P<noon>noon|midday)"
+    r"|(?P<book>book(?:ing)?|schedule|reserve|appointment)"
+    r"|(?P<avail>slots?|availab(?:le|ility)|openings?|free|open)"
+    r")(?![\w-])"
+)
+
+
+class Intent(NamedTuple):
+    kind: str                   # AVAILABILITY, BOOKING or UNKNOWN
+    day: Optional[date]         # resolved clinic-local date, if one was given
+    at: Optional[time]          # time of day, if one was given (and, for a booking, still ahead)
+    date_text: Optional[str]    # the spans they came from
+    time_text: Optional[str]
+
+
+def _clock(hour: str, minute: Optional[str], ampm: Optional[str]) -> Optional[time]:
+    h, m = int(hour), int(minute or 0)
+    if ampm:
+        if not 1 <= h <= 12:
+            return None
+        h = h % 12 + (12 if ampm[0] == "p" else 0)
+    if h > 23 or m > 59:
+        return None
+    return time(h, m)
+
+
+def _bare_hour(hour: str) -> Optional[time]:
+    # "at 10" has no am/pm: clinic hours decide, so 1-7 are afternoon hours ("at 3" is 15:00)
+    h = int(hour)
+    return _clock(str(h + 12), None, None) if 1 <= h <= 7 else _clock(hour, None, None)
+
+
+def _next_mday(mday: int, today: date) -> Optional[date]:
+    """The next day-of-month `mday` on or after today (months without it are skipped)."""
+    year, month = today.year, today.month
+    for _ in range(13):
+        try:
+            d = date(year, month, mday)
+        except ValueError:
+            d = None
+        if d is not None and d >= today:
+            return d
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return None
+
+
+def _month_day(month: int, mday: int, today: date) -> Optional[date]:
+    for year in (today.year, today.year + 1):
+        try:
+            d = date(year, month, mday)
+        except ValueError:
+            return None
+        if d >= today:
+            return d
+    return None
+
+
+def _resolve_date(m: "re.Match", today: date) -> Optional[date]:
+    if m.group("iso"):
+        try:
+            return date.fromisoformat(m.group("iso"))
+        except ValueError:
+            return None
+    if m.group("after"):
+        return today + timedelta(days=2)
+    rel = m.group("rel")
+    if rel:
+        return today if rel in ("today", "tonight") else today + timedelta(days=1)
+    wd = m.group("wd")
+    if wd:
+        return today + timedelta(days=(_WEEKDAYS[wd] - today.weekday()) % 7 or 7)
+    if m.group("mon"):
+        return _month_day(_MONTHS[m.group("mon")], int(m.group("mday")), today)
+    if m.group("mday3"):
+        return _next_mday(int(m.group("mday3")), today)
+    return _month_day(_MONTHS[m.group("mon2")], int(m.group("mday2")), today)
+
+
+def _resolve_time(m: "re.Match") -> Optional[time]:
+    if m.group("iso_h"):
+        return _clock(m.group("iso_h"), m.group("iso_m"), None)
+    if m.group("h"):
+        return _clock(m.group("h"), m.group("m"), m.group("ampm"))
+    if m.group("h2"):
+        return _clock(m.group("h2"), None, m.group("ampm2"))
+    if m.group("h3"):
+        return _bare_hour(m.group("h3"))
+    return time(12, 0)  # noon / midday
+
+
+def extract(message: str, now: Optional[datetime] = None) -> Intent:
+    """
+    Intent and the first date/time spans of `message`, in one pass. Dates resolve against
+    `now`, the clinic-local current time (default: clinic_now()).
+
+    booking       a booking word ("book", "schedule", "reserve", "appointment"), or a date and
+                  a time ("2026-11-15 15:00", the reply the fallback suggests after listing
+                  slots) – unless the message also has an availability word or ends in "?"
+                  ("is any appointment available tomorrow at 10am?"), which asks rather than books
+    availability  an availability word ("slots", "available", "free", ...) or just a date
+    unknown       anything else ("hello")
+
+    A booking's time is dropped (at=None, time_text kept) when its date and time isn't after
+    `now`, e.g. "today at 9" sent in the afternoon.
+    """
+    now = now or clinic_now()
+    today = now.date()
+    text = (message or "").lower()
+    book = avail = False
+    day = at = None
+    date_text = time_text = None
+
+    for m in _TOKEN_RE.finditer(text):
+        kind = m.lastgroup
+        if kind == "book":
+            book = True
+        elif kind == "avail":
+            avail = True
+        elif kind in ("h", "m", "ampm", "h2", "ampm2", "h3", "noon"):
+            if at is None:
+                at = _resolve_time(m)
+                time_text = m.group(0) if at is not None else None
+        elif day is None:
+            day = _resolve_date(m, today)
+            if day is not None:
+                date_text = m.group(0)
+                if m.group("iso_h") and at is None:
+                    at = _resolve_time(m)
+                    time_text = m.group(0) if at is not None else None
+
+    if book or (day is not None and at is not None):
+        kind = AVAILABILITY if avail or text.rstrip().endswith("?") else BOOKING
+    elif avail or day is not None:
+        kind = AVAILABILITY
+    else:
+        kind = UNKNOWN
+    if kind == BOOKING and day is not None and at is not None and datetime.combine(day, at) <= now.replace(tzinfo=None):
+        at = None
+    return Intent(kind, day, at, date_text, time_text)
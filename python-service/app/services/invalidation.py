@@ -0,0 +1,280 @@
+# app/services/invalidation.py
+#
+# Cross-worker coherence of the in-process caches (availability index, check_availability
+# payloads, session history windows) over Postgres LISTEN/NOTIFY.
+#
+# Writes publish a compact JSON event on CACHE_INVALIDATION_CHANNEL in the transaction that
+# makes the change, so it is delivered exactly when (and only if) the change commits:
+#   {"w": worker, "p": provider, "b": [[start, end], ...]}   bookings (epoch seconds)
+#   {"w": worker, "s": session_id}                           new messages in a session
+# Booking and chat statements carry the pg_notify in their own RETURNING list, so publishing
+# costs no extra round trip.
+#
+# Each worker runs one listener thread on its own connection. Bookings are applied like the
+# local write-through (set the minutes in cached days, drop cached payloads), so hit rates
+# survive; a session event drops that session's history window. A worker skips its own
+# events. After every (re)connect the listener clears those caches: anything cached while
+# it wasn't listening may have missed an event.
+#
+# Writes made outside the service (psql, other apps) publish nothing and are still only
+# picked up by TTL.
+
+import json
+import logging
+import math
+import select
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import psycopg2
+from psycopg2 import sql
+
+from ..core import config
+from . import availability, history, response_cache
+
+logger = logging.getLogger("python-service.invalidation")
+
+# Identifies this process's events (its own listener ignores them)
+WORKER_ID = uuid.uuid4().hex[:12]
+
+# Appended to an INSERT's RETURNING list: one event per inserted row, sent on commit.
+# Positional and named variants for the statements' placeholder styles; empty with
+# CACHE_INVALIDATION off.
+NOTIFY_COLUMN = ", pg_notify(%s, %s)" if config.CACHE_INVALIDATION else ""
+NOTIFY_COLUMN_NAMED = ", pg_notify(%(channel)s, %(event)s)" if config.CACHE_INVALIDATION else ""
+
+# Several events in one statement (bulk import)
+NOTIFY_SQL = "SELECT pg_notify(%s, e) FROM unnest(%s::text[]) AS e"
+
+# Keeps a bulk event well under NOTIFY's 8000-byte payload limit
+SPANS_PER_EVENT = 100
+
+# The listener pings an idle connection this often (seconds) to notice a dead server
+PING_INTERVAL = 15.0
+RECONNECT_DELAYS = (0.5, 1.0, 2.0, 5.0)
+
+
+# ---------- Publishing ----------
+
+def _event(**fields: Any) -> str:
+    return json.dumps({"w": WORKER_ID, **fields}, separators=(",", ":"), ensure_ascii=False)
+
+
+def _span(start: datetime, end: datetime) -> List[int]:
+    # Whole seconds, widened outwards: partial minutes count as taken anyway
+    return [math.floor(start.timestamp()), math.ceil(end.timestamp())]
+
+
+def booked_events(bookings: Iterable[Tuple[str, datetime, datetime]]) -> List[str]:
+    """Events for committed (provider, start, end) bookings, grouped by provider."""
+    spans: Dict[str, List[List[int]]] = {}
+    for provider, start, end in bookings:
+        spans.setdefault(provider, []).append(_span(start, end))
+    return [
+        _event(p=provider, b=provider_spans[i:i + SPANS_PER_EVENT])
+        for provider, provider_spans in spans.items()
+        for i in range(0, len(provider_spans), SPANS_PER_EVENT)
+    ]
+
+
+def session_event(session_id: str) -> str:
+    return _event(s=str(session_id))
+
+
+def notify_args(event: str) -> Tuple[str, ...]:
+    """Parameters for NOTIFY_COLUMN (none with CACHE_INVALIDATION off)."""
+    return (config.CACHE_INVALIDATION_CHANNEL, event) if config.CACHE_INVALIDATION else ()
+
+
+def notify_params(event: str) -> Dict[str, str]:
+    """Parameters for NOTIFY_COLUMN_NAMED."""
+    return {"channel": config.CACHE_INVALIDATION_CHANNEL, "event": event}
+
+
+def notify_many_params(events: List[str]) -> Tuple[str, List[str]]:
+    """Parameters for NOTIFY_SQL."""
+    return (config.CACHE_INVALIDATION_CHANNEL, events)
+
+
+# ---------- Applying ----------
+
+def _clear_all() -> None:
+    availability.clear()
+    response_cache.clear_availability()
+    history.clear()
+
+
+def apply(payload: str) -> str:
+    """Apply one event to this worker's caches; returns what it was ("booked", "session", "own", "ignored")."""
+    event = json.loads(payload)
+    if event.get("w") == WORKER_ID:
+        return "own"
+    if "s" in event:
+        history.forget(event["s"])
+        return "session"
+    if "p" in event:
+        from .scheduling import _clinic_tz
+        tz = _clinic_tz()
+        for start, end in event["b"]:
+            start_dt = datetime.fromtimestamp(start, timezone.utc).astimezone(tz)
+            end_dt = datetime.fromtimestamp(end, timezone.utc).astimezone(tz)
+            availability.mark_booked(event["p"], start_dt, end_dt)
+            response_cache.invalidate_availability(event["p"], start_dt, end_dt)
+        return "booked"
+    return "ignored"
+
+
+class Listener:
+    """
+    One LISTEN connection per worker, on a daemon thread.
+
+    - events are applied as they arrive (see apply)
+    - a lost connection is re-opened with backoff; every successful LISTEN clears the
+      caches it keeps coherent
+    - stop() returns within about a second
+    """
+
+    def __init__(self, channel: str = config.CACHE_INVALIDATION_CHANNEL, ping_interval: float = PING_INTERVAL):
+        self.channel = channel
+        self.ping_interval = ping_interval
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._connected = False
+        self._counters = {
+            "received": 0,
+            "booked": 0,
+            "session": 0,
+            "own": 0,
+            "ignored": 0,
+            "malformed": 0,
+            "connects": 0,
+            "connection_errors": 0,
+            "resyncs": 0,
+        }
+
+    # ---------- lifecycle ----------
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="cache-invalidation-listener", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    # ---------- connection ----------
+
+    def _listen(self):
+        conn = psycopg2.connect(
+            host=config.DB_HOST,
+            port=config.DB_PORT,
+            user=config.DB_USER,
+            password=config.DB_PASSWORD,
+            dbname=config.DB_NAME,
+            application_name=f"python-service listener {WORKER_ID}",
+        )
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            cur.execute(sql.SQL("LISTEN {}").format(sql.Identifier(self.channel)))
+        return conn
+
+    def _run(self) -> None:
+        failures = 0
+        while not self._stopping.is_set():
+            try:
+                conn = self._listen()
+            except Exception as e:
+                delay = RECONNECT_DELAYS[min(failures, len(RECONNECT_DELAYS) - 1)]
+                failures += 1
+                with self._lock:
+                    self._counters["connection_errors"] += 1
+                logger.warning("cache invalidation listener can't connect (%s); retrying in %.1fs", e, delay)
+                self._stopping.wait(delay)
+                continue
+
+            failures = 0
+            self._resync()
+            try:
+                self._drain(conn)
+            except Exception as e:
+                with self._lock:
+                    self._counters["connection_errors"] += 1
+                if not self._stopping.is_set():
+                    logger.warning("cache invalidation listener lost its connection: %s", e)
+            finally:
+                with self._lock:
+                    self._connected = False
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+
+    def _resync(self) -> None:
+        # Events published before LISTEN took effect are lost to us: start from empty caches.
+        _clear_all()
+        with self._lock:
+            self._connected = True
+            self._counters["connects"] += 1
+            self._counters["resyncs"] += 1
+
+    def _drain(self, conn) -> None:
+        last_seen = time.monotonic()
+        while not self._stopping.is_set():
+            if select.select([conn], [], [], 1.0)[0]:
+                conn.poll()
+                last_seen = time.monotonic()
+            elif time.monotonic() - last_seen >= self.ping_interval:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT 1")
+                last_seen = time.monotonic()
+            while conn.notifies:
+                self._handle(conn.notifies.pop(0).payload)
+
+    def _handle(self, payload: str) -> None:
+        try:
+            kind = apply(payload)
+        except Exception:
+            logger.warning("ignoring malformed cache invalidation event: %.200s", payload)
+            kind = "malformed"
+        with self._lock:
+            self._counters["received"] += 1
+            self._counters[kind] += 1
+
+    # ---------- metrics ----------
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"worker": WORKER_ID, "channel": self.channel, "connected": self._connected, **self._counters}
+
+
+_listener: Optional[Listener] = None
+_listener_lock = threading.Lock()
+
+
+def start_listener() -> None:
+    """Start this worker's listener (no-op with CACHE_INVALIDATION off or if running)."""
+    global _listener
+    if not config.CACHE_INVALIDATION:
+        return
+    with _listener_lock:
+        if _listener is None:
+            listener = Listener()
+            listener.start()
+            _listener = listener
+
+
+def stop_listener() -> None:
+    global _listener
+    with _listener_lock:
+        listener, _listener = _listener, None
+    if listener is not None:
+        listener.stop()
+
+
+def invalidation_stats() -> Dict[str, Any]:
+    return _listener.stats() if _listener is not None else {}
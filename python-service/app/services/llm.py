@@ -4,12 +4,21 @@ import json
 import os
 import sys
 import logging
-from typing import List, Dict, Any, Optional
-from datetime import datetime, time, timedelta
-from zoneinfo import ZoneInfo
-
-from ..core import config
-from .scheduling import list_available_slots, create_appointment
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar, copy_context
+from typing import List, Dict, Any, Optional, Iterator, AsyncIterator, Tuple
+from datetime import datetime, timedelta
+
+from ..core import config, metrics
+from .scheduling import list_available_slots, create_appointment, alist_available_slots, acreate_appointment
+from .scheduling import list_available_slots_range, alist_available_slots_range, find_next_slots, afind_next_slots
+from .scheduling import SlotTaken
+from .dates import parse_user_date, parse_user_datetime
+from .tool_executor import ToolCall, dedupe, run_tools, arun_tools, iter_results, aiter_results
+from . import response_cache
+from .response_cache import Plan
 
 # ---------- Logging ----------
 LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
@@ -20,167 +29,312 @@ logging.basicConfig(
 )
 logger = logging.getLogger("python-service.llm")
 
-# ---------- Time helpers: timezone-aware + future-biased ----------
+# ---------- Tool implementations (shared by the sync and async paths) ----------
 
-def _now_tz() -> datetime:
-    tz_name = os.getenv("TZ_NAME", "Asia/Dubai")  # set in docker-compose
+def _normalize_datetime(text: str) -> str:
     try:
-        tz = ZoneInfo(tz_name)
-    except Exception:
-        tz = ZoneInfo("UTC")
-    return datetime.now(tz)
-
-def _has_year(text: str) -> bool:
-    import re
-    return bool(re.search(r"\b20\d{2}\b", text or ""))
-
-def _coerce_future(dt: datetime, now: datetime, original_text: str) -> datetime:
-    if dt >= now:
-        return dt
-    if not _has_year(original_text):
-        for _ in range(3):
-            try:
-                dt = dt.replace(year=dt.year + 1)
-            except ValueError:
-                dt = dt + timedelta(days=365)
-            if dt >= now:
-                return dt
-    while dt < now:
-        dt += timedelta(days=1)
-    return dt
-
-def _try_dateparser(text: str, now: datetime) -> Optional[datetime]:
+        dt = parse_user_datetime(text)
+        payload = {"input": text, "normalized": dt.isoformat()}
+        logger.info("[normalize_datetime] payload=%s", payload)
+        return json.dumps(payload)
+    except Exception as e:
+        err = {"input": text, "error": str(e)}
+        logger.warning("[normalize_datetime] failed: %s", err)
+        return json.dumps(err)
+
+def _availability_payload(date_dt: datetime, slots) -> str:
+    out = [{"start": s.isoformat(), "end": e.isoformat()} for s, e in slots]
+    payload = {"slots": out, "date": date_dt.date().isoformat()}
+    logger.info("[check_availability] parsed=%s slots=%d", date_dt.isoformat(), len(out))
+    return json.dumps(payload)
+
+def _check_availability(date: str) -> str:
     try:
-        import dateparser as dp
-    except Exception:
+        logger.info("[check_availability] raw date arg=%r", date)
+        date_dt = parse_user_date(date)
+        cached = response_cache.get_availability(config.DEFAULT_PROVIDER, date_dt.date())
+        if cached is not None:
+            return cached
+        seq_before = response_cache.availability_seq()
+        payload = _availability_payload(date_dt, list_available_slots(date_dt))
+        response_cache.put_availability(config.DEFAULT_PROVIDER, date_dt.date(), payload, seq_before)
+        return payload
+    except Exception as e:
+        logger.exception("[check_availability] error for arg=%r", date)
+        return json.dumps({"error": f"Could not parse date '{date}': {e}"})
+
+async def _acheck_availability(date: str) -> str:
+    try:
+        logger.info("[check_availability] raw date arg=%r", date)
+        date_dt = parse_user_date(date)
+        cached = response_cache.get_availability(config.DEFAULT_PROVIDER, date_dt.date())
+        if cached is not None:
+            return cached
+        seq_before = response_cache.availability_seq()
+        payload = _availability_payload(date_dt, await alist_available_slots(date_dt))
+        response_cache.put_availability(config.DEFAULT_PROVIDER, date_dt.date(), payload, seq_before)
+        return payload
+    except Exception as e:
+        logger.exception("[check_availability] error for arg=%r", date)
+        return json.dumps({"error": f"Could not parse date '{date}': {e}"})
+
+def _slot_dicts(slots) -> List[Dict[str, str]]:
+    return [{"start": s.isoformat(), "end": e.isoformat()} for s, e in slots]
+
+def _range_bounds(start_date: str, end_date: str):
+    start_dt = parse_user_date(start_date)
+    end_dt = parse_user_date(end_date)
+    return start_dt, max(end_dt, start_dt + timedelta(days=1))
+
+def _range_payload(start_dt: datetime, end_dt: datetime, by_day) -> str:
+    days = [{"date": d.isoformat(), "slots": _slot_dicts(slots)} for d, slots in by_day.items()]
+    payload = {"from": start_dt.date().isoformat(), "to": end_dt.date().isoformat(), "days": days}
+    logger.info(
+        "[check_availability_range] %s..%s days=%d slots=%d",
+        payload["from"], payload["to"], len(days), sum(len(d["slots"]) for d in days),
+    )
+    return json.dumps(payload)
+
+def _check_availability_range(start_date: str, end_date: str) -> str:
+    try:
+        logger.info("[check_availability_range] raw args=%r..%r", start_date, end_date)
+        start_dt, end_dt = _range_bounds(start_date, end_date)
+        return _range_payload(start_dt, end_dt, list_available_slots_range(start_dt, end_dt))
+    except Exception as e:
+        logger.exception("[check_availability_range] error for args=%r..%r", start_date, end_date)
+        return json.dumps({"error": f"Could not check '{start_date}'..'{end_date}': {e}"})
+
+async def _acheck_availability_range(start_date: str, end_date: str) -> str:
+    try:
+        logger.info("[check_availability_range] raw args=%r..%r", start_date, end_date)
+        start_dt, end_dt = _range_bounds(start_date, end_date)
+        return _range_payload(start_dt, end_dt, await alist_available_slots_range(start_dt, end_dt))
+    except Exception as e:
+        logger.exception("[check_availability_range] error for args=%r..%r", start_date, end_date)
+        return json.dumps({"error": f"Could not check '{start_date}'..'{end_date}': {e}"})
+
+def _parse_after(after: str) -> Optional[datetime]:
+    if not after or after.strip().lower() == "now":
         return None
-    settings = {
-        "PREFER_DATES_FROM": "future",
-        "RELATIVE_BASE": now,
-        "TIMEZONE": str(now.tzinfo) if now.tzinfo else "UTC",
-        "RETURN_AS_TIMEZONE_AWARE": True,
+    return parse_user_datetime(after)
+
+def _next_payload(after_dt: Optional[datetime], slots) -> str:
+    payload = {"after": after_dt.isoformat() if after_dt else "now", "slots": _slot_dicts(slots)}
+    logger.info("[find_next_available] after=%s slots=%d", payload["after"], len(slots))
+    return json.dumps(payload)
+
+def _find_next_available(after: str, count: int) -> str:
+    try:
+        logger.info("[find_next_available] raw after arg=%r count=%s", after, count)
+        after_dt = _parse_after(after)
+        return _next_payload(after_dt, find_next_slots(after_dt, count))
+    except Exception as e:
+        logger.exception("[find_next_available] error for arg=%r", after)
+        return json.dumps({"error": f"Could not search after '{after}': {e}"})
+
+async def _afind_next_available(after: str, count: int) -> str:
+    try:
+        logger.info("[find_next_available] raw after arg=%r count=%s", after, count)
+        after_dt = _parse_after(after)
+        return _next_payload(after_dt, await afind_next_slots(after_dt, count))
+    except Exception as e:
+        logger.exception("[find_next_available] error for arg=%r", after)
+        return json.dumps({"error": f"Could not search after '{after}': {e}"})
+
+def _booking_args_error(user_id: str, start_iso: str) -> Optional[str]:
+    if not user_id:
+        return json.dumps({"error": "AUTH_MISSING_USER_ID"})
+    if not start_iso:
+        return json.dumps({"error": "Missing start_iso (e.g., 'tomorrow 09:30')."})
+    return None
+
+def _booking_payload(appt_id, s: datetime, e: datetime, provider: str, location: str) -> str:
+    payload = {
+        "appointment_id": appt_id,
+        "start": s.isoformat(),
+        "end": e.isoformat(),
+        "provider": provider,
+        "location": location,
+        "status": "pending",
     }
-    return dp.parse(text, settings=settings)
-
-def parse_user_date(text: str) -> datetime:
-    """Parse natural language date → midnight in clinic TZ, coerced to future."""
-    now = _now_tz()
-    dt = _try_dateparser(text, now)
-    if dt is None:
-        lower = (text or "").lower()
-        if "tomorrow" in lower:
-            dt = (now + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
-        elif "today" in lower:
-            dt = now.replace(hour=0, minute=0, second=0, microsecond=0)
-        else:
-            from dateutil import parser as du
-            dt = du.parse(text, default=now)
-            if dt.tzinfo is None:
-                dt = dt.replace(tzinfo=now.tzinfo)
-            dt = dt.replace(hour=0, minute=0, second=0, microsecond=0)
-    dt = _coerce_future(dt, now, text)
-    parsed = dt.replace(hour=0, minute=0, second=0, microsecond=0)
-    logger.info("[parse_user_date] raw=%r -> parsed=%s", text, parsed.isoformat())
-    return parsed
-
-def parse_user_datetime(text: str) -> datetime:
-    """Parse natural language datetime → tz-aware, coerced to future."""
-    now = _now_tz()
-    dt = _try_dateparser(text, now)
-    if dt is None:
-        lower = (text or "").lower()
-        if "tomorrow" in lower:
-            base = (now + timedelta(days=1)).replace(minute=0, second=0, microsecond=0)
-            dt = base.replace(hour=9)  # default hour if none provided
-        elif "today" in lower:
-            dt = now.replace(minute=0, second=0, microsecond=0)
-        else:
-            from dateutil import parser as du
-            dt = du.parse(text, default=now)
-            if dt.tzinfo is None:
-                dt = dt.replace(tzinfo=now.tzinfo)
-    dt = _coerce_future(dt, now, text)
-    logger.info("[parse_user_datetime] raw=%r -> parsed=%s", text, dt.isoformat())
-    return dt
+    logger.info("[schedule_appointment] created id=%s start=%s end=%s", appt_id, s.isoformat(), e.isoformat())
+    return json.dumps(payload)
+
+def _slot_taken_payload(e: SlotTaken) -> str:
+    payload = {
+        "error": "SLOT_TAKEN",
+        "requested_start": e.start.isoformat(),
+        "provider": e.provider,
+        "alternatives": _slot_dicts(e.alternatives),
+    }
+    logger.info("[schedule_appointment] slot taken start=%s alternatives=%d", payload["requested_start"], len(e.alternatives))
+    return json.dumps(payload)
+
+def _schedule_appointment(user_id: str, start_iso: str, duration_minutes: int) -> str:
+    err = _booking_args_error(user_id, start_iso)
+    if err:
+        return err
+    try:
+        logger.info("[schedule_appointment] raw start arg=%r user_id=%s", start_iso, user_id)
+        start_dt = parse_user_datetime(start_iso)
+        return _booking_payload(*create_appointment(user_id, start_dt.isoformat(), duration_minutes))
+    except SlotTaken as e:
+        return _slot_taken_payload(e)
+    except Exception as e:
+        logger.exception("[schedule_appointment] error")
+        return json.dumps({"error": str(e)})
+
+async def _aschedule_appointment(user_id: str, start_iso: str, duration_minutes: int) -> str:
+    err = _booking_args_error(user_id, start_iso)
+    if err:
+        return err
+    try:
+        logger.info("[schedule_appointment] raw start arg=%r user_id=%s", start_iso, user_id)
+        start_dt = parse_user_datetime(start_iso)
+        return _booking_payload(*await acreate_appointment(user_id, start_dt.isoformat(), duration_minutes))
+    except SlotTaken as e:
+        return _slot_taken_payload(e)
+    except Exception as e:
+        logger.exception("[schedule_appointment] error")
+        return json.dumps({"error": str(e)})
+
+# ---------- Model/tool registry (built once per process) ----------
+
+# The authenticated user for the turn being processed. Tools read it from here instead of
+# closing over it, so the same tool objects serve every request (contextvars follow both
+# threads and asyncio tasks).
+_current_user_id: ContextVar[Optional[str]] = ContextVar("current_user_id", default=None)
+
+class LLMRegistry:
+    """Long-lived tool-bound model plus the pooled HTTP clients it talks through."""
+
+    def __init__(self):
+        # Lazy imports
+        import httpx
+        from langchain_openai import ChatOpenAI
+        from langchain_core.tools import StructuredTool
+
+        def normalize_datetime(text: str) -> str:
+            """
+            Normalize natural language like 'tomorrow 09:30' to an ISO datetime (clinic TZ, future).
+            Useful for debugging what the model thinks the datetime is.
+            """
+            return _normalize_datetime(text)
+
+        async def anormalize_datetime(text: str) -> str:
+            return _normalize_datetime(text)
+
+        def check_availability(date: str) -> str:
+            """
+            Return JSON slots for the given date (YYYY-MM-DD or 'tomorrow').
+            Always interpreted in clinic timezone, preferring future dates.
+            """
+            return _check_availability(date)
+
+        async def acheck_availability(date: str) -> str:
+            return await _acheck_availability(date)
+
+        def check_availability_range(start_date: str, end_date: str) -> str:
+            """
+            Return JSON free slots per day from start_date up to (not including) end_date,
+            e.g. a whole week. Dates as YYYY-MM-DD or natural language, clinic timezone.
+            At most 31 days; use this instead of calling check_availability once per day.
+            """
+            return _check_availability_range(start_date, end_date)
+
+        async def acheck_availability_range(start_date: str, end_date: str) -> str:
+            return await _acheck_availability_range(start_date, end_date)
+
+        def find_next_available(after: str = "now", count: int = 5) -> str:
+            """
+            Return JSON with the earliest `count` free slots starting at or after `after`
+            ('now', 'next monday', ISO datetime). Use for "what's the earliest opening?".
+            """
+            return _find_next_available(after, count)
+
+        async def afind_next_available(after: str = "now", count: int = 5) -> str:
+            return await _afind_next_available(after, count)
+
+        def schedule_appointment(start_iso: str, duration_minutes: int = config.DEFAULT_APPT_MIN) -> str:
+            """
+            Create a pending appointment for the CURRENT AUTHENTICATED USER.
+            Accepts natural language like 'tomorrow 09:30' or full ISO.
+            Interprets in clinic timezone and coerces to future.
+            """
+            return _schedule_appointment(_current_user_id.get(), start_iso, duration_minutes)
+
+        async def aschedule_appointment(start_iso: str, duration_minutes: int = config.DEFAULT_APPT_MIN) -> str:
+            return await _aschedule_appointment(_current_user_id.get(), start_iso, duration_minutes)
+
+        self.tools = {
+            fn.__name__: StructuredTool.from_function(func=fn, coroutine=afn)
+            for fn, afn in [
+                (normalize_datetime, anormalize_datetime),
+                (check_availability, acheck_availability),
+                (check_availability_range, acheck_availability_range),
+                (find_next_available, afind_next_available),
+                (schedule_appointment, aschedule_appointment),
+            ]
+        }
+
+        limits = httpx.Limits(
+            max_connections=config.LLM_HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=config.LLM_HTTP_MAX_KEEPALIVE,
+        )
+        self.http_client = httpx.Client(limits=limits, timeout=config.LLM_TIMEOUT)
+        self.http_async_client = httpx.AsyncClient(limits=limits, timeout=config.LLM_TIMEOUT)
+
+        llm = ChatOpenAI(
+            model=config.OPENAI_MODEL,
+            temperature=0,
+            base_url=config.OPENAI_BASE_URL,
+            timeout=config.LLM_TIMEOUT,
+            http_client=self.http_client,
+            http_async_client=self.http_async_client,
+        )
+        self.llm_with_tools = llm.bind_tools(list(self.tools.values()))
+
+    async def aclose(self) -> None:
+        self.http_client.close()
+        await self.http_async_client.aclose()
+
+_registry: Optional[LLMRegistry] = None
+_registry_lock = threading.Lock()
+
+def get_registry() -> LLMRegistry:
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                t0 = time.perf_counter()
+                _registry = LLMRegistry()
+                logger.info("LLM registry built in %.1f ms", (time.perf_counter() - t0) * 1000)
+    return _registry
+
+async def close_registry() -> None:
+    global _registry
+    registry, _registry = _registry, None
+    if registry is not None:
+        await registry.aclose()
+
+@contextmanager
+def _as_user(user_id: str):
+    token = _current_user_id.set(user_id)
+    try:
+        yield
+    finally:
+        _current_user_id.reset(token)
 
 # ---------- LLM path (LLM chooses tools; we render final reply) ----------
 
-def chat_with_llm(message: str, user_id: str, history_rows: List[Dict[str, Any]]) -> str:
-    if not config.USE_LLM:
-        raise RuntimeError("LLM disabled (no OPENAI_API_KEY).")
+# Prior messages the model sees (and the plan cache keys on)
+MODEL_HISTORY_MESSAGES = 6
+
+def _model_history(history_rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return history_rows[-MODEL_HISTORY_MESSAGES:]
 
-    # Lazy imports
-    from langchain_openai import ChatOpenAI
-    from langchain_core.messages import SystemMessage, HumanMessage, AIMessage, ToolMessage
-    from langchain_core.tools import tool
-
-    @tool
-    def normalize_datetime(text: str) -> str:
-        """
-        Normalize natural language like 'tomorrow 09:30' to an ISO datetime (clinic TZ, future).
-        Useful for debugging what the model thinks the datetime is.
-        """
-        try:
-            dt = parse_user_datetime(text)
-            payload = {"input": text, "normalized": dt.isoformat()}
-            logger.info("[normalize_datetime] payload=%s", payload)
-            return json.dumps(payload)
-        except Exception as e:
-            err = {"input": text, "error": str(e)}
-            logger.warning("[normalize_datetime] failed: %s", err)
-            return json.dumps(err)
-
-    @tool
-    def check_availability(date: str) -> str:
-        """
-        Return JSON slots for the given date (YYYY-MM-DD or 'tomorrow').
-        Always interpreted in clinic timezone, preferring future dates.
-        """
-        try:
-            logger.info("[check_availability] raw date arg=%r", date)
-            date_dt = parse_user_date(date)
-            slots = list_available_slots(date_dt)
-            out = [{"start": s.isoformat(), "end": e.isoformat()} for s, e in slots]
-            payload = {"slots": out, "date": date_dt.date().isoformat()}
-            logger.info("[check_availability] parsed=%s slots=%d", date_dt.isoformat(), len(out))
-            return json.dumps(payload)
-        except Exception as e:
-            logger.exception("[check_availability] error for arg=%r", date)
-            return json.dumps({"error": f"Could not parse date '{date}': {e}"})
-
-    @tool
-    def schedule_appointment(start_iso: str, duration_minutes: int = config.DEFAULT_APPT_MIN) -> str:
-        """
-        Create a pending appointment for the CURRENT AUTHENTICATED USER.
-        Accepts natural language like 'tomorrow 09:30' or full ISO.
-        Interprets in clinic timezone and coerces to future.
-        """
-        uid = user_id
-        if not uid:
-            return json.dumps({"error": "AUTH_MISSING_USER_ID"})
-        if not start_iso:
-            return json.dumps({"error": "Missing start_iso (e.g., 'tomorrow 09:30')."})
-        try:
-            logger.info("[schedule_appointment] raw start arg=%r user_id=%s", start_iso, uid)
-            start_dt = parse_user_datetime(start_iso)
-            appt_id, s, e, provider, location = create_appointment(uid, start_dt.isoformat(), duration_minutes)
-            payload = {
-                "appointment_id": appt_id,
-                "start": s.isoformat(),
-                "end": e.isoformat(),
-                "provider": provider,
-                "location": location,
-                "status": "pending",
-            }
-            logger.info("[schedule_appointment] created id=%s start=%s end=%s", appt_id, s.isoformat(), e.isoformat())
-            return json.dumps(payload)
-        except Exception as e:
-            logger.exception("[schedule_appointment] error")
-            return json.dumps({"error": str(e)})
-
-    llm = ChatOpenAI(model=os.getenv("OPENAI_MODEL", "gpt-4o-mini"), temperature=0)
-    tools = [normalize_datetime, check_availability, schedule_appointment]
-    llm_with_tools = llm.bind_tools(tools)
+def _build_messages(message: str, history_rows: List[Dict[str, Any]]) -> list:
+    from langchain_core.messages import SystemMessage, HumanMessage, AIMessage
 
     tz_name = os.getenv("TZ_NAME", "Asia/Dubai")
     system = SystemMessage(
@@ -190,103 +344,331 @@ def chat_with_llm(message: str, user_id: str, history_rows: List[Dict[str, Any]]
             f"ALWAYS use the clinic timezone '{tz_name}' and prefer FUTURE dates. "
             "When you need a concrete datetime, first call the 'normalize_datetime' tool "
             "to convert natural language to an ISO datetime, then call the appropriate tool. "
+            "For several days or the earliest opening, use 'check_availability_range' or "
+            "'find_next_available' instead of one 'check_availability' call per day. "
             "Base responses on tool outputs; do not invent dates or times."
         )
     )
 
-    # Build short context
+    # Build short context: the latest prior messages, then this turn's message
     messages = [system]
-    for row in history_rows[-6:]:
+    for row in _model_history(history_rows):
         if row.get("sender_type") == "user":
             messages.append(HumanMessage(content=row.get("content", "")))
         else:
             messages.append(AIMessage(content=row.get("content", "")))
     messages.append(HumanMessage(content=message))
+    return messages
 
-    logger.info("chat_with_llm: user_id=%s message=%r", user_id, message)
-
-    first = llm_with_tools.invoke(messages)
-
-    # Inspect the model's tool intent
+def _tool_calls(first) -> Optional[List[Dict[str, Any]]]:
+    """Inspect the model's tool intent."""
     tool_calls = getattr(first, "tool_calls", None) or getattr(first, "additional_kwargs", {}).get("tool_calls", None)
     try:
         logger.info("LLM tool_calls: %s", json.dumps(tool_calls, default=str))
     except Exception:
         logger.info("LLM tool_calls: %r", tool_calls)
+    return tool_calls
+
+def _tool_input(name: str, args: Dict[str, Any]) -> Dict[str, Any]:
+    if name == "schedule_appointment":
+        start_iso = args.get("start_iso")
+        duration = int(args.get("duration_minutes", config.DEFAULT_APPT_MIN))
+        return {"start_iso": start_iso, "duration_minutes": duration}
+    return args
+
+def _plan_calls(tool_calls: List[Dict[str, Any]], tools: Dict[str, Any]) -> List[ToolCall]:
+    """Known tool calls of this turn with their inputs, repeats dropped."""
+    calls = []
+    for call in tool_calls:
+        name = call.get("name")
+        args = call.get("args", {}) or {}
+        logger.info("TOOL CALL -> %s ARGS=%s", name, json.dumps(args))
+        if name not in tools:
+            continue
+        calls.append(ToolCall(name, _tool_input(name, args)))
+    unique = dedupe(calls)
+    if len(unique) < len(calls):
+        logger.info("Dropped %d duplicate tool call(s)", len(calls) - len(unique))
+    return unique
+
+def _user_context(user_id: str):
+    """A context the tools run in: the caller's, with the current user set."""
+    with _as_user(user_id):
+        return copy_context()
+
+def _parse_result(name: str, result: str) -> Dict[str, Any]:
+    logger.info("TOOL RESULT <- %s: %s", name, result)
+    return json.loads(result)
+
+def _collect(calls: List[ToolCall], outputs: List[str]) -> List[Tuple[ToolCall, Dict[str, Any]]]:
+    """(call, result) pairs in call order; every call of a tool is kept."""
+    return [(call, _parse_result(call.name, out)) for call, out in zip(calls, outputs)]
+
+def _plan_key(message: str, history_rows: List[Dict[str, Any]]):
+    return response_cache.plan_key(message, _model_history(history_rows))
+
+def _cached_plan(key) -> Optional[Plan]:
+    plan = response_cache.get_plan(key)
+    if plan is not None:
+        logger.info("Plan cache hit; skipping the model (tool calls: %s)", [c.name for c in plan.calls])
+    return plan
+
+def _plan(first, tools: Dict[str, Any], key) -> Plan:
+    """The model's decision as a Plan (known tool calls, deduped), remembered under `key`."""
+    tool_calls = _tool_calls(first)
+    if not tool_calls:
+        logger.info("No tool calls; returning model text.")
+    plan = Plan(first.content, tuple(_plan_calls(tool_calls, tools)) if tool_calls else ())
+    response_cache.put_plan(key, plan)
+    return plan
+
+def _render_availability(availability_json: Dict[str, Any]) -> str:
+    if "error" in availability_json:
+        return "Sorry, I couldn't parse that date. Try 'YYYY-MM-DD' or 'tomorrow'."
+    date_str = availability_json.get("date")
+    slots = availability_json.get("slots", [])
+    if slots:
+        times = ", ".join(
+            datetime.fromisoformat(s["start"]).strftime("%H:%M") for s in slots[:8]
+        )
+        return f"Available 30-min slots on {date_str}: {times}."
+    return f"No available 30-min slots on {date_str}. Try another day?"
+
+def _render_range(range_json: Dict[str, Any]) -> str:
+    if "error" in range_json:
+        return "Sorry, I couldn't check that date range. Try 'YYYY-MM-DD' dates up to a month apart."
+    open_days = [d for d in range_json.get("days", []) if d["slots"]]
+    if open_days:
+        days_text = "; ".join(
+            f"{d['date']}: " + ", ".join(
+                datetime.fromisoformat(s["start"]).strftime("%H:%M") for s in d["slots"][:4]
+            )
+            for d in open_days[:7]
+        )
+        return f"Available 30-min slots: {days_text}."
+    return (
+        f"No available 30-min slots between {range_json['from']} and {range_json['to']}. "
+        "Try other dates?"
+    )
+
+def _render_next(next_json: Dict[str, Any]) -> str:
+    if "error" in next_json:
+        return "Sorry, I couldn't search for the next opening. Try a date like 'YYYY-MM-DD'."
+    slots = next_json.get("slots", [])
+    if slots:
+        times = ", ".join(
+            datetime.fromisoformat(s["start"]).strftime("%Y-%m-%d %H:%M") for s in slots
+        )
+        return f"Earliest available 30-min slots: {times}."
+    return "No available 30-min slots in the coming weeks."
+
+def _render_booking(booking_json: Dict[str, Any]) -> str:
+    if booking_json.get("error") == "SLOT_TAKEN":
+        start_h = datetime.fromisoformat(booking_json["requested_start"]).strftime("%Y-%m-%d %H:%M")
+        alternatives = booking_json.get("alternatives", [])
+        if alternatives:
+            times = ", ".join(
+                datetime.fromisoformat(s["start"]).strftime("%Y-%m-%d %H:%M") for s in alternatives
+            )
+            return f"Sorry, {start_h} is already taken. The next openings are: {times}."
+        return f"Sorry, {start_h} is already taken and there are no openings in the coming weeks."
+    if "error" in booking_json:
+        return f"Couldn't create the appointment: {booking_json['error']}"
+    start_h = datetime.fromisoformat(booking_json["start"]).strftime("%Y-%m-%d %H:%M")
+    return (
+        f"Booked a pending appointment for {start_h} with "
+        f"{booking_json['provider']} at {booking_json['location']} "
+        f"(ID: {booking_json['appointment_id']})."
+    )
+
+# User-visible tool results, in the order they appear in the reply (calls of the same tool
+# in call order)
+_RENDERERS = {
+    "check_availability": _render_availability,
+    "check_availability_range": _render_range,
+    "find_next_available": _render_next,
+    "schedule_appointment": _render_booking,
+}
+
+def _render_part(name: str, result: Dict[str, Any]) -> Optional[str]:
+    """Reply text for one tool result (None for tools that aren't shown, e.g. normalize_datetime)."""
+    if name == "normalize_datetime":
+        # purely for visibility; usually we don't show this to the end user
+        if "normalized" in result:
+            logger.info("Normalized datetime: %s", result["normalized"])
+        return None
+    render = _RENDERERS.get(name)
+    return render(result) if render and result else None
+
+@metrics.stage("render")
+def _render_reply(content: str, results: List[Tuple[ToolCall, Dict[str, Any]]]) -> str:
+    """Deterministic rendering of tool results (no second LLM pass); `content` is the model text."""
+    for call, result in results:
+        if call.name == "normalize_datetime":
+            _render_part(call.name, result)
+    order = {name: i for i, name in enumerate(_RENDERERS)}
+    shown = sorted((r for r in results if r[0].name in order), key=lambda r: order[r[0].name])
+    parts = [part for part in (_render_part(call.name, result) for call, result in shown) if part]
+
+    if parts:
+        final_reply = " ".join(parts)
+        logger.info("Final reply: %s", final_reply)
+        return final_reply
+
+    # Fallback if tools returned nothing meaningful
+    logger.warning("No meaningful tool results; returning model text.")
+    return content
+
+def chat_with_llm(message: str, user_id: str, history_rows: List[Dict[str, Any]]) -> str:
+    if not config.USE_LLM:
+        raise RuntimeError("LLM disabled (no OPENAI_API_KEY).")
+
+    registry = get_registry()
+    tools = registry.tools
+
+    logger.info("chat_with_llm: user_id=%s message=%r", user_id, message)
+
+    key = _plan_key(message, history_rows)
+    plan = _cached_plan(key)
+    if plan is None:
+        with metrics.stage("llm_invoke"):
+            first = registry.llm_with_tools.invoke(_build_messages(message, history_rows))
+        plan = _plan(first, tools, key)
+
+    if not plan.calls:
+        return plan.content
+
+    calls = list(plan.calls)
+    results = _collect(calls, run_tools(tools, calls, _user_context(user_id)))
+    return _render_reply(plan.content, results)
+
+async def achat_with_llm(message: str, user_id: str, history_rows: List[Dict[str, Any]]) -> str:
+    """Async variant of chat_with_llm: `ainvoke` for the model, async DB for the tools."""
+    if not config.USE_LLM:
+        raise RuntimeError("LLM disabled (no OPENAI_API_KEY).")
+
+    registry = get_registry()
+    tools = registry.tools
+
+    logger.info("achat_with_llm: user_id=%s message=%r", user_id, message)
+
+    key = _plan_key(message, history_rows)
+    plan = _cached_plan(key)
+    if plan is None:
+        with metrics.stage("llm_invoke"):
+            first = await registry.llm_with_tools.ainvoke(_build_messages(message, history_rows))
+        plan = _plan(first, tools, key)
+
+    if not plan.calls:
+        return plan.content
+
+    calls = list(plan.calls)
+    results = _collect(calls, await arun_tools(tools, calls, _user_context(user_id)))
+    return _render_reply(plan.content, results)
+
+# ---------- Streaming LLM path (events for /chat/stream) ----------
+#
+# Same pipeline as chat_with_llm, produced as (event, data) pairs while it runs:
+#   token {"text"}          model text as it is generated (replies without tool calls)
+#   tool  {"name","status"} "started" for every call of the turn, then "finished" per call
+#   part  {"tool","text"}   the rendered reply part of a tool, as soon as that tool finished
+#                           (read-only tools run concurrently, so parts come in finish order)
+#   reply {"text"}          always last: the full reply, identical to chat_with_llm's
+
+StreamEvent = Tuple[str, Dict[str, Any]]
+
+def _text(chunk) -> str:
+    return chunk.content if isinstance(chunk.content, str) else ""
+
+def _merge_chunk(first, chunk):
+    """Accumulate AIMessageChunks; returns the aggregate and the text to emit as a token."""
+    first = chunk if first is None else first + chunk
+    # Once the model starts a tool call its text isn't the reply; the rendered parts are.
+    return first, ("" if first.tool_call_chunks else _text(chunk))
+
+def _tool_events(name: str, result: Dict[str, Any]) -> List[StreamEvent]:
+    events: List[StreamEvent] = [("tool", {"name": name, "status": "finished"})]
+    part = _render_part(name, result)
+    if part:
+        events.append(("part", {"tool": name, "text": part}))
+    return events
+
+def stream_chat_with_llm(message: str, user_id: str, history_rows: List[Dict[str, Any]]) -> Iterator[StreamEvent]:
+    if not config.USE_LLM:
+        raise RuntimeError("LLM disabled (no OPENAI_API_KEY).")
+
+    registry = get_registry()
+    tools = registry.tools
+
+    logger.info("stream_chat_with_llm: user_id=%s message=%r", user_id, message)
+
+    key = _plan_key(message, history_rows)
+    plan = _cached_plan(key)
+    if plan is None:
+        first = None
+        with metrics.stage("llm_invoke"):
+            for chunk in registry.llm_with_tools.stream(_build_messages(message, history_rows)):
+                first, token = _merge_chunk(first, chunk)
+                if token:
+                    yield "token", {"text": token}
+        if first is None:
+            raise RuntimeError("empty model stream")
+        plan = _plan(first, tools, key)
+    elif not plan.calls and plan.content:
+        yield "token", {"text": plan.content}
+
+    if not plan.calls:
+        yield "reply", {"text": plan.content}
+        return
+
+    calls = list(plan.calls)
+    for call in calls:
+        yield "tool", {"name": call.name, "status": "started"}
+    outputs: List[str] = [""] * len(calls)
+    for i, result in iter_results(tools, calls, _user_context(user_id)):
+        outputs[i] = result
+        yield from _tool_events(calls[i].name, json.loads(result))
+
+    yield "reply", {"text": _render_reply(plan.content, _collect(calls, outputs))}
+
+async def astream_chat_with_llm(
+    message: str, user_id: str, history_rows: List[Dict[str, Any]]
+) -> AsyncIterator[StreamEvent]:
+    """Async variant of stream_chat_with_llm."""
+    if not config.USE_LLM:
+        raise RuntimeError("LLM disabled (no OPENAI_API_KEY).")
 
-    if tool_calls:
-        availability_json = None
-        booking_json = None
-        normalization_json = None
-        tool_msgs: List[ToolMessage] = []
-
-        for call in tool_calls:
-            name = call.get("name")
-            args = call.get("args", {}) or {}
-            logger.info("TOOL CALL -> %s ARGS=%s", name, json.dumps(args))
-
-            if name == "normalize_datetime":
-                result = normalize_datetime.invoke(args)
-                normalization_json = json.loads(result)
-                tool_msgs.append(ToolMessage(content=result, tool_call_id=call.get("id")))
-                logger.info("TOOL RESULT <- normalize_datetime: %s", result)
-
-            elif name == "check_availability":
-                result = check_availability.invoke(args)
-                availability_json = json.loads(result)
-                tool_msgs.append(ToolMessage(content=result, tool_call_id=call.get("id")))
-                logger.info("TOOL RESULT <- check_availability: %s", result)
-
-            elif name == "schedule_appointment":
-                start_iso = args.get("start_iso")
-                duration = int(args.get("duration_minutes", config.DEFAULT_APPT_MIN))
-                result = schedule_appointment.invoke({"start_iso": start_iso, "duration_minutes": duration})
-                booking_json = json.loads(result)
-                tool_msgs.append(ToolMessage(content=result, tool_call_id=call.get("id")))
-                logger.info("TOOL RESULT <- schedule_appointment: %s", result)
-
-        # ----- Deterministic rendering (no second LLM pass) -----
-        parts = []
-
-        if normalization_json:
-            # purely for visibility; usually we don't show this to the end user
-            if "normalized" in normalization_json:
-                logger.info("Normalized datetime: %s", normalization_json["normalized"])
-
-        if availability_json:
-            if "error" in availability_json:
-                parts.append("Sorry, I couldn't parse that date. Try 'YYYY-MM-DD' or 'tomorrow'.")
-            else:
-                date_str = availability_json.get("date")
-                slots = availability_json.get("slots", [])
-                if slots:
-                    times = ", ".join(
-                        datetime.fromisoformat(s["start"]).strftime("%H:%M") for s in slots[:8]
-                    )
-                    parts.append(f"Available 30-min slots on {date_str}: {times}.")
-                else:
-                    parts.append(f"No available 30-min slots on {date_str}. Try another day?")
-
-        if booking_json:
-            if "error" in booking_json:
-                parts.append(f"Couldn't create the appointment: {booking_json['error']}")
-            else:
-                start_h = datetime.fromisoformat(booking_json["start"]).strftime("%Y-%m-%d %H:%M")
-                parts.append(
-                    f"Booked a pending appointment for {start_h} with "
-                    f"{booking_json['provider']} at {booking_json['location']} "
-                    f"(ID: {booking_json['appointment_id']})."
-                )
-
-        if parts:
-            final_reply = " ".join(parts)
-            logger.info("Final reply: %s", final_reply)
-            return final_reply
-
-        # Fallback if tools returned nothing meaningful
-        logger.warning("No meaningful tool results; returning model text.")
-        return first.content
-
-    # No tool call; just return the model text
-    logger.info("No tool calls; returning model text.")
-    return first.content
+    registry = get_registry()
+    tools = registry.tools
+
+    logger.info("astream_chat_with_llm: user_id=%s message=%r", user_id, message)
+
+    key = _plan_key(message, history_rows)
+    plan = _cached_plan(key)
+    if plan is None:
+        first = None
+        with metrics.stage("llm_invoke"):
+            async for chunk in registry.llm_with_tools.astream(_build_messages(message, history_rows)):
+                first, token = _merge_chunk(first, chunk)
+                if token:
+                    yield "token", {"text": token}
+        if first is None:
+            raise RuntimeError("empty model stream")
+        plan = _plan(first, tools, key)
+    elif not plan.calls and plan.content:
+        yield "token", {"text": plan.content}
+
+    if not plan.calls:
+        yield "reply", {"text": plan.content}
+        return
+
+    calls = list(plan.calls)
+    for call in calls:
+        yield "tool", {"name": call.name, "status": "started"}
+    outputs: List[str] = [""] * len(calls)
+    async for i, result in aiter_results(tools, calls, _user_context(user_id)):
+        outputs[i] = result
+        for event in _tool_events(calls[i].name, json.loads(result)):
+            yield event
+
+    yield "reply", {"text": _render_reply(plan.content, _collect(calls, outputs))}
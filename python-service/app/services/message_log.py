@@ -0,0 +1,272 @@
+# app/services/message_log.py
+#
+# Write-behind persistence for chat_messages (CHAT_LOG_MODE=write_behind).
+# Messages are stamped and queued on the request path; one background thread drains the
+# bounded queue and writes each batch with a single multi-row INSERT (which also bumps
+# chat_sessions.last_message_at). Until a message is flushed it stays visible through
+# pending_for() so history reads don't miss it.
+#
+# Ordering: created_at is assigned at enqueue time from a strictly increasing clock and the
+# single writer flushes FIFO, so a session's messages keep their order both in the table and
+# in merged history – including ones written inline under backpressure.
+
+import logging
+import queue
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, NamedTuple, Optional
+
+from psycopg2.extras import execute_values
+
+from ..core import config
+from ..db import db_conn
+from . import invalidation
+
+logger = logging.getLogger("python-service.message_log")
+
+FLUSH_SQL = """
+    WITH m AS (
+        INSERT INTO chat_messages (id, chat_session_id, sender_type, content, created_at)
+        VALUES %s
+        RETURNING chat_session_id, created_at
+    )
+    UPDATE chat_sessions s
+       SET last_message_at = t.last_at
+      FROM (SELECT chat_session_id, MAX(created_at) AS last_at FROM m GROUP BY chat_session_id) t
+     WHERE s.id = t.chat_session_id
+       AND (s.last_message_at IS NULL OR s.last_message_at < t.last_at)
+"""
+
+# Backoff between attempts to flush a batch before it is retried row by row.
+FLUSH_RETRY_DELAYS = (0.1, 0.5, 2.0)
+
+
+class PendingMessage(NamedTuple):
+    id: str
+    session_id: str
+    sender_type: str
+    content: str
+    created_at: datetime
+
+
+class MessageWriter:
+    """
+    Bounded queue + one flusher thread.
+
+    - a batch is flushed when it reaches `batch_size` rows or its first row is `flush_ms` old
+    - a full queue blocks the caller up to `enqueue_timeout` seconds, then the message is
+      written inline (backpressure without dropping anything)
+    - stop() drains the queue before returning
+    """
+
+    def __init__(
+        self,
+        queue_max: int = config.CHAT_LOG_QUEUE_MAX,
+        batch_size: int = config.CHAT_LOG_BATCH_SIZE,
+        flush_ms: float = config.CHAT_LOG_FLUSH_MS,
+        enqueue_timeout: float = config.CHAT_LOG_ENQUEUE_TIMEOUT,
+    ):
+        self.queue_max = max(1, queue_max)
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = max(0.0, flush_ms) / 1000
+        self.enqueue_timeout = enqueue_timeout
+
+        self._queue: "queue.Queue[PendingMessage]" = queue.Queue(maxsize=self.queue_max)
+        self._pending: Dict[str, Dict[str, PendingMessage]] = {}  # session_id -> {id: msg}, oldest first
+        self._lock = threading.Lock()
+        self._last_ts = datetime.min.replace(tzinfo=timezone.utc)
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._counters = {
+            "enqueued": 0,
+            "flushed": 0,
+            "batches": 0,
+            "failed_batches": 0,
+            "dropped": 0,
+            "backpressure_waits": 0,
+            "inline_writes": 0,
+        }
+        self._flush_seconds_total = 0.0
+        self._flush_seconds_max = 0.0
+        self._last_flush_seconds = 0.0
+
+    # ---------- lifecycle ----------
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="chat-message-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = config.CHAT_LOG_SHUTDOWN_TIMEOUT) -> None:
+        """Stop accepting work into the queue and flush whatever is left."""
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            if self._thread.is_alive():
+                logger.warning("message writer still flushing after %.1fs (queue=%d)", timeout, self._queue.qsize())
+
+    # ---------- producer side ----------
+
+    def _stamp(self) -> datetime:
+        now = datetime.now(timezone.utc)
+        if now <= self._last_ts:
+            now = self._last_ts + timedelta(microseconds=1)
+        self._last_ts = now
+        return now
+
+    def enqueue(self, session_id: str, sender_type: str, content: str) -> PendingMessage:
+        with self._lock:
+            msg = PendingMessage(str(uuid.uuid4()), str(session_id), sender_type, content, self._stamp())
+            self._pending.setdefault(msg.session_id, {})[msg.id] = msg
+            self._counters["enqueued"] += 1
+
+        if not self._stopping.is_set():
+            try:
+                self._queue.put_nowait(msg)
+                return msg
+            except queue.Full:
+                with self._lock:
+                    self._counters["backpressure_waits"] += 1
+                try:
+                    self._queue.put(msg, timeout=self.enqueue_timeout)
+                    return msg
+                except queue.Full:
+                    pass
+
+        # Queue still full (or shutting down): write it ourselves rather than drop it.
+        with self._lock:
+            self._counters["inline_writes"] += 1
+        self._flush([msg])
+        return msg
+
+    def queue_has_room(self) -> bool:
+        return not self._queue.full()
+
+    def pending_for(self, session_id: str) -> List[PendingMessage]:
+        with self._lock:
+            return list(self._pending.get(str(session_id), {}).values())
+
+    # ---------- flusher ----------
+
+    def _next_batch(self) -> List[PendingMessage]:
+        try:
+            batch = [self._queue.get(timeout=0.1)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._next_batch()
+            if batch:
+                self._flush(batch)
+            elif self._stopping.is_set():
+                return
+
+    def _write(self, batch: List[PendingMessage]) -> None:
+        rows = [(m.id, m.session_id, m.sender_type, m.content, m.created_at) for m in batch]
+        with db_conn(autocommit=True) as conn, conn.cursor() as cur:
+            execute_values(cur, FLUSH_SQL, rows, page_size=len(rows))
+            if config.CACHE_INVALIDATION:
+                self._publish(cur, batch)
+
+    def _publish(self, cur, batch: List[PendingMessage]) -> None:
+        # Other workers drop their cached windows of these sessions. The rows are already
+        # committed, so a failure here must not make the batch look unwritten.
+        events = [invalidation.session_event(sid) for sid in dict.fromkeys(m.session_id for m in batch)]
+        try:
+            cur.execute(invalidation.NOTIFY_SQL, invalidation.notify_many_params(events))
+        except Exception:
+            logger.exception("cache invalidation for %d sessions failed", len(events))
+
+    def _flush(self, batch: List[PendingMessage]) -> None:
+        t0 = time.perf_counter()
+        written = self._write_with_retries(batch)
+        elapsed = time.perf_counter() - t0
+
+        with self._lock:
+            for m in batch:
+                session = self._pending.get(m.session_id)
+                if session is not None:
+                    session.pop(m.id, None)
+                    if not session:
+                        del self._pending[m.session_id]
+            self._counters["flushed"] += written
+            self._counters["dropped"] += len(batch) - written
+            self._counters["batches"] += 1
+            self._last_flush_seconds = elapsed
+            self._flush_seconds_total += elapsed
+            self._flush_seconds_max = max(self._flush_seconds_max, elapsed)
+
+    def _write_with_retries(self, batch: List[PendingMessage]) -> int:
+        for delay in FLUSH_RETRY_DELAYS:
+            try:
+                self._write(batch)
+                return len(batch)
+            except Exception:
+                logger.exception("flush of %d chat messages failed; retrying in %.1fs", len(batch), delay)
+                time.sleep(delay)
+
+        # Still failing: isolate bad rows (e.g. a session deleted meanwhile) so the rest land.
+        with self._lock:
+            self._counters["failed_batches"] += 1
+        written = 0
+        for m in batch:
+            try:
+                self._write([m])
+                written += 1
+            except Exception:
+                logger.exception("dropping chat message %s of session %s", m.id, m.session_id)
+        return written
+
+    # ---------- metrics ----------
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            batches = self._counters["batches"]
+            return {
+                **self._counters,
+                "queue_depth": self._queue.qsize(),
+                "queue_max": self.queue_max,
+                "pending_sessions": len(self._pending),
+                "last_flush_ms": round(self._last_flush_seconds * 1000, 3),
+                "avg_flush_ms": round(self._flush_seconds_total / batches * 1000, 3) if batches else 0.0,
+                "max_flush_ms": round(self._flush_seconds_max * 1000, 3),
+                "avg_batch_size": round(self._counters["flushed"] / batches, 1) if batches else 0.0,
+            }
+
+
+_writer: Optional[MessageWriter] = None
+_writer_lock = threading.Lock()
+
+
+def get_writer() -> MessageWriter:
+    """Process-wide writer, started on first use."""
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                writer = MessageWriter()
+                writer.start()
+                _writer = writer
+    return _writer
+
+
+def stop_writer() -> None:
+    global _writer
+    with _writer_lock:
+        writer, _writer = _writer, None
+    if writer is not None:
+        writer.stop()
+
+
+def message_log_stats() -> Dict[str, Any]:
+    return _writer.stats() if _writer is not None else {}
@@ -0,0 +1,152 @@
+# app/services/occupancy.py
+#
+# Maintenance of the per-(provider, day) occupancy summary (appointment_occupancy, see
+# migrations/003_appointment_occupancy.sql). Triggers on appointments keep it current for
+# every writer; this module rebuilds it (backfill, a TZ_NAME change, repair) and checks it
+# against the appointments it summarizes.
+#
+#   python -m app.services.occupancy check [--from 2026-01-01 --to 2027-01-01] [--provider NAME]
+#   python -m app.services.occupancy rebuild [--from ... --to ...] [--provider NAME]
+#
+# Without --from/--to both cover every day holding an active appointment or a summary row.
+# `check` exits 1 when it finds a mismatch.
+
+import argparse
+import sys
+from datetime import date
+from typing import Any, Dict, List, Optional, Tuple
+
+from psycopg2.extras import RealDictCursor
+
+from ..db import db_conn
+from .scheduling import _clinic_tz
+
+# Days [from, to) covering every active appointment and every summary row
+EXTENT_SQL = """
+    SELECT min(first) AS first, max(last) + 1 AS last FROM (
+        SELECT min(d.day) AS first, max(d.day) AS last
+        FROM appointments a
+        CROSS JOIN LATERAL appointment_occupancy_days(a.start_time, a.end_time, appointment_occupancy_tz()) AS d(day)
+        WHERE a.status IN ('pending', 'confirmed')
+        UNION ALL
+        SELECT min(day), max(day) FROM appointment_occupancy
+    ) e
+"""
+
+# Writers' triggers wait for this lock, then refresh from a snapshot that sees the rebuild
+LOCK_SQL = "LOCK TABLE appointment_occupancy IN SHARE ROW EXCLUSIVE MODE"
+
+SET_TZ_SQL = "UPDATE appointment_occupancy_settings SET tz = %s WHERE tz IS DISTINCT FROM %s"
+
+DELETE_SQL = """
+    DELETE FROM appointment_occupancy
+    WHERE day >= %s AND day < %s
+      AND (%s::text[] IS NULL OR provider_name = ANY(%s::text[]))
+"""
+
+REBUILD_SQL = """
+    INSERT INTO appointment_occupancy (provider_name, day, occupancy, updated_at)
+    SELECT provider_name, day, occupancy, NOW()
+    FROM appointment_occupancy_compute(%s::text[], %s, %s)
+"""
+
+CHECK_SQL = """
+    SELECT coalesce(e.provider_name, o.provider_name) AS provider_name,
+           coalesce(e.day, o.day) AS day,
+           length(replace(e.occupancy::text, '0', '')) AS expected_minutes,
+           length(replace(o.occupancy::text, '0', '')) AS summary_minutes
+    FROM appointment_occupancy_compute(%s::text[], %s, %s) e
+    FULL JOIN (
+        SELECT provider_name, day, occupancy
+        FROM appointment_occupancy
+        WHERE day >= %s AND day < %s
+          AND (%s::text[] IS NULL OR provider_name = ANY(%s::text[]))
+    ) o ON o.provider_name = e.provider_name AND o.day = e.day
+    WHERE e.occupancy IS DISTINCT FROM o.occupancy
+    ORDER BY 2, 1
+"""
+
+Window = Tuple[Optional[date], Optional[date]]
+
+
+def _extent(cur, window: Window) -> Tuple[Optional[date], Optional[date]]:
+    start, end = window
+    if start is None or end is None:
+        cur.execute(EXTENT_SQL)
+        row = cur.fetchone()
+        start = start if start is not None else row["first"]
+        end = end if end is not None else row["last"]
+    return start, end
+
+
+def rebuild(window: Window = (None, None), providers: Optional[List[str]] = None) -> Dict[str, Any]:
+    """
+    Recompute the summary for days [from, to) (default: all) of `providers` (default: all) in
+    one transaction. Also (re)sets the summary's time zone to TZ_NAME; if that changes it,
+    every day is rebuilt since all of them were cut in the old zone.
+    """
+    tz = str(_clinic_tz())
+    with db_conn() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute(LOCK_SQL)
+        cur.execute(SET_TZ_SQL, (tz, tz))
+        if cur.rowcount:
+            window, providers = (None, None), None
+        start, end = _extent(cur, window)
+        if start is None or end is None:
+            return {"tz": tz, "from": None, "to": None, "deleted": 0, "rows": 0}
+        cur.execute(DELETE_SQL, (start, end, providers, providers))
+        deleted = cur.rowcount
+        cur.execute(REBUILD_SQL, (providers, start, end))
+        return {"tz": tz, "from": start, "to": end, "deleted": deleted, "rows": cur.rowcount}
+
+
+def check(window: Window = (None, None), providers: Optional[List[str]] = None) -> Dict[str, Any]:
+    """
+    Compare the summary with occupancy recomputed from appointments over days [from, to).
+    Returns the mismatching provider-days (busy minutes expected vs. in the summary) and
+    whether the summary is cut in TZ_NAME at all.
+    """
+    tz = str(_clinic_tz())
+    with db_conn() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute("SELECT appointment_occupancy_tz() AS tz")
+        summary_tz = cur.fetchone()["tz"]
+        start, end = _extent(cur, window)
+        mismatches: List[Dict[str, Any]] = []
+        if start is not None and end is not None:
+            cur.execute(CHECK_SQL, (providers, start, end, start, end, providers, providers))
+            mismatches = [dict(r) for r in cur.fetchall()]
+    return {"tz": tz, "summaryTz": summary_tz, "from": start, "to": end, "mismatches": mismatches}
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Check or rebuild the appointment occupancy summary.")
+    ap.add_argument("command", choices=("check", "rebuild"))
+    ap.add_argument("--from", dest="start", type=date.fromisoformat, help="first day (inclusive)")
+    ap.add_argument("--to", dest="end", type=date.fromisoformat, help="last day (exclusive)")
+    ap.add_argument("--provider", action="append", help="only this provider (repeatable)")
+    args = ap.parse_args(argv)
+
+    window = (args.start, args.end)
+    if args.command == "rebuild":
+        out = rebuild(window, args.provider)
+        print(
+            f"rebuilt [{out['from']}, {out['to']}) in {out['tz']}: "
+            f"{out['deleted']} rows removed, {out['rows']} written"
+        )
+        return 0
+
+    out = check(window, args.provider)
+    if out["summaryTz"] != out["tz"]:
+        print(f"summary is cut in {out['summaryTz']}, TZ_NAME is {out['tz']}: run rebuild")
+        return 1
+    for m in out["mismatches"]:
+        print(
+            f"{m['day']}  {m['provider_name']}: {m['expected_minutes'] or 0} busy minutes "
+            f"in appointments, {m['summary_minutes'] or 0} in the summary"
+        )
+    print(f"checked [{out['from']}, {out['to']}): {len(out['mismatches'])} mismatching provider-days")
+    return 1 if out["mismatches"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
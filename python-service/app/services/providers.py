@@ -0,0 +1,135 @@
+# app/services/providers.py
+#
+# Provider directory: which dentists work at which location, and their business hours per
+# weekday (providers / provider_hours, migrations/002_providers.sql). The whole directory is
+# one small query, held in-process for PROVIDER_CACHE_TTL seconds.
+#
+# A provider without hours rows – or one missing from the directory, e.g. on a database that
+# predates the tables – works BUSINESS_START–BUSINESS_END every day. An empty directory
+# holds just DEFAULT_PROVIDER at DEFAULT_LOCATION, which is how the service behaved before.
+
+import logging
+from datetime import date
+from typing import Any, Dict, Iterable, List, NamedTuple, Tuple
+
+from psycopg2.extras import RealDictCursor
+
+from ..core import config, metrics
+from ..core.cache import TTLCache
+from ..db import db_conn
+from ..adb import adb_conn, adict_cursor
+from .availability import Spans
+
+logger = logging.getLogger("python-service.providers")
+
+# Minutes rather than TIME values so '24:00' (open until midnight) survives the round trip
+PROVIDERS_SQL = """
+    SELECT p.name, p.location, h.weekday,
+           EXTRACT(EPOCH FROM h.start_time)::int / 60 AS start_min,
+           EXTRACT(EPOCH FROM h.end_time)::int / 60 AS end_min
+    FROM providers p
+    LEFT JOIN provider_hours h ON h.provider_id = p.id
+    WHERE p.active
+    ORDER BY p.name, h.weekday, h.start_time
+"""
+
+UNDEFINED_TABLE = "42P01"
+
+_directory = TTLCache(1, config.PROVIDER_CACHE_TTL, name="providers")
+metrics.register_cache(_directory)
+
+
+class Provider(NamedTuple):
+    name: str
+    location: str
+    hours: Tuple[Spans, ...]  # per weekday (Monday=0): [start, end) minutes after local midnight
+
+    def spans(self, day: date) -> Spans:
+        return self.hours[day.weekday()]
+
+
+def _hhmm(value: str) -> int:
+    h, m = map(int, value.split(":"))
+    return h * 60 + m
+
+
+def default_hours() -> Tuple[Spans, ...]:
+    """BUSINESS_START–BUSINESS_END on every day."""
+    span = (_hhmm(config.BUSINESS_START), _hhmm(config.BUSINESS_END))
+    return ((span,) if span[1] > span[0] else (),) * 7
+
+
+def _build(rows: Iterable[Dict[str, Any]]) -> Dict[str, Provider]:
+    locations: Dict[str, str] = {}
+    spans: Dict[str, List[List[Tuple[int, int]]]] = {}
+    for r in rows:
+        name = r["name"]
+        locations[name] = r["location"]
+        by_day = spans.setdefault(name, [[] for _ in range(7)])
+        if r["weekday"] is not None and r["end_min"] > r["start_min"]:
+            by_day[r["weekday"]].append((r["start_min"], r["end_min"]))
+    if not locations:
+        return {config.DEFAULT_PROVIDER: Provider(config.DEFAULT_PROVIDER, config.DEFAULT_LOCATION, default_hours())}
+    directory = {}
+    for name, location in locations.items():
+        by_day = spans[name]
+        hours = tuple(tuple(day) for day in by_day) if any(by_day) else default_hours()
+        directory[name] = Provider(name, location, hours)
+    return directory
+
+
+def _missing_tables(exc: Exception) -> bool:
+    if (getattr(exc, "pgcode", None) or getattr(exc, "sqlstate", None)) != UNDEFINED_TABLE:
+        return False
+    logger.warning("providers tables missing (run migrations/002_providers.sql); using default hours")
+    return True
+
+
+def directory() -> Dict[str, Provider]:
+    """Active providers by name (cached)."""
+    cached = _directory.get("all")
+    if cached is not None:
+        return cached
+    try:
+        with db_conn() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute(PROVIDERS_SQL)
+            rows = cur.fetchall()
+    except Exception as e:
+        if not _missing_tables(e):
+            raise
+        rows = []
+    built = _build(rows)
+    _directory.set("all", built)
+    return built
+
+
+async def adirectory() -> Dict[str, Provider]:
+    """Async variant of directory."""
+    cached = _directory.get("all")
+    if cached is not None:
+        return cached
+    try:
+        async with adb_conn() as conn, adict_cursor(conn) as cur:
+            await cur.execute(PROVIDERS_SQL)
+            rows = await cur.fetchall()
+    except Exception as e:
+        if not _missing_tables(e):
+            raise
+        rows = []
+    built = _build(rows)
+    _directory.set("all", built)
+    return built
+
+
+def lookup(by_name: Dict[str, Provider], name: str) -> Provider:
+    """The directory entry, or `name` at DEFAULT_LOCATION with default hours."""
+    return by_name.get(name) or Provider(name, config.DEFAULT_LOCATION, default_hours())
+
+
+def at_location(by_name: Dict[str, Provider], location: str) -> List[Provider]:
+    """Providers working at `location`, in name order."""
+    return [p for p in by_name.values() if p.location == location]
+
+
+def invalidate() -> None:
+    _directory.pop("all")
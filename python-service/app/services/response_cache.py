@@ -0,0 +1,107 @@
+# app/services/response_cache.py
+#
+# Caches in front of the LLM path for near-identical traffic ("slots tomorrow?" from many
+# patients on the same day):
+#   plans     what the model decided for a message: its plain text, or its tool calls.
+#             Keyed on the normalized message, the clinic-local date (so "tomorrow" means
+#             the same day), a digest of the history the model saw, and the model/TZ. A hit
+#             skips the model call; the tools still run, so replies reflect current data.
+#             Plans that would book (SERIAL_TOOLS) are never cached.
+#   payloads  check_availability JSON per (provider, clinic-local day) for a few seconds.
+#             A booking into that day (or a booking that lost the slot) drops it.
+# Both are bounded TTL/LRU caches with hit/miss counters (/health, /metrics).
+
+import hashlib
+import json
+import os
+import threading
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Iterable, NamedTuple, Optional, Tuple
+
+from ..core import config, metrics
+from ..core.cache import TTLCache
+from .dates import clinic_today
+from .tool_executor import SERIAL_TOOLS, ToolCall
+
+_plans = TTLCache(config.PLAN_CACHE_SIZE, config.PLAN_CACHE_TTL, name="llm_plans")
+_payloads = TTLCache(config.TOOL_CACHE_SIZE, config.TOOL_CACHE_TTL, name="availability_payloads")
+metrics.register_cache(_plans)
+metrics.register_cache(_payloads)
+
+# Bumped by every payload invalidation; a payload read before one isn't cached (it may
+# predate the booking that caused it).
+_write_seq = 0
+_write_lock = threading.Lock()
+
+
+class Plan(NamedTuple):
+    content: str
+    calls: Tuple[ToolCall, ...]
+
+
+# ---------- Plans ----------
+
+def _normalize(message: str) -> str:
+    return " ".join((message or "").lower().split()).rstrip("?!. ")
+
+
+def plan_key(message: str, history_rows: Iterable[Dict[str, Any]]) -> Tuple[str, ...]:
+    """Cache key for the model's decision on `message` given the history rows it sees."""
+    seen = [(r.get("sender_type"), r.get("content", "")) for r in history_rows]
+    digest = hashlib.sha1(json.dumps(seen, ensure_ascii=False).encode()).hexdigest()
+    tz_name = os.getenv("TZ_NAME", "Asia/Dubai")
+    return (_normalize(message), clinic_today().isoformat(), digest, config.OPENAI_MODEL, tz_name)
+
+
+def get_plan(key: Tuple[str, ...]) -> Optional[Plan]:
+    return _plans.get(key)
+
+
+def put_plan(key: Tuple[str, ...], plan: Plan) -> None:
+    if any(call.name in SERIAL_TOOLS for call in plan.calls):
+        return
+    _plans.set(key, plan)
+
+
+# ---------- check_availability payloads ----------
+
+def _payload_key(provider: str, day: date) -> Tuple[str, date]:
+    return (provider, day)
+
+
+def get_availability(provider: str, day: date) -> Optional[str]:
+    return _payloads.get(_payload_key(provider, day))
+
+
+def availability_seq() -> int:
+    """Taken before reading the slots a payload is built from; passed to put_availability."""
+    return _write_seq
+
+
+def put_availability(provider: str, day: date, payload: str, seq_before: int) -> None:
+    """Cache the payload unless an invalidation ran since `seq_before` was taken."""
+    with _write_lock:
+        if _write_seq == seq_before:
+            _payloads.set(_payload_key(provider, day), payload)
+
+
+def invalidate_availability(provider: str, start: datetime, end: datetime) -> None:
+    """Drop cached payloads of every clinic-local day [start, end) touches."""
+    global _write_seq
+    with _write_lock:
+        _write_seq += 1
+        day = start.date()
+        while day <= end.date():
+            _payloads.pop(_payload_key(provider, day))
+            day += timedelta(days=1)
+
+
+def clear_availability() -> None:
+    global _write_seq
+    with _write_lock:
+        _write_seq += 1
+        _payloads.clear()
+
+
+def response_cache_stats() -> Dict[str, Any]:
+    return {"plans": _plans.stats(), "availability_payloads": _payloads.stats()}
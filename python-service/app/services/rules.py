@@ -1,42 +1,52 @@
+import logging
 from datetime import datetime, timedelta, time
-from dateutil import parser as dateparser
-from .scheduling import list_available_slots, create_appointment
+
+from .dates import clinic_now
+from .intents import BOOKING, UNKNOWN, extract
+from .scheduling import list_available_slots, create_appointment, SlotTaken
+
+logger = logging.getLogger("python-service.rules")
+
+HELP_TEXT = (
+    "I can help you check availability and create appointments. "
+    "Try: 'Show me slots tomorrow' or 'Book me on 2025-11-15 10:30'."
+)
+
+def suggested_reply(day) -> str:
+    """The reply the slot listing suggests; extract() reads it as a booking of that day and time."""
+    return f"{day.isoformat()} 15:00"
 
 def chat_rule_based(message: str, user_id: str) -> str:
-    """Simple fallback when LLM is disabled."""
-    text = message.lower()
-    reply_text = None
-
-    # Try to detect a token that parses to a date (YYYY-MM-DD or similar)
-    date_candidate = None
-    for token in text.replace(",", " ").split():
-        try:
-            dt = dateparser.parse(token, fuzzy=False)
-            date_candidate = dt.date()
-            break
-        except Exception:
-            continue
-
-    if any(k in text for k in ["slot", "available", "availability", "book", "schedule"]):
-        target_date = date_candidate or (datetime.utcnow() + timedelta(days=1)).date()
-        slots = list_available_slots(datetime.combine(target_date, time(0,0)))
-        if not slots:
-            reply_text = f"No available 30-min slots on {target_date.isoformat()}. Try another day?"
-        else:
-            human = ", ".join(s.strftime("%H:%M") for s, _ in slots[:6])
-            reply_text = (
-                f"Here are available 30-min slots on {target_date.isoformat()}: {human}. "
-                f"Tell me which time you prefer (e.g., '{target_date.isoformat()} 15:00')."
-            )
+    """Simple fallback when LLM is disabled: one pass of the intent engine, then at most one booking."""
+    now = clinic_now()
+    intent = extract(message, now)
+    if intent.kind == UNKNOWN:
+        return HELP_TEXT
+
+    target_date = intent.day or now.date() + timedelta(days=1)
+    slots = list_available_slots(datetime.combine(target_date, time(0, 0)))
+    if not slots:
+        reply_text = f"No available 30-min slots on {target_date.isoformat()}. Try another day?"
     else:
-        reply_text = "I can help you check availability and create appointments. Try: 'Show me slots tomorrow' or 'Book me on 2025-11-15 10:30'."
+        human = ", ".join(s.strftime("%H:%M") for s, _ in slots[:6])
+        reply_text = (
+            f"Here are available 30-min slots on {target_date.isoformat()}: {human}. "
+            f"Tell me which time you prefer (e.g., '{suggested_reply(target_date)}')."
+        )
 
-    # If user gave a datetime like '2025-11-15 10:30', try to create
+    # Only an explicit booking request with a time of day still ahead creates anything
+    if intent.kind == BOOKING and intent.at is None and intent.time_text:
+        reply_text += "\nThat time has already passed, so nothing was booked."
+    if intent.kind != BOOKING or intent.at is None:
+        return reply_text
     try:
-        dt = dateparser.parse(message, fuzzy=True)
-        appt_id, s, e, provider, location = create_appointment(user_id, dt.isoformat())
+        start = datetime.combine(target_date, intent.at)
+        appt_id, s, e, provider, location = create_appointment(user_id, start.isoformat())
         reply_text += f"\nI tentatively created an appointment (pending) on {s.strftime('%Y-%m-%d %H:%M')} with {provider} at {location}. ID: {appt_id}."
+    except SlotTaken as taken:
+        human = ", ".join(s.strftime("%Y-%m-%d %H:%M") for s, _ in taken.alternatives)
+        reply_text += f"\n{taken.start.strftime('%Y-%m-%d %H:%M')} is already taken." + (f" Next openings: {human}." if human else "")
     except Exception:
-        pass
+        logger.exception("rule-based booking failed for %r", message)
 
     return reply_text
@@ -1,15 +1,18 @@
 # app/services/scheduling.py
 
 import os
-from datetime import datetime, time, timedelta
-from typing import List, Tuple
+from datetime import date, datetime, time, timedelta
+from typing import Dict, List, Optional, Tuple, Union
 from zoneinfo import ZoneInfo
 
 from dateutil import parser as du
 from psycopg2.extras import RealDictCursor
 
 from ..core import config
+from ..core.cache import SingleFlight
 from ..db import db_conn
+from ..adb import adb_conn, adict_cursor
+from . import availability, invalidation, providers, response_cache
 
 
 def _clinic_tz() -> ZoneInfo:
@@ -27,69 +30,453 @@ def _to_tz(dt: datetime, tz: ZoneInfo) -> datetime:
     return dt.astimezone(tz)
 
 
-def parse_business_times(date_dt: datetime) -> Tuple[datetime, datetime]:
+# Database-enforced non-overlap per provider (see schema.sql). Concurrent bookings of the
+# same slot race only on the GiST index entry; exactly one INSERT wins.
+OVERLAP_CONSTRAINT = "appointments_no_overlap"
+EXCLUSION_VIOLATION = "23P01"
+# Two inserts of the same range can each wait for the other's uncommitted row while checking
+# the constraint; Postgres aborts one of them. Its row is gone, so simply retrying is safe.
+DEADLOCK_DETECTED = "40P01"
+INSERT_ATTEMPTS = 3
+
+# Offered when the requested slot is already taken.
+SLOT_TAKEN_ALTERNATIVES = 3
+
+
+class SlotTaken(Exception):
+    """The requested time overlaps a pending/confirmed appointment of the same provider."""
+
+    def __init__(self, provider: str, start: datetime, end: datetime, alternatives: List[Tuple[datetime, datetime]]):
+        super().__init__(f"{provider} is already booked at {start.isoformat()}")
+        self.provider = provider
+        self.start = start
+        self.end = end
+        self.alternatives = alternatives
+
+
+def _sqlstate(exc: Exception) -> Optional[str]:
+    # psycopg2 exposes pgcode, psycopg 3 sqlstate
+    return getattr(exc, "pgcode", None) or getattr(exc, "sqlstate", None)
+
+
+def _is_overlap(exc: Exception) -> bool:
+    """Exclusion violation on our constraint."""
+    diag = getattr(exc, "diag", None)
+    return _sqlstate(exc) == EXCLUSION_VIOLATION and getattr(diag, "constraint_name", None) == OVERLAP_CONSTRAINT
+
+
+def _retryable(exc: Exception, attempt: int) -> bool:
+    return _sqlstate(exc) == DEADLOCK_DETECTED and attempt + 1 < INSERT_ATTEMPTS
+
+
+# Also tells the other workers about the booking once it commits (services/invalidation.py)
+INSERT_APPOINTMENT_SQL = """
+    INSERT INTO appointments
+        (user_id, chat_session_id, start_time, end_time, status, notes, provider_name, location)
+    VALUES
+        (%s, NULL, %s, %s, 'pending', %s, %s, %s)
+    RETURNING id""" + invalidation.NOTIFY_COLUMN
+
+
+_MINUTES = [timedelta(minutes=m) for m in range(24 * 60 + 1)]
+
+
+def _slot(day: date, tz: ZoneInfo, minute: int, duration_minutes: int) -> Tuple[datetime, datetime]:
+    start = datetime.combine(day, time(0, 0), tzinfo=tz) + _MINUTES[minute]
+    return start, start + timedelta(minutes=duration_minutes)
+
+
+def _minute_ceil(dt: datetime) -> int:
+    """Minutes after local midnight of the first slot start at/after dt."""
+    return dt.hour * 60 + dt.minute + (1 if dt.second or dt.microsecond else 0)
+
+
+Row = Tuple[providers.Provider, date, int]  # provider, clinic-local day, occupancy mask
+
+
+def _free_starts(rows: List[Row], duration_minutes: int, after: Optional[datetime] = None) -> List[int]:
+    """Bitmask of free slot starts per row (one batched pass); starts before `after` dropped."""
+    masks = availability.free_starts([occ for _, _, occ in rows], [p.spans(day) for p, day, _ in rows], duration_minutes)
+    if after is not None:
+        cutoff = ~((1 << _minute_ceil(after)) - 1)
+        masks = [m & cutoff if day == after.date() else m for (_, day, _), m in zip(rows, masks)]
+    return masks
+
+
+def _free_rows(
+    rows: List[Row], tz: ZoneInfo, duration_minutes: int, limit: int, after: Optional[datetime] = None
+) -> List[List[Tuple[datetime, datetime]]]:
+    """Up to `limit` free slots (clinic tz) per row."""
+    step = timedelta(minutes=duration_minutes)
+    out = []
+    for (_, day, _), mask in zip(rows, _free_starts(rows, duration_minutes, after)):
+        midnight = datetime.combine(day, time(0, 0), tzinfo=tz)
+        starts = [midnight + _MINUTES[minute] for minute in availability.iter_bits(mask, limit)]
+        out.append([(start, start + step) for start in starts])
+    return out
+
+
+def _normalize_start(start_iso: str) -> datetime:
+    """Parse and normalize to clinic tz."""
+    tz = _clinic_tz()
+    start_dt = du.parse(start_iso)
+    if start_dt.tzinfo is None:
+        return start_dt.replace(tzinfo=tz)
+    return start_dt.astimezone(tz)
+
+
+# ---------- Single-flight lookups ----------
+#
+# Identical availability lookups running at the same time (the same day asked about by
+# several patients at once, a retried request racing the original) share one execution:
+# the first loads the occupancy and computes the slots, the others wait for its result.
+# Keys are the normalized arguments (clinic-local days, minute-rounded search start, TZ)
+# plus availability.write_seq(): a lookup that starts after a booking (this worker's, one
+# announced by another worker, or a lost slot) doesn't join one that read the occupancy
+# before it, and reads it again. Results are shared between the callers, who only read them.
+_lookups = SingleFlight("availability_lookups", enabled=config.SINGLE_FLIGHT_LOOKUPS)
+
+
+def _flight_key(*parts) -> Tuple:
+    return parts + (availability.write_seq(),)
+
+
+def lookup_stats():
+    return _lookups.stats()
+
+
+def _day_slots(
+    who: providers.Provider, day: date, occ: int, tz: ZoneInfo, duration_minutes: int, limit: int
+) -> List[Tuple[datetime, datetime]]:
+    if not who.spans(day):
+        return []
+    return _free_rows([(who, day, occ)], tz, duration_minutes, limit)[0]
+
+
+def list_available_slots(
+    date_dt: datetime,
+    provider: str = config.DEFAULT_PROVIDER,
+    duration_minutes: int = config.DEFAULT_APPT_MIN,
+    limit: int = 10,
+) -> List[Tuple[datetime, datetime]]:
     """
-    Build tz-aware business-hour bounds for the given date in clinic TZ.
-    date_dt may be naive or aware – we'll normalize to clinic tz.
+    Return up to `limit` 30-min slots (or duration_minutes) in clinic TZ for the given date,
+    within the provider's business hours for that weekday.
+    Avoids conflicts with existing pending/confirmed appointments (via the occupancy index).
     """
-    tz = date_dt.tzinfo or _clinic_tz()
-    start_h, start_m = map(int, config.BUSINESS_START.split(":"))
-    end_h, end_m = map(int, config.BUSINESS_END.split(":"))
+    tz = _clinic_tz()
+    day = _to_tz(date_dt, tz).date()
 
-    start = datetime.combine(date_dt.date(), time(start_h, start_m, tzinfo=tz))
-    end = datetime.combine(date_dt.date(), time(end_h, end_m, tzinfo=tz))
-    return start, end
+    def run():
+        who = providers.lookup(providers.directory(), provider)
+        occ = availability.day_occupancy(provider, day, tz) if who.spans(day) else 0
+        return _day_slots(who, day, occ, tz, duration_minutes, limit)
 
+    return _lookups.do(_flight_key("day", provider, day, str(tz), duration_minutes, limit), run)
 
-def list_available_slots(
+
+async def alist_available_slots(
     date_dt: datetime,
     provider: str = config.DEFAULT_PROVIDER,
     duration_minutes: int = config.DEFAULT_APPT_MIN,
     limit: int = 10,
 ) -> List[Tuple[datetime, datetime]]:
+    """Async variant of list_available_slots (async driver, same index and slot math)."""
+    tz = _clinic_tz()
+    day = _to_tz(date_dt, tz).date()
+
+    async def run():
+        who = providers.lookup(await providers.adirectory(), provider)
+        occ = await availability.aday_occupancy(provider, day, tz) if who.spans(day) else 0
+        return _day_slots(who, day, occ, tz, duration_minutes, limit)
+
+    return await _lookups.ado(_flight_key("day", provider, day, str(tz), duration_minutes, limit), run)
+
+
+# ---------- Multi-day availability ----------
+
+# Days loaded per round trip while searching for the next openings: most searches end
+# in the first week, and a week is still a single short index range scan.
+SEARCH_CHUNK_DAYS = 7
+
+
+def _day_range(start_day: date, end_day: date) -> List[date]:
+    """Clinic-local days in [start_day, end_day), capped at AVAILABILITY_MAX_RANGE_DAYS."""
+    n = (end_day - start_day).days
+    if n <= 0:
+        raise ValueError("end date must be after start date")
+    if n > config.AVAILABILITY_MAX_RANGE_DAYS:
+        raise ValueError(f"range too long ({n} days; max {config.AVAILABILITY_MAX_RANGE_DAYS})")
+    return [start_day + timedelta(days=i) for i in range(n)]
+
+
+def _local_day(d: Union[date, datetime], tz: ZoneInfo) -> date:
+    return _to_tz(d, tz).date() if isinstance(d, datetime) else d
+
+
+def _range_days(start: Union[date, datetime], end: Union[date, datetime], tz: ZoneInfo) -> List[date]:
+    return _day_range(_local_day(start, tz), _local_day(end, tz))
+
+
+def _free_by_day(
+    who: providers.Provider,
+    occ_by_day: Dict[date, int],
+    days: List[date],
+    tz: ZoneInfo,
+    duration_minutes: int,
+    limit_per_day: int,
+) -> Dict[date, List[Tuple[datetime, datetime]]]:
+    rows = [(who, day, occ_by_day[day]) for day in days]
+    return dict(zip(days, _free_rows(rows, tz, duration_minutes, limit_per_day)))
+
+
+def list_available_slots_range(
+    start_dt: Union[date, datetime],
+    end_dt: Union[date, datetime],
+    provider: str = config.DEFAULT_PROVIDER,
+    duration_minutes: int = config.DEFAULT_APPT_MIN,
+    limit_per_day: int = 10,
+) -> Dict[date, List[Tuple[datetime, datetime]]]:
     """
-    Return up to `limit` 30-min slots (or duration_minutes) in clinic TZ for the given date.
-    Avoids conflicts with existing pending/confirmed appointments.
+    Free slots for every clinic-local day in [start_dt, end_dt) (dates or datetimes), keyed
+    by day in order. Raises ValueError for an empty or over-long range.
+    Days missing from the occupancy index are loaded with one range query.
     """
-    tz = date_dt.tzinfo or _clinic_tz()
-    start_dt, end_dt = parse_business_times(_to_tz(date_dt, tz))
+    tz = _clinic_tz()
+    days = _range_days(start_dt, end_dt, tz)
 
-    # Build slot grid (tz-aware)
-    slots: List[Tuple[datetime, datetime]] = []
-    step = timedelta(minutes=duration_minutes)
-    cursor = start_dt
-    while cursor + step <= end_dt:
-        slots.append((cursor, cursor + step))
-        cursor += step
-
-    # Fetch existing appts (DB may store naive timestamps; reattach tz)
-    with db_conn() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
-        cur.execute(
-            """
-            SELECT start_time, end_time
-            FROM appointments
-            WHERE provider_name = %s
-              AND status IN ('pending','confirmed')
-              AND start_time::date = %s::date
-            """,
-            (provider, start_dt.date()),
-        )
-        appts = cur.fetchall()
-
-    appts_tz = [(_to_tz(a["start_time"], tz), _to_tz(a["end_time"], tz)) for a in appts]
-
-    def overlaps(a_start: datetime, a_end: datetime, b_start: datetime, b_end: datetime) -> bool:
-        return a_start < b_end and b_start < a_end
-
-    available: List[Tuple[datetime, datetime]] = []
-    for s, e in slots:
-        if any(overlaps(s, e, a_s, a_e) for a_s, a_e in appts_tz):
-            continue
-        available.append((s, e))
-        if len(available) >= limit:
-            break
-
-    return available
+    def run():
+        who = providers.lookup(providers.directory(), provider)
+        occ = availability.days_occupancy(provider, days, tz)
+        return _free_by_day(who, occ, days, tz, duration_minutes, limit_per_day)
+
+    return _lookups.do(_flight_key("range", provider, days[0], days[-1], str(tz), duration_minutes, limit_per_day), run)
+
+
+async def alist_available_slots_range(
+    start_dt: Union[date, datetime],
+    end_dt: Union[date, datetime],
+    provider: str = config.DEFAULT_PROVIDER,
+    duration_minutes: int = config.DEFAULT_APPT_MIN,
+    limit_per_day: int = 10,
+) -> Dict[date, List[Tuple[datetime, datetime]]]:
+    """Async variant of list_available_slots_range."""
+    tz = _clinic_tz()
+    days = _range_days(start_dt, end_dt, tz)
+
+    async def run():
+        who = providers.lookup(await providers.adirectory(), provider)
+        occ = await availability.adays_occupancy(provider, days, tz)
+        return _free_by_day(who, occ, days, tz, duration_minutes, limit_per_day)
+
+    return await _lookups.ado(_flight_key("range", provider, days[0], days[-1], str(tz), duration_minutes, limit_per_day), run)
+
+
+def _search_chunks(after: datetime, horizon_days: int) -> List[List[date]]:
+    first = after.date()
+    days = [first + timedelta(days=i) for i in range(max(horizon_days, 1))]
+    return [days[i:i + SEARCH_CHUNK_DAYS] for i in range(0, len(days), SEARCH_CHUNK_DAYS)]
+
+
+def _collect_next(
+    found: List[Tuple[datetime, datetime]],
+    who: providers.Provider,
+    occ_by_day: Dict[date, int],
+    days: List[date],
+    after: datetime,
+    tz: ZoneInfo,
+    duration_minutes: int,
+    count: int,
+) -> bool:
+    """Append the chunk's earliest free slots starting at/after `after`; True once `count` is reached."""
+    rows = [(who, day, occ_by_day[day]) for day in days]
+    for slots in _free_rows(rows, tz, duration_minutes, count - len(found), after):
+        found.extend(slots[:count - len(found)])
+        if len(found) >= count:
+            return True
+    return False
+
+
+def _search_start(after_dt: Optional[datetime], tz: ZoneInfo) -> datetime:
+    # Rounded up to the minute: slots start on whole minutes, so the result is the same and
+    # concurrent "from now" searches share a key
+    after = _to_tz(after_dt, tz) if after_dt else datetime.now(tz)
+    if after.second or after.microsecond:
+        after = after.replace(second=0, microsecond=0) + timedelta(minutes=1)
+    return after
+
+
+def find_next_slots(
+    after_dt: Optional[datetime] = None,
+    count: int = 5,
+    provider: str = config.DEFAULT_PROVIDER,
+    duration_minutes: int = config.DEFAULT_APPT_MIN,
+    horizon_days: int = config.AVAILABILITY_SEARCH_DAYS,
+) -> List[Tuple[datetime, datetime]]:
+    """
+    Earliest `count` free slots starting at/after `after_dt` (default: now), searching at
+    most `horizon_days` ahead. Loads the index a week at a time and stops as soon as
+    enough slots are found.
+    """
+    tz = _clinic_tz()
+    after = _search_start(after_dt, tz)
+    if count <= 0:
+        return []
+
+    def run():
+        found: List[Tuple[datetime, datetime]] = []
+        who = providers.lookup(providers.directory(), provider)
+        for days in _search_chunks(after, horizon_days):
+            occ = availability.days_occupancy(provider, days, tz)
+            if _collect_next(found, who, occ, days, after, tz, duration_minutes, count):
+                break
+        return found
+
+    return _lookups.do(_flight_key("next", provider, after, str(tz), count, duration_minutes, horizon_days), run)
+
+
+async def afind_next_slots(
+    after_dt: Optional[datetime] = None,
+    count: int = 5,
+    provider: str = config.DEFAULT_PROVIDER,
+    duration_minutes: int = config.DEFAULT_APPT_MIN,
+    horizon_days: int = config.AVAILABILITY_SEARCH_DAYS,
+) -> List[Tuple[datetime, datetime]]:
+    """Async variant of find_next_slots."""
+    tz = _clinic_tz()
+    after = _search_start(after_dt, tz)
+    if count <= 0:
+        return []
+
+    async def run():
+        found: List[Tuple[datetime, datetime]] = []
+        who = providers.lookup(await providers.adirectory(), provider)
+        for days in _search_chunks(after, horizon_days):
+            occ = await availability.adays_occupancy(provider, days, tz)
+            if _collect_next(found, who, occ, days, after, tz, duration_minutes, count):
+                break
+        return found
+
+    return await _lookups.ado(_flight_key("next", provider, after, str(tz), count, duration_minutes, horizon_days), run)
+
+
+# ---------- Multi-provider availability ----------
+
+def _staff_rows(staff: List[providers.Provider], days: List[date], occ: Dict[Tuple[str, date], int]) -> List[Row]:
+    return [(p, day, occ[(p.name, day)]) for p in staff for day in days]
+
+
+def _by_provider(
+    staff: List[providers.Provider],
+    days: List[date],
+    occ: Dict[Tuple[str, date], int],
+    tz: ZoneInfo,
+    duration_minutes: int,
+    limit_per_day: int,
+) -> Dict[str, Dict[date, List[Tuple[datetime, datetime]]]]:
+    free = iter(_free_rows(_staff_rows(staff, days, occ), tz, duration_minutes, limit_per_day))
+    return {p.name: {day: next(free) for day in days} for p in staff}
+
+
+def list_location_slots_range(
+    start_dt: Union[date, datetime],
+    end_dt: Union[date, datetime],
+    location: str = config.DEFAULT_LOCATION,
+    duration_minutes: int = config.DEFAULT_APPT_MIN,
+    limit_per_day: int = 10,
+) -> Dict[str, Dict[date, List[Tuple[datetime, datetime]]]]:
+    """
+    Free slots of every provider at `location` for each clinic-local day in [start_dt, end_dt),
+    keyed by provider (name order), then day. One occupancy query for all uncached
+    provider-days, one batched pass for the slots. Raises ValueError like list_available_slots_range.
+    """
+    tz = _clinic_tz()
+    days = _range_days(start_dt, end_dt, tz)
+
+    def run():
+        staff = providers.at_location(providers.directory(), location)
+        occ = availability.providers_days_occupancy([p.name for p in staff], days, tz)
+        return _by_provider(staff, days, occ, tz, duration_minutes, limit_per_day)
+
+    return _lookups.do(_flight_key("location", location, days[0], days[-1], str(tz), duration_minutes, limit_per_day), run)
+
+
+async def alist_location_slots_range(
+    start_dt: Union[date, datetime],
+    end_dt: Union[date, datetime],
+    location: str = config.DEFAULT_LOCATION,
+    duration_minutes: int = config.DEFAULT_APPT_MIN,
+    limit_per_day: int = 10,
+) -> Dict[str, Dict[date, List[Tuple[datetime, datetime]]]]:
+    """Async variant of list_location_slots_range."""
+    tz = _clinic_tz()
+    days = _range_days(start_dt, end_dt, tz)
+
+    async def run():
+        staff = providers.at_location(await providers.adirectory(), location)
+        occ = await availability.aproviders_days_occupancy([p.name for p in staff], days, tz)
+        return _by_provider(staff, days, occ, tz, duration_minutes, limit_per_day)
+
+    return await _lookups.ado(_flight_key("location", location, days[0], days[-1], str(tz), duration_minutes, limit_per_day), run)
+
+
+def _any_provider(
+    staff: List[providers.Provider],
+    day: date,
+    occ: Dict[Tuple[str, date], int],
+    tz: ZoneInfo,
+    duration_minutes: int,
+    limit: int,
+) -> List[Tuple[datetime, datetime, str]]:
+    masks = _free_starts(_staff_rows(staff, [day], occ), duration_minutes)
+    union = 0
+    for mask in masks:
+        union |= mask
+    slots = []
+    for minute in availability.iter_bits(union, limit):
+        bit = 1 << minute
+        who = next(p for p, mask in zip(staff, masks) if mask & bit)
+        slots.append((*_slot(day, tz, minute, duration_minutes), who.name))
+    return slots
+
+
+def list_any_provider_slots(
+    date_dt: Union[date, datetime],
+    location: str = config.DEFAULT_LOCATION,
+    duration_minutes: int = config.DEFAULT_APPT_MIN,
+    limit: int = 10,
+) -> List[Tuple[datetime, datetime, str]]:
+    """
+    Up to `limit` slot times on the clinic-local day at which some provider at `location` is
+    free, as (start, end, provider); each time goes to the first free provider in name order.
+    """
+    tz = _clinic_tz()
+    day = _local_day(date_dt, tz)
+
+    def run():
+        staff = providers.at_location(providers.directory(), location)
+        occ = availability.providers_days_occupancy([p.name for p in staff], [day], tz)
+        return _any_provider(staff, day, occ, tz, duration_minutes, limit)
+
+    return _lookups.do(_flight_key("any", location, day, str(tz), duration_minutes, limit), run)
+
+
+async def alist_any_provider_slots(
+    date_dt: Union[date, datetime],
+    location: str = config.DEFAULT_LOCATION,
+    duration_minutes: int = config.DEFAULT_APPT_MIN,
+    limit: int = 10,
+) -> List[Tuple[datetime, datetime, str]]:
+    """Async variant of list_any_provider_slots."""
+    tz = _clinic_tz()
+    day = _local_day(date_dt, tz)
+
+    async def run():
+        staff = providers.at_location(await providers.adirectory(), location)
+        occ = await availability.aproviders_days_occupancy([p.name for p in staff], [day], tz)
+        return _any_provider(staff, day, occ, tz, duration_minutes, limit)
+
+    return await _lookups.ado(_flight_key("any", location, day, str(tz), duration_minutes, limit), run)
 
 
 def create_appointment(
@@ -97,33 +484,75 @@ def create_appointment(
     start_iso: str,
     duration_minutes: int = config.DEFAULT_APPT_MIN,
     provider: str = config.DEFAULT_PROVIDER,
-    location: str = config.DEFAULT_LOCATION,
+    location: Optional[str] = None,
 ):
     """
     Insert a pending appointment. Accepts ISO or natural-language-ish datetime.
-    Normalizes to clinic TZ for consistency with availability math.
+    Normalizes to clinic TZ for consistency with availability math. The location defaults
+    to the provider's own (see providers.py).
+    Raises SlotTaken (with the next free slots) if the provider is already booked then.
     """
-    tz = _clinic_tz()
-    # Parse and normalize to clinic tz
-    start_dt = du.parse(start_iso)
-    if start_dt.tzinfo is None:
-        start_dt = start_dt.replace(tzinfo=tz)
-    else:
-        start_dt = start_dt.astimezone(tz)
-
+    start_dt = _normalize_start(start_iso)
     end_dt = start_dt + timedelta(minutes=duration_minutes)
+    location = location or providers.lookup(providers.directory(), provider).location
 
-    with db_conn() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
-        cur.execute(
-            """
-            INSERT INTO appointments
-                (user_id, chat_session_id, start_time, end_time, status, notes, provider_name, location)
-            VALUES
-                (%s, NULL, %s, %s, 'pending', %s, %s, %s)
-            RETURNING id
-            """,
-            (user_id, start_dt, end_dt, "Created via chatbot", provider, location),
-        )
-        row = cur.fetchone()
+    event = invalidation.booked_events([(provider, start_dt, end_dt)])[0]
+    params = (user_id, start_dt, end_dt, "Created via chatbot", provider, location) + invalidation.notify_args(event)
+    try:
+        for attempt in range(INSERT_ATTEMPTS):
+            try:
+                with db_conn() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+                    cur.execute(INSERT_APPOINTMENT_SQL, params)
+                    row = cur.fetchone()
+                break
+            except Exception as e:
+                if not _retryable(e, attempt):
+                    raise
+    except Exception as e:
+        if not _is_overlap(e):
+            raise
+        availability.invalidate_if_free(provider, start_dt, end_dt)
+        response_cache.invalidate_availability(provider, start_dt, end_dt)
+        alternatives = find_next_slots(start_dt, SLOT_TAKEN_ALTERNATIVES, provider, duration_minutes)
+        raise SlotTaken(provider, start_dt, end_dt, alternatives) from None
 
+    availability.mark_booked(provider, start_dt, end_dt)
+    response_cache.invalidate_availability(provider, start_dt, end_dt)
     return row["id"], start_dt, end_dt, provider, location
+
+
+async def acreate_appointment(
+    user_id: str,
+    start_iso: str,
+    duration_minutes: int = config.DEFAULT_APPT_MIN,
+    provider: str = config.DEFAULT_PROVIDER,
+    location: Optional[str] = None,
+):
+    """Async variant of create_appointment."""
+    start_dt = _normalize_start(start_iso)
+    end_dt = start_dt + timedelta(minutes=duration_minutes)
+    location = location or providers.lookup(await providers.adirectory(), provider).location
+
+    event = invalidation.booked_events([(provider, start_dt, end_dt)])[0]
+    params = (user_id, start_dt, end_dt, "Created via chatbot", provider, location) + invalidation.notify_args(event)
+    try:
+        for attempt in range(INSERT_ATTEMPTS):
+            try:
+                async with adb_conn() as conn, adict_cursor(conn) as cur:
+                    await cur.execute(INSERT_APPOINTMENT_SQL, params)
+                    row = await cur.fetchone()
+                break
+            except Exception as e:
+                if not _retryable(e, attempt):
+                    raise
+    except Exception as e:
+        if not _is_overlap(e):
+            raise
+        availability.invalidate_if_free(provider, start_dt, end_dt)
+        response_cache.invalidate_availability(provider, start_dt, end_dt)
+        alternatives = await afind_next_slots(start_dt, SLOT_TAKEN_ALTERNATIVES, provider, duration_minutes)
+        raise SlotTaken(provider, start_dt, end_dt, alternatives) from None
+
+    availability.mark_booked(provider, start_dt, end_dt)
+    response_cache.invalidate_availability(provider, start_dt, end_dt)
+    return str(row["id"]), start_dt, end_dt, provider, location
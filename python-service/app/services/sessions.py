@@ -1,7 +1,13 @@
+import asyncio
 import json
-from typing import Optional, List, Dict, Any
+import uuid
+from typing import Optional, List, Dict, Any, Tuple
 from datetime import datetime
+from ..core import config, metrics
 from ..db import db_conn, dict_cursor
+from ..adb import adb_conn, adict_cursor
+from . import history, invalidation
+from .message_log import get_writer
 
 def ensure_session(user_id: str, session_id: Optional[str]) -> str:
     """Return existing session_id or create a new chat_sessions row."""
@@ -17,25 +23,280 @@ def ensure_session(user_id: str, session_id: Optional[str]) -> str:
         return cur.fetchone()["id"]
 
 def log_message(session_id: str, sender: str, content: str) -> None:
+    if config.WRITE_BEHIND_LOG:
+        get_writer().enqueue(session_id, sender, content)
+        history.append(session_id, sender, content)
+        return
     with db_conn() as conn, conn.cursor() as cur:
         cur.execute(
             """INSERT INTO chat_messages (chat_session_id, sender_type, content)
                    VALUES (%s, %s, %s)""",
             (session_id, sender, content),
         )
+    history.append(session_id, sender, content)
+
+# The session's latest messages, newest first: a backward range scan on
+# idx_chat_messages_session_created_at (callers put them back in order).
+#
+# chat_messages is partitioned by month of created_at. Every read of a session's messages
+# is bounded below by the session's start, so the partitions before it are pruned when the
+# statement runs (the bound is an initplan). The day of slack covers write-behind messages,
+# whose created_at comes from the worker's clock rather than the server's.
+LATEST_MESSAGES_SQL = """
+    SELECT id, sender_type, content, created_at
+      FROM chat_messages
+     WHERE chat_session_id = %s
+       AND created_at >= (SELECT started_at - interval '1 day' FROM chat_sessions WHERE id = %s)
+     ORDER BY created_at DESC
+     LIMIT %s
+"""
+
+def _tail(rows: List[Dict[str, Any]], n: int) -> List[Dict[str, Any]]:
+    return list(rows[-n:]) if n > 0 else []
 
 def get_history(session_id: str, limit: int = 10) -> List[Dict[str, Any]]:
+    """Most recent `limit` messages (oldest first), from the history cache when possible."""
+    rows = history.get(session_id, limit)
+    if rows is not None:
+        return rows
+    window = max(limit, config.HISTORY_WINDOW)
+    pending = get_writer().pending_for(session_id) if config.WRITE_BEHIND_LOG else []
     with db_conn() as conn, dict_cursor(conn) as cur:
-        cur.execute(
-            """SELECT sender_type, content
-                   FROM chat_messages
-                   WHERE chat_session_id = %s
-                   ORDER BY created_at ASC
-                   LIMIT %s""",
-            (session_id, limit),
-        )
-        return cur.fetchall()
+        cur.execute(LATEST_MESSAGES_SQL, (session_id, session_id, window))
+        rows = _merge_pending(cur.fetchall(), pending, window)
+    history.put(session_id, rows)
+    return _tail(rows, limit)
 
 def touch_session(session_id: str) -> None:
     with db_conn() as conn, conn.cursor() as cur:
         cur.execute("UPDATE chat_sessions SET last_message_at = NOW() WHERE id = %s", (session_id,))
+
+# ---------- Session-turn pipeline (one round trip before the LLM, one after) ----------
+#
+# Each statement is atomic on its own, so they run in autocommit mode: no BEGIN/COMMIT
+# round trips. The history handed to the model is the latest window of messages *before*
+# this turn (the new message is appended separately by the LLM path). When the session's
+# window is in the history cache the pre-LLM statement doesn't read at all. A statement that
+# stores a message also tells the other workers to drop their cached window of the session
+# (services/invalidation.py).
+
+# Only a session id the server generated is created by the turn statement. A client-supplied
+# id has to name an existing session: the message insert fails on its foreign key otherwise,
+# as it did before sessions were created inline.
+NEW_SESSION_CTE = """
+    s AS (
+        INSERT INTO chat_sessions (id, user_id, status, started_at, last_message_at, metadata)
+        VALUES (%(session_id)s, %(user_id)s, 'active', NOW(), NOW(), %(metadata)s)
+    ),"""
+
+# Cache miss: store the user message and read the previous window. Data-modifying CTEs don't
+# see each other's rows, so the read excludes `m` (and a session created by `s` has no start
+# yet, hence no history). Reads are bounded by the session's start as in LATEST_MESSAGES_SQL.
+_BEGIN_TURN_SQL = """
+    WITH{session} m AS (
+        INSERT INTO chat_messages (chat_session_id, sender_type, content)
+        VALUES (%(session_id)s, 'user', %(content)s)
+        RETURNING id""" + invalidation.NOTIFY_COLUMN_NAMED + """
+    )
+    SELECT sender_type, content
+      FROM (
+        SELECT sender_type, content, created_at
+          FROM chat_messages
+         WHERE chat_session_id = %(session_id)s
+           AND created_at >= (SELECT started_at - interval '1 day' FROM chat_sessions WHERE id = %(session_id)s)
+         ORDER BY created_at DESC
+         LIMIT %(window)s
+      ) t
+     ORDER BY created_at ASC
+"""
+BEGIN_TURN_SQL = _BEGIN_TURN_SQL.replace("{session}", "")
+BEGIN_NEW_SESSION_TURN_SQL = _BEGIN_TURN_SQL.replace("{session}", NEW_SESSION_CTE)
+
+# Cache hit: the session exists (we've seen it), only the message is written.
+INSERT_USER_MESSAGE_SQL = """
+    INSERT INTO chat_messages (chat_session_id, sender_type, content)
+    VALUES (%(session_id)s, 'user', %(content)s)
+    RETURNING id""" + invalidation.NOTIFY_COLUMN_NAMED
+
+FINISH_TURN_SQL = """
+    WITH m AS (
+        INSERT INTO chat_messages (chat_session_id, sender_type, content)
+        VALUES (%(session_id)s, 'assistant', %(content)s)
+        RETURNING id""" + invalidation.NOTIFY_COLUMN_NAMED + """
+    )
+    UPDATE chat_sessions SET last_message_at = NOW() WHERE id = %(session_id)s
+"""
+
+# Write-behind variants (CHAT_LOG_MODE=write_behind), cache miss only: the statement reads
+# history; the messages themselves go through message_log's queue. Nothing is inserted into
+# chat_messages here, so for a supplied id the read goes through chat_sessions: no row back
+# means the session doesn't exist (and the flusher's insert would fail later), one row with
+# NULL columns means it has no messages yet.
+BEGIN_TURN_WRITE_BEHIND_SQL = """
+    SELECT m.id, m.sender_type, m.content, m.created_at
+      FROM chat_sessions s
+      LEFT JOIN LATERAL (
+        SELECT id, sender_type, content, created_at
+          FROM chat_messages
+         WHERE chat_session_id = s.id
+           AND created_at >= s.started_at - interval '1 day'
+         ORDER BY created_at DESC
+         LIMIT %(window)s
+      ) m ON TRUE
+     WHERE s.id = %(session_id)s
+"""
+
+# A new session has nothing to read: create it before its first message is queued.
+CREATE_SESSION_SQL = """
+    INSERT INTO chat_sessions (id, user_id, status, started_at, last_message_at, metadata)
+    VALUES (%(session_id)s, %(user_id)s, 'active', NOW(), NOW(), %(metadata)s)
+"""
+
+def _session_rows(rows: List[Dict[str, Any]], session_id: str) -> List[Dict[str, Any]]:
+    """Messages read by BEGIN_TURN_WRITE_BEHIND_SQL; raises if the session doesn't exist."""
+    if not rows:
+        raise LookupError(f"chat session {session_id} does not exist")
+    return [r for r in rows if r["id"] is not None]
+
+def _merge_pending(rows: List[Dict[str, Any]], pending, window: int) -> List[Dict[str, Any]]:
+    """
+    Latest window of flushed rows + messages still queued, oldest first. `pending` is
+    snapshotted before the query, so a message flushed in between shows up in both and is
+    deduplicated by id.
+    """
+    seen = {str(r["id"]) for r in rows}
+    merged = [(r["created_at"], r["sender_type"], r["content"]) for r in rows]
+    merged += [(m.created_at, m.sender_type, m.content) for m in pending if m.id not in seen]
+    merged.sort(key=lambda r: r[0])
+    return [{"sender_type": sender, "content": content} for _, sender, content in merged[-window:]]
+
+def _begin_turn_params(user_id: str, session_id: Optional[str], message: str, history_limit: int) -> Dict[str, Any]:
+    sid = session_id or str(uuid.uuid4())
+    return {
+        "session_id": sid,
+        "user_id": user_id,
+        "metadata": json.dumps({"channel": "web"}),
+        "content": message,
+        # The cache keeps HISTORY_WINDOW messages, so read at least that many on a miss.
+        "window": max(history_limit, config.HISTORY_WINDOW),
+        **invalidation.notify_params(invalidation.session_event(sid)),
+    }
+
+def _begin_turn_sql(session_id: Optional[str]) -> str:
+    # No id from the client: the server made one up, and the statement creates the session.
+    return BEGIN_TURN_SQL if session_id else BEGIN_NEW_SESSION_TURN_SQL
+
+def _finish_turn_params(session_id: str, reply: str) -> Dict[str, Any]:
+    return {
+        "session_id": session_id,
+        "content": reply,
+        **invalidation.notify_params(invalidation.session_event(session_id)),
+    }
+
+def _cached_history(session_id: Optional[str], history_limit: int) -> Optional[List[Dict[str, Any]]]:
+    # A brand-new session has nothing cached (and nothing to read, but it still needs its row).
+    return history.get(session_id, history_limit) if session_id else None
+
+def _remember_turn(session_id: str, rows: Optional[List[Dict[str, Any]]], message: str) -> None:
+    if rows is not None:
+        history.put(session_id, rows)
+    history.append(session_id, "user", message)
+
+def begin_turn(
+    user_id: str, session_id: Optional[str], message: str, history_limit: int = 10
+) -> Tuple[str, List[Dict[str, Any]]]:
+    """
+    Pre-LLM persistence: create the session if no id was given and store the user message
+    in a single statement. Returns the latest `history_limit` messages before this one (oldest
+    first) – from the history cache, else read by that same statement.
+    """
+    params = _begin_turn_params(user_id, session_id, message, history_limit)
+    sid = params["session_id"]
+    with metrics.stage("history_fetch"):
+        cached = _cached_history(session_id, history_limit)
+    rows = None
+
+    with metrics.stage("session_upsert"):
+        if config.WRITE_BEHIND_LOG:
+            writer = get_writer()
+            if session_id is None:
+                with db_conn(autocommit=True) as conn, conn.cursor() as cur:
+                    cur.execute(CREATE_SESSION_SQL, params)
+                rows = []
+            elif cached is None:
+                pending = writer.pending_for(sid)
+                with db_conn(autocommit=True) as conn, dict_cursor(conn) as cur:
+                    cur.execute(BEGIN_TURN_WRITE_BEHIND_SQL, params)
+                    rows = _merge_pending(_session_rows(cur.fetchall(), sid), pending, params["window"])
+            # Enqueued only now: the session row must exist before the flusher inserts into it.
+            writer.enqueue(sid, "user", message)
+        else:
+            with db_conn(autocommit=True) as conn, dict_cursor(conn) as cur:
+                if cached is None:
+                    cur.execute(_begin_turn_sql(session_id), params)
+                    rows = cur.fetchall()
+                else:
+                    cur.execute(INSERT_USER_MESSAGE_SQL, params)
+
+    _remember_turn(sid, rows, message)
+    return sid, cached if cached is not None else _tail(rows, history_limit)
+
+def finish_turn(session_id: str, reply: str) -> None:
+    """Post-LLM persistence in a single statement: store the reply and bump last_message_at."""
+    with metrics.stage("message_log"):
+        if config.WRITE_BEHIND_LOG:
+            get_writer().enqueue(session_id, "assistant", reply)
+        else:
+            with db_conn(autocommit=True) as conn, conn.cursor() as cur:
+                cur.execute(FINISH_TURN_SQL, _finish_turn_params(session_id, reply))
+    history.append(session_id, "assistant", reply)
+
+async def _aenqueue(writer, session_id: str, sender: str, content: str):
+    # enqueue() only blocks when the queue is full (backpressure); keep that off the event loop.
+    if writer.queue_has_room():
+        return writer.enqueue(session_id, sender, content)
+    return await asyncio.to_thread(writer.enqueue, session_id, sender, content)
+
+async def abegin_turn(
+    user_id: str, session_id: Optional[str], message: str, history_limit: int = 10
+) -> Tuple[str, List[Dict[str, Any]]]:
+    """Async variant of begin_turn."""
+    params = _begin_turn_params(user_id, session_id, message, history_limit)
+    sid = params["session_id"]
+    with metrics.stage("history_fetch"):
+        cached = _cached_history(session_id, history_limit)
+    rows = None
+
+    with metrics.stage("session_upsert"):
+        if config.WRITE_BEHIND_LOG:
+            writer = get_writer()
+            if session_id is None:
+                async with adb_conn(autocommit=True) as conn:
+                    await conn.execute(CREATE_SESSION_SQL, params)
+                rows = []
+            elif cached is None:
+                pending = writer.pending_for(sid)
+                async with adb_conn(autocommit=True) as conn, adict_cursor(conn) as cur:
+                    await cur.execute(BEGIN_TURN_WRITE_BEHIND_SQL, params)
+                    rows = _merge_pending(_session_rows(await cur.fetchall(), sid), pending, params["window"])
+            await _aenqueue(writer, sid, "user", message)
+        else:
+            async with adb_conn(autocommit=True) as conn, adict_cursor(conn) as cur:
+                if cached is None:
+                    await cur.execute(_begin_turn_sql(session_id), params)
+                    rows = await cur.fetchall()
+                else:
+                    await cur.execute(INSERT_USER_MESSAGE_SQL, params)
+
+    _remember_turn(sid, rows, message)
+    return sid, cached if cached is not None else _tail(rows, history_limit)
+
+async def afinish_turn(session_id: str, reply: str) -> None:
+    """Async variant of finish_turn."""
+    with metrics.stage("message_log"):
+        if config.WRITE_BEHIND_LOG:
+            await _aenqueue(get_writer(), session_id, "assistant", reply)
+        else:
+            async with adb_conn(autocommit=True) as conn:
+                await conn.execute(FINISH_TURN_SQL, _finish_turn_params(session_id, reply))
+    history.append(session_id, "assistant", reply)
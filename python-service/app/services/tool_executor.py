@@ -0,0 +1,194 @@
+# app/services/tool_executor.py
+#
+# Runs the tool calls of one model turn. Identical calls (same name and arguments) run once.
+# Read-only tools run concurrently, at most TOOL_MAX_WORKERS at a time per turn – on a shared
+# thread pool (sync) or as tasks (async) – each in its own copy of the caller's context, so
+# the current user follows them. The shared pool is sized for every request thread running a
+# turn at once; a turn that still finds it fully taken runs its calls inline instead of
+# queueing behind other users' tools.
+# Tools with side effects (SERIAL_TOOLS) run after those, one at a time and in the order the
+# model asked for them. Callers get results keyed by call index, so whatever order the
+# calls finish in, rendering stays deterministic.
+
+import asyncio
+import json
+import threading
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from contextvars import Context
+from typing import Any, AsyncIterator, Dict, Iterable, Iterator, List, Mapping, NamedTuple, Optional, Tuple
+
+from ..core import config, metrics
+
+# Booking twice in parallel would race against itself for the provider's calendar.
+SERIAL_TOOLS = frozenset({"schedule_appointment"})
+
+
+class ToolCall(NamedTuple):
+    name: str
+    args: Dict[str, Any]
+
+
+def dedupe(calls: Iterable[ToolCall]) -> List[ToolCall]:
+    """Drop repeats of an identical call, keeping the first occurrence's position."""
+    seen = set()
+    unique: List[ToolCall] = []
+    for call in calls:
+        key = (call.name, json.dumps(call.args, sort_keys=True, default=str))
+        if key not in seen:
+            seen.add(key)
+            unique.append(call)
+    return unique
+
+
+def _split(calls: List[ToolCall]) -> Tuple[List[int], List[int]]:
+    parallel = [i for i, c in enumerate(calls) if c.name not in SERIAL_TOOLS]
+    serial = [i for i, c in enumerate(calls) if c.name in SERIAL_TOOLS]
+    return parallel, serial
+
+
+# Sync handlers run on anyio's request threadpool: 40 threads unless the app changes it.
+REQUEST_THREADS = 40
+
+_pool: Optional[ThreadPoolExecutor] = None
+_pool_lock = threading.Lock()
+_request_threads = REQUEST_THREADS
+_reserved = 0  # pool threads held by turns in progress
+
+
+def pool_size() -> int:
+    return config.TOOL_POOL_WORKERS or _request_threads * max(1, config.TOOL_MAX_WORKERS)
+
+
+def configure_pool(request_threads: int) -> None:
+    """Size the shared pool for this many concurrent sync requests (takes effect on first use)."""
+    global _request_threads
+    with _pool_lock:
+        _request_threads = max(1, request_threads)
+
+
+def _get_pool() -> ThreadPoolExecutor:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                # Threads start on demand, so the size is a ceiling, not a standing cost.
+                _pool = ThreadPoolExecutor(max_workers=pool_size(), thread_name_prefix="tool")
+    return _pool
+
+
+def _reserve(wanted: int) -> int:
+    """Take up to `wanted` pool threads for one turn; 0 when fewer than two are free."""
+    global _reserved
+    with _pool_lock:
+        granted = min(wanted, pool_size() - _reserved)
+        if granted < 2:
+            return 0
+        _reserved += granted
+        return granted
+
+
+def _release(n: int) -> None:
+    global _reserved
+    with _pool_lock:
+        _reserved -= n
+
+
+def shutdown_pool() -> None:
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=True)
+
+
+def iter_results(tools: Mapping[str, Any], calls: List[ToolCall], context: Context) -> Iterator[Tuple[int, str]]:
+    """(index into `calls`, raw tool output) as each call finishes."""
+    parallel, serial = _split(calls)
+
+    def invoke(call: ToolCall) -> str:
+        with metrics.stage(f"tool.{call.name}"):
+            return tools[call.name].invoke(call.args)
+
+    def run(i: int) -> str:
+        return context.copy().run(invoke, calls[i])
+
+    fan_out = len(parallel) > 1 and config.TOOL_MAX_WORKERS > 1
+    width = _reserve(min(len(parallel), config.TOOL_MAX_WORKERS)) if fan_out else 0
+    if fan_out:
+        metrics.tool_fanout.inc(how="pooled" if width else "inline")
+    try:
+        if not width:
+            for i in parallel:
+                yield i, run(i)
+        else:
+            # At most `width` of this turn's calls on the pool at once; the next starts as one ends.
+            pool, waiting = _get_pool(), iter(parallel)
+            futures: Dict[Future, int] = {}
+
+            def submit() -> None:
+                i = next(waiting, None)
+                if i is not None:
+                    futures[pool.submit(run, i)] = i
+
+            for _ in range(width):
+                submit()
+            try:
+                while futures:
+                    done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        i = futures.pop(future)
+                        submit()
+                        yield i, future.result()
+            finally:
+                for future in futures:
+                    future.cancel()
+    finally:
+        _release(width)
+
+    for i in serial:
+        yield i, run(i)
+
+
+async def aiter_results(
+    tools: Mapping[str, Any], calls: List[ToolCall], context: Context
+) -> AsyncIterator[Tuple[int, str]]:
+    """Async variant of iter_results (tasks instead of the thread pool)."""
+    parallel, serial = _split(calls)
+    limit = asyncio.Semaphore(max(1, config.TOOL_MAX_WORKERS))
+
+    async def run(i: int) -> Tuple[int, str]:
+        call = calls[i]
+        async with limit:
+            with metrics.stage(f"tool.{call.name}"):
+                return i, await tools[call.name].ainvoke(call.args)
+
+    def spawn(i: int) -> "asyncio.Task[Tuple[int, str]]":
+        # A task runs in a copy of the context current at creation: here, the caller's.
+        return context.copy().run(asyncio.ensure_future, run(i))
+
+    tasks = [spawn(i) for i in parallel]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks:
+            task.cancel()
+
+    for i in serial:
+        yield await spawn(i)
+
+
+def run_tools(tools: Mapping[str, Any], calls: List[ToolCall], context: Context) -> List[str]:
+    """Raw outputs in call order."""
+    out: List[str] = [""] * len(calls)
+    for i, result in iter_results(tools, calls, context):
+        out[i] = result
+    return out
+
+
+async def arun_tools(tools: Mapping[str, Any], calls: List[ToolCall], context: Context) -> List[str]:
+    """Async variant of run_tools."""
+    out: List[str] = [""] * len(calls)
+    async for i, result in aiter_results(tools, calls, context):
+        out[i] = result
+    return out
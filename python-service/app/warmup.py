@@ -0,0 +1,144 @@
+# app/warmup.py
+#
+# Startup warm-up. A fresh worker otherwise pays several one-off costs inside its first
+# requests: importing LangChain/OpenAI, dateparser loading its language data on the first
+# parse, opening DB connections, building the model client. The lifespan runs these steps
+# in the background right after startup (two lanes: the CPU-bound imports and parser
+# priming, and the DB; both in worker threads so /health stays responsive) and /ready
+# answers 503 until every step has finished. Each step's duration is logged and shown on
+# /health. Importing this module – or app.api – does none of this work.
+
+import asyncio
+import importlib
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from .core import config
+
+logger = logging.getLogger("python-service.warmup")
+
+STARTING = "starting"
+READY = "ready"
+
+# Imported up front when the LLM path is on (the model client needs them anyway)
+LLM_MODULES = ("httpx", "langchain_core.messages", "langchain_core.tools", "langchain_openai", "app.services.llm")
+
+
+class Readiness:
+    """Warm-up progress: STARTING until every step has run (ok or not), then READY."""
+
+    def __init__(self):
+        self.state = STARTING
+        self.steps: Dict[str, Dict[str, Any]] = {}
+        self.seconds: Optional[float] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.state == READY
+
+    def record(self, name: str, seconds: float, error: Optional[BaseException] = None) -> None:
+        step: Dict[str, Any] = {"ms": round(seconds * 1000, 1), "ok": error is None}
+        if error is not None:
+            step["error"] = f"{type(error).__name__}: {' '.join(str(error).split())}"
+        self.steps[name] = step
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "ms": None if self.seconds is None else round(self.seconds * 1000, 1),
+            "steps": dict(self.steps),
+        }
+
+
+readiness = Readiness()
+
+
+# ---------- Steps ----------
+
+def _import_modules() -> None:
+    for name in LLM_MODULES:
+        importlib.import_module(name)
+
+
+def _prime_date_parser() -> None:
+    from .services.dates import warm_date_parser
+    warm_date_parser()
+
+
+def _build_model_client() -> None:
+    from .services.llm import get_registry
+    get_registry()
+
+
+def _open_db_pool() -> None:
+    from .db import db_conn
+    with db_conn() as conn, conn.cursor() as cur:
+        cur.execute("SELECT 1")
+
+
+async def _aopen_db_pool() -> None:
+    from .adb import adb_conn
+    async with adb_conn() as conn, conn.cursor() as cur:
+        await cur.execute("SELECT 1")
+
+
+def _load_providers() -> None:
+    from .services.providers import directory
+    directory()
+
+
+async def _aload_providers() -> None:
+    from .services.providers import adirectory
+    await adirectory()
+
+
+Step = Callable[[], Awaitable[None]]
+
+
+def _threaded(fn: Callable[[], None]) -> Step:
+    return lambda: asyncio.to_thread(fn)
+
+
+def _lanes() -> List[List[Tuple[str, Step]]]:
+    cpu = [("date_parser", _threaded(_prime_date_parser))]
+    if config.USE_LLM:
+        cpu = [("imports", _threaded(_import_modules))] + cpu + [("model_client", _threaded(_build_model_client))]
+    if config.ASYNC_CHAT:
+        db = [("db_pool", _aopen_db_pool), ("providers", _aload_providers)]
+    else:
+        db = [("db_pool", _threaded(_open_db_pool)), ("providers", _threaded(_load_providers))]
+    return [cpu, db]
+
+
+async def _run_lane(steps: List[Tuple[str, Step]]) -> None:
+    for name, step in steps:
+        t0 = time.perf_counter()
+        error: Optional[Exception] = None
+        try:
+            await step()
+        except Exception as e:
+            error = e
+        elapsed = time.perf_counter() - t0
+        readiness.record(name, elapsed, error)
+        if error is None:
+            logger.info("warm-up step %s done in %.1f ms", name, elapsed * 1000)
+        else:
+            logger.warning("warm-up step %s failed after %.1f ms: %s", name, elapsed * 1000, error)
+
+
+async def run() -> None:
+    """
+    Run every warm-up step, then mark the worker ready. A failed step is logged and shown
+    on /health but doesn't keep the worker out of rotation: the first request that needs
+    it pays the cost (or hits the error) as it would have without the warm-up.
+    """
+    t0 = time.perf_counter()
+    if config.WARMUP_ON_STARTUP:
+        await asyncio.gather(*(_run_lane(lane) for lane in _lanes()))
+    readiness.seconds = time.perf_counter() - t0
+    readiness.state = READY
+    failed = [name for name, step in readiness.steps.items() if not step["ok"]]
+    logger.info(
+        "ready after %.1f ms%s", readiness.seconds * 1000, f" (failed: {', '.join(failed)})" if failed else ""
+    )
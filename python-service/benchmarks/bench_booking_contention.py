@@ -0,0 +1,173 @@
+"""
+Booking stress test: in every round all N threads are released together and book slots of
+one provider; afterwards we count how many slots ended up double-booked.
+
+  --pattern same      every thread wants the same slot (worst-case contention)
+  --pattern distinct  every thread wants its own slot (nothing should wait on anything)
+
+  constrained  create_appointment as shipped (exclusion constraint, SlotTaken on conflict)
+  baseline     --compare: the application-level alternative, "SELECT for overlap, then
+               INSERT" under READ COMMITTED, against an unconstrained scratch copy of the table
+
+    python -m benchmarks.bench_booking_contention --threads 32 --rounds 20 --pattern same --compare
+"""
+
+import argparse
+import logging
+import statistics
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+from app.core import config
+from app.db import db_conn, dict_cursor, close_pool
+from app.services import scheduling
+
+PROVIDER = "Dr. Bench Contention"
+SCRATCH_TABLE = "bench_appointments_unconstrained"
+
+OVERLAPS_SQL = """
+    SELECT COUNT(*) AS pairs, COUNT(DISTINCT a.start_time) AS slots
+    FROM {table} a
+    JOIN {table} b
+      ON a.provider_name = b.provider_name
+     AND a.id < b.id
+     AND a.start_time < b.end_time
+     AND b.start_time < a.end_time
+    WHERE a.provider_name = %s
+      AND a.status IN ('pending','confirmed')
+      AND b.status IN ('pending','confirmed')
+"""
+
+CHECK_SQL = f"""
+    SELECT 1 FROM {SCRATCH_TABLE}
+    WHERE provider_name = %s AND status IN ('pending','confirmed')
+      AND start_time < %s AND end_time > %s
+    LIMIT 1
+"""
+
+INSERT_SCRATCH_SQL = f"""
+    INSERT INTO {SCRATCH_TABLE} (user_id, start_time, end_time, status, notes, provider_name, location)
+    VALUES (%s, %s, %s, 'pending', 'bench', %s, %s)
+"""
+
+
+def _user_id():
+    with db_conn() as conn, dict_cursor(conn) as cur:
+        cur.execute("SELECT id FROM users ORDER BY created_at LIMIT 1")
+        return str(cur.fetchone()["id"])
+
+
+def _slots(n):
+    tz = scheduling._clinic_tz()
+    day = date.today() + timedelta(days=400)
+    first = datetime(day.year, day.month, day.day, 9, 0, tzinfo=tz)
+    return [first + timedelta(minutes=30 * i) for i in range(n)]
+
+
+def _book_constrained(user_id, start):
+    try:
+        scheduling.create_appointment(user_id, start.isoformat(), 30, provider=PROVIDER)
+        return "booked"
+    except scheduling.SlotTaken:
+        return "taken"
+
+
+def _book_check_then_insert(user_id, start):
+    end = start + timedelta(minutes=30)
+    with db_conn() as conn, conn.cursor() as cur:
+        cur.execute(CHECK_SQL, (PROVIDER, end, start))
+        if cur.fetchone():
+            return "taken"
+        cur.execute(INSERT_SCRATCH_SQL, (user_id, start, end, PROVIDER, config.DEFAULT_LOCATION))
+    return "booked"
+
+
+def run(book, user_id, rounds, threads):
+    """rounds[r][t] is the slot thread t books in round r; rounds start together at a barrier."""
+    barrier = threading.Barrier(threads)
+    outcomes = {"booked": 0, "taken": 0, "error": 0}
+    latencies = []
+    lock = threading.Lock()
+
+    def worker(idx):
+        local = []
+        for slots in rounds:
+            barrier.wait()
+            t0 = time.perf_counter()
+            try:
+                outcome = book(user_id, slots[idx])
+            except Exception:
+                logging.getLogger("bench").exception("booking failed")
+                outcome = "error"
+            local.append((outcome, time.perf_counter() - t0))
+        with lock:
+            for outcome, dt in local:
+                outcomes[outcome] += 1
+                latencies.append(dt)
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    t0 = time.perf_counter()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    return outcomes, latencies, time.perf_counter() - t0
+
+
+def double_books(table):
+    with db_conn() as conn, dict_cursor(conn) as cur:
+        cur.execute(OVERLAPS_SQL.format(table=table), (PROVIDER,))
+        return cur.fetchone()
+
+
+def report(label, outcomes, latencies, elapsed, overlaps):
+    lat = sorted(latencies)
+    p95 = lat[int(len(lat) * 0.95) - 1] if lat else 0.0
+    print(
+        f"{label:12s} {len(latencies) / elapsed:8.0f} bookings/s  "
+        f"booked={outcomes['booked']} taken={outcomes['taken']} errors={outcomes['error']}  "
+        f"p50={statistics.median(lat) * 1000:.1f} ms p95={p95 * 1000:.1f} ms  "
+        f"double-booked slots={overlaps['slots']} (overlapping pairs={overlaps['pairs']})"
+    )
+
+
+def cleanup():
+    with db_conn() as conn, conn.cursor() as cur:
+        cur.execute("DELETE FROM appointments WHERE provider_name = %s", (PROVIDER,))
+        cur.execute(f"DROP TABLE IF EXISTS {SCRATCH_TABLE}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--threads", type=int, default=32)
+    ap.add_argument("--rounds", type=int, default=20)
+    ap.add_argument("--pattern", choices=("same", "distinct"), default="same")
+    ap.add_argument("--compare", action="store_true", help="also run the check-then-insert baseline")
+    args = ap.parse_args()
+    logging.disable(logging.INFO)
+
+    config.DB_POOL_MAX = max(config.DB_POOL_MAX, args.threads)
+    user_id = _user_id()
+    if args.pattern == "same":
+        rounds = [[slot] * args.threads for slot in _slots(args.rounds)]
+    else:
+        slots = _slots(args.rounds * args.threads)
+        rounds = [slots[r * args.threads:(r + 1) * args.threads] for r in range(args.rounds)]
+    cleanup()
+    try:
+        outcomes, latencies, elapsed = run(_book_constrained, user_id, rounds, args.threads)
+        report("constrained", outcomes, latencies, elapsed, double_books("appointments"))
+
+        if args.compare:
+            with db_conn() as conn, conn.cursor() as cur:
+                cur.execute(f"CREATE TABLE {SCRATCH_TABLE} (LIKE appointments INCLUDING DEFAULTS)")
+            outcomes, latencies, elapsed = run(_book_check_then_insert, user_id, rounds, args.threads)
+            report("baseline", outcomes, latencies, elapsed, double_books(SCRATCH_TABLE))
+    finally:
+        cleanup()
+        close_pool()
+
+
+if __name__ == "__main__":
+    main()
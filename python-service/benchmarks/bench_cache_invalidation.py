@@ -0,0 +1,151 @@
+"""
+Cross-worker cache invalidation (services/invalidation.py): what publishing costs the
+writes, and how quickly another worker sees them.
+
+  publish  chat turns (begin_turn + finish_turn) and bookings (create_appointment), each
+           setting in a fresh process: CACHE_INVALIDATION off, then on. --threads turns run
+           at once, since NOTIFY serializes the commits of notifying transactions.
+  lag      a listener in this process, and a second connection committing events of a
+           "foreign" worker: time from sending the (autocommit) NOTIFY to the event having
+           been applied to this worker's caches.
+
+Needs Postgres with the schema and the alice@example.com sample user (POSTGRES_* env vars as
+for the service). The benchmark's sessions and appointments are deleted afterwards.
+
+    python -m benchmarks.bench_cache_invalidation --mode publish --turns 400 --threads 8
+    python -m benchmarks.bench_cache_invalidation --mode lag --events 500
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+SERVICE_DIR = Path(__file__).resolve().parents[1]
+PROVIDER = "Dr. Invalidation Bench"
+
+PUBLISH_CHILD = """
+import json, statistics, threading, time, uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from app.db import db_conn
+from app.services import scheduling, sessions
+
+TURNS, THREADS, BOOKINGS = %d, %d, %d
+with db_conn() as conn, conn.cursor() as cur:
+    cur.execute("SELECT id FROM users WHERE email = 'alice@example.com'")
+    user_id = str(cur.fetchone()[0])
+
+sids = [str(uuid.uuid4()) for _ in range(THREADS)]
+for sid in sids:
+    sessions.begin_turn(user_id, sid, "warm", 10)   # creates the session, caches its window
+
+def turn(i):
+    t0 = time.perf_counter()
+    sid, _ = sessions.begin_turn(user_id, sids[i %% THREADS], "message %%d" %% i, 10)
+    sessions.finish_turn(sid, "reply %%d" %% i)
+    return (time.perf_counter() - t0) * 1000
+
+t0 = time.perf_counter()
+with ThreadPoolExecutor(THREADS) as pool:
+    turn_ms = list(pool.map(turn, range(TURNS)))
+wall = time.perf_counter() - t0
+
+start = datetime(2032, 1, 5, 0, 0, tzinfo=scheduling._clinic_tz())
+book_ms = []
+for i in range(BOOKINGS):
+    slot = start + timedelta(minutes=30 * i)
+    t1 = time.perf_counter()
+    scheduling.create_appointment(user_id, slot.isoformat(), 30, %r)
+    book_ms.append((time.perf_counter() - t1) * 1000)
+
+with db_conn() as conn, conn.cursor() as cur:
+    cur.execute("DELETE FROM appointments WHERE provider_name = %%s", (%r,))
+    cur.execute("DELETE FROM chat_messages WHERE chat_session_id = ANY(%%s::uuid[])", (sids,))
+    cur.execute("DELETE FROM chat_sessions WHERE id = ANY(%%s::uuid[])", (sids,))
+print(json.dumps({
+    "turn_p50": statistics.median(turn_ms),
+    "turn_p99": sorted(turn_ms)[int(len(turn_ms) * 0.99) - 1],
+    "turns_per_s": TURNS / wall,
+    "book_p50": statistics.median(book_ms),
+}))
+"""
+
+
+def run_publish(turns: int, threads: int, bookings: int) -> None:
+    code = PUBLISH_CHILD % (turns, threads, bookings, PROVIDER, PROVIDER)
+    for enabled in ("false", "true"):
+        env = {**os.environ, "CACHE_INVALIDATION": enabled, "LOG_LEVEL": "WARNING"}
+        out = subprocess.run(
+            [sys.executable, "-c", code], cwd=SERVICE_DIR, env=env, capture_output=True, text=True, check=True
+        )
+        r = json.loads(out.stdout.strip().splitlines()[-1])
+        print(
+            f"CACHE_INVALIDATION={enabled:5s}  turn p50 {r['turn_p50']:6.2f} ms  p99 {r['turn_p99']:6.2f} ms  "
+            f"{r['turns_per_s']:7.0f} turns/s ({threads} threads)   booking p50 {r['book_p50']:6.2f} ms"
+        )
+
+
+def run_lag(events: int) -> None:
+    from app.core import config
+    from app.db import db_conn
+    from app.services import invalidation
+
+    applied = {}
+    done = threading.Event()
+    apply = invalidation.apply
+
+    def timed_apply(payload: str) -> str:
+        kind = apply(payload)
+        applied[json.loads(payload)["s"]] = time.perf_counter()
+        if len(applied) == events:
+            done.set()
+        return kind
+
+    invalidation.apply = timed_apply
+    listener = invalidation.Listener()
+    listener.start()
+    while not listener.stats()["connected"]:
+        time.sleep(0.01)
+
+    sent = {}
+    with db_conn(autocommit=True) as conn, conn.cursor() as cur:
+        for i in range(events):
+            key = f"bench-{i}"
+            payload = json.dumps({"w": "bench", "s": key})
+            sent[key] = time.perf_counter()
+            cur.execute("SELECT pg_notify(%s, %s)", (config.CACHE_INVALIDATION_CHANNEL, payload))
+            time.sleep(0.002)
+    done.wait(10)
+    listener.stop()
+    invalidation.apply = apply
+
+    lags = sorted((applied[k] - sent[k]) * 1000 for k in sent if k in applied)
+    print(
+        f"{len(lags)}/{events} events applied  lag p50 {statistics.median(lags):.3f} ms  "
+        f"p99 {lags[int(len(lags) * 0.99) - 1]:.3f} ms  max {lags[-1]:.3f} ms"
+    )
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--mode", choices=("publish", "lag"), default="publish")
+    ap.add_argument("--turns", type=int, default=400)
+    ap.add_argument("--threads", type=int, default=8)
+    ap.add_argument("--bookings", type=int, default=100)
+    ap.add_argument("--events", type=int, default=500)
+    args = ap.parse_args()
+
+    if args.mode == "publish":
+        run_publish(args.turns, args.threads, args.bookings)
+    else:
+        run_lag(args.events)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+"""
+Monthly-partitioned chat_messages versus the old single table, at scale.
+
+Generates --rows messages (20 per session, sessions spread evenly over the last --months
+months) server side, into a flat copy with the pre-004 layout (bench_chat_messages_flat:
+primary key on id, index on (chat_session_id, created_at)) and into chat_messages itself,
+then times:
+
+  history  the session history read (sessions.LATEST_MESSAGES_SQL, bounded by the session's
+           start) against the same read on the flat table, for sessions of the last week and
+           for sessions of any month, with the partitions each plan actually scanned
+  insert   single-row autocommit inserts of the current month, partitioned vs. flat
+  compact  (--compact) chat_archive.compact of the oldest month: every message in it,
+           generated or not, ends up in chat_transcripts
+
+Generation runs once: a later run finds bench_chat_messages_flat and reuses the data
+(--drop deletes it all: the sessions, their messages, the flat table). Needs Postgres with
+the partitioned schema and the alice@example.com sample user (POSTGRES_* env vars as for the
+service); use a scratch database, 50M rows take about 20 GB.
+
+    python -m benchmarks.bench_chat_partitions --rows 50000000 --months 12 --samples 2000
+"""
+
+import argparse
+import random
+import statistics
+import time
+from datetime import datetime, timezone
+
+from app.db import db_conn
+from app.services import chat_archive, sessions
+
+FLAT = "bench_chat_messages_flat"
+MESSAGES_PER_SESSION = 20
+
+# The read before partitioning: no lower bound on created_at
+FLAT_HISTORY_SQL = f"""
+    SELECT id, sender_type, content, created_at
+      FROM {FLAT}
+     WHERE chat_session_id = %s
+     ORDER BY created_at DESC
+     LIMIT %s
+"""
+
+# One month of sessions and their messages, into the flat table
+GENERATE_SQL = f"""
+    WITH s AS (
+        INSERT INTO chat_sessions (id, user_id, status, started_at, last_message_at, metadata)
+        SELECT gen_random_uuid(), %(user_id)s, 'completed', t, t + interval '10 minutes', '{{"channel": "bench"}}'
+          FROM (SELECT %(start)s::timestamptz + random() * (%(end)s::timestamptz - %(start)s::timestamptz) AS t
+                  FROM generate_series(1, %(sessions)s)) g
+        RETURNING id, started_at
+    )
+    INSERT INTO {FLAT} (id, chat_session_id, sender_type, content, created_at)
+    SELECT gen_random_uuid(), s.id,
+           CASE WHEN k %% 2 = 1 THEN 'user' ELSE 'assistant' END,
+           left(repeat(md5(s.id::text || k), 4), 30 + (hashtext(s.id::text) & 127) + k),
+           s.started_at + k * interval '30 seconds'
+      FROM s CROSS JOIN generate_series(1, {MESSAGES_PER_SESSION}) k
+     ORDER BY 5  -- stored in time order, sessions interleaved, as the service writes them
+"""
+
+
+def months_back(now: datetime, months: int) -> list:
+    """First instants (UTC) of the last `months` months through next month, oldest first."""
+    firsts, y, m = [], now.year, now.month
+    for _ in range(months):
+        firsts.append(datetime(y, m, 1, tzinfo=timezone.utc))
+        y, m = (y, m - 1) if m > 1 else (y - 1, 12)
+    firsts.reverse()
+    ny, nm = (now.year, now.month + 1) if now.month < 12 else (now.year + 1, 1)
+    return firsts + [datetime(ny, nm, 1, tzinfo=timezone.utc)]
+
+
+def generate(rows: int, months: int) -> None:
+    now = datetime.now(timezone.utc)
+    bounds = months_back(now, months)
+    bounds[-1] = now  # the current month is generated up to now
+    per_month = rows // MESSAGES_PER_SESSION // months
+    with db_conn(autocommit=True) as conn, conn.cursor() as cur:
+        cur.execute("SELECT id FROM users WHERE email = 'alice@example.com'")
+        row = cur.fetchone()
+        if row is None:
+            raise SystemExit("no alice@example.com user; run schema.sql and sample_data.sql first")
+        cur.execute(
+            f"CREATE UNLOGGED TABLE {FLAT} (id UUID NOT NULL, chat_session_id UUID NOT NULL, "
+            "sender_type VARCHAR(50) NOT NULL, content TEXT NOT NULL, "
+            "created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(), metadata JSONB)"
+        )
+        cur.execute("SELECT chat_messages_add_partitions(3, %s)", (bounds[0],))
+        for start, end in zip(bounds, bounds[1:]):
+            t0 = time.perf_counter()
+            cur.execute(GENERATE_SQL, {"user_id": row[0], "start": start, "end": end, "sessions": per_month})
+            print(f"  {start:%Y-%m}: {cur.rowcount:,} messages in {time.perf_counter() - t0:.0f}s", flush=True)
+
+        t0 = time.perf_counter()
+        cur.execute(f"ALTER TABLE {FLAT} SET LOGGED")
+        cur.execute(f"ALTER TABLE {FLAT} ADD PRIMARY KEY (id)")
+        cur.execute(f"CREATE INDEX ON {FLAT} (chat_session_id, created_at)")
+        print(f"  flat table indexed in {time.perf_counter() - t0:.0f}s", flush=True)
+
+        # Month by month, in the same (time) order; the last month takes the stragglers past now
+        for start, end in zip(bounds, bounds[1:-1] + ["infinity"]):
+            t0 = time.perf_counter()
+            cur.execute(
+                f"INSERT INTO chat_messages (id, chat_session_id, sender_type, content, created_at) "
+                f"SELECT id, chat_session_id, sender_type, content, created_at FROM {FLAT} "
+                "WHERE created_at >= %s AND created_at < %s::timestamptz ORDER BY created_at",
+                (start, end),
+            )
+            print(f"  chat_messages {start:%Y-%m}: {cur.rowcount:,} rows in {time.perf_counter() - t0:.0f}s", flush=True)
+        cur.execute(f"VACUUM ANALYZE {FLAT}")
+        cur.execute("VACUUM ANALYZE chat_messages")
+        cur.execute("ANALYZE chat_sessions")
+
+
+def drop() -> None:
+    with db_conn() as conn, conn.cursor() as cur:
+        cur.execute("DELETE FROM chat_sessions WHERE metadata->>'channel' = 'bench'")
+        cur.execute(f"DROP TABLE IF EXISTS {FLAT}")
+
+
+def sizes(cur) -> str:
+    cur.execute(
+        "SELECT pg_total_relation_size(%s::regclass), pg_indexes_size(%s::regclass), "
+        "(SELECT sum(pg_total_relation_size(partition)) FROM chat_messages_partitions()), "
+        "(SELECT sum(pg_indexes_size(partition)) FROM chat_messages_partitions()), "
+        "(SELECT pg_indexes_size(partition) FROM chat_messages_partitions() "
+        " WHERE lower_bound <= NOW() AND NOW() < upper_bound)",
+        (FLAT, FLAT),
+    )
+    flat, flat_idx, part, part_idx, current_idx = (v / 2 ** 20 for v in cur.fetchone())
+    return (
+        f"flat {flat:,.0f} MB (indexes {flat_idx:,.0f} MB)   partitioned {part:,.0f} MB "
+        f"(indexes {part_idx:,.0f} MB, current month's {current_idx:,.0f} MB)"
+    )
+
+
+def scanned_partitions(cur, session_id) -> int:
+    """Partitions the history read actually scanned (not pruned) for one session."""
+    cur.execute("EXPLAIN (ANALYZE, FORMAT JSON) " + sessions.LATEST_MESSAGES_SQL, (session_id, session_id, 10))
+    plan = cur.fetchone()[0]
+    stack, scanned = [plan[0]["Plan"]], 0
+    while stack:
+        node = stack.pop()
+        if node.get("Relation Name", "").startswith("chat_messages_") and node.get("Actual Loops", 0) > 0:
+            scanned += 1
+        stack.extend(node.get("Plans", []))
+    return scanned
+
+
+def pct(samples, q: float) -> float:
+    return sorted(samples)[max(0, int(len(samples) * q) - 1)]
+
+
+def bench_history(label: str, where: str, samples: int) -> None:
+    with db_conn(autocommit=True) as conn, conn.cursor() as cur:
+        cur.execute(
+            f"SELECT id FROM chat_sessions WHERE metadata->>'channel' = 'bench' AND {where} "
+            "ORDER BY random() LIMIT %s",
+            (samples,),
+        )
+        ids = [r[0] for r in cur.fetchall()]
+        part_ms, flat_ms = [], []
+        for sid in ids:
+            for sql, params, out in (
+                (sessions.LATEST_MESSAGES_SQL, (sid, sid, 10), part_ms),
+                (FLAT_HISTORY_SQL, (sid, 10), flat_ms),
+            ):
+                t0 = time.perf_counter()
+                cur.execute(sql, params)
+                cur.fetchall()
+                out.append((time.perf_counter() - t0) * 1000)
+        scanned = [scanned_partitions(cur, sid) for sid in ids[:50]]
+    print(
+        f"history {label:9s} partitioned p50 {statistics.median(part_ms):6.3f} ms  p99 {pct(part_ms, 0.99):6.3f} ms   "
+        f"flat p50 {statistics.median(flat_ms):6.3f} ms  p99 {pct(flat_ms, 0.99):6.3f} ms   "
+        f"partitions scanned {min(scanned)}-{max(scanned)}  ({len(ids)} sessions)"
+    )
+
+
+def bench_insert(rounds: int) -> None:
+    with db_conn(autocommit=True) as conn, conn.cursor() as cur:
+        cur.execute("SELECT id FROM chat_sessions WHERE metadata->>'channel' = 'bench' ORDER BY started_at DESC LIMIT 100")
+        ids = [r[0] for r in cur.fetchall()]
+        part_ms, flat_ms = [], []
+        for i in range(rounds):
+            for table, out in (("chat_messages", part_ms), (FLAT, flat_ms)):
+                t0 = time.perf_counter()
+                cur.execute(
+                    f"INSERT INTO {table} (id, chat_session_id, sender_type, content) "
+                    "VALUES (gen_random_uuid(), %s, 'user', %s)",
+                    (ids[i % len(ids)], f"insert {i}"),
+                )
+                out.append((time.perf_counter() - t0) * 1000)
+    print(
+        f"insert            partitioned p50 {statistics.median(part_ms):6.3f} ms  p99 {pct(part_ms, 0.99):6.3f} ms   "
+        f"flat p50 {statistics.median(flat_ms):6.3f} ms  p99 {pct(flat_ms, 0.99):6.3f} ms   ({rounds} rows)"
+    )
+
+
+def bench_compact() -> None:
+    with db_conn() as conn, conn.cursor() as cur:
+        cur.execute("SELECT min(upper_bound) FROM chat_messages_partitions()")
+        oldest_end = cur.fetchone()[0]
+    days = (datetime.now(timezone.utc) - oldest_end).days
+    t0 = time.perf_counter()
+    out = chat_archive.compact(days)
+    for c in out["compacted"]:
+        print(
+            f"compact  {c['partition']}: {c['messages']:,} messages of {c['sessions']:,} sessions "
+            f"in {c['seconds']:.1f}s (detach + transcripts + drop: {time.perf_counter() - t0:.1f}s)"
+        )
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--rows", type=int, default=50_000_000)
+    ap.add_argument("--months", type=int, default=12)
+    ap.add_argument("--samples", type=int, default=2000, help="sessions per history case")
+    ap.add_argument("--inserts", type=int, default=2000)
+    ap.add_argument("--compact", action="store_true", help="also compact and drop the oldest month")
+    ap.add_argument("--drop", action="store_true", help="delete the generated data and exit")
+    ap.add_argument("--seed", type=int, default=1)
+    args = ap.parse_args()
+    random.seed(args.seed)
+
+    if args.drop:
+        drop()
+        return
+    with db_conn() as conn, conn.cursor() as cur:
+        cur.execute("SELECT to_regclass(%s) IS NOT NULL", (FLAT,))
+        exists = cur.fetchone()[0]
+    if not exists:
+        print(f"generating {args.rows:,} messages over {args.months} months", flush=True)
+        t0 = time.perf_counter()
+        generate(args.rows, args.months)
+        print(f"generated in {time.perf_counter() - t0:.0f}s", flush=True)
+    with db_conn() as conn, conn.cursor() as cur:
+        cur.execute(f"SELECT count(*) FROM {FLAT}")
+        print(f"{cur.fetchone()[0]:,} messages;  {sizes(cur)}", flush=True)
+
+    bench_history("last week", "started_at >= NOW() - interval '7 days'", args.samples)
+    bench_history("any month", "true", args.samples)
+    bench_insert(args.inserts)
+    if args.compact:
+        bench_compact()
+
+
+if __name__ == "__main__":
+    main()
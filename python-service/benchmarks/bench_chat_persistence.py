@@ -0,0 +1,143 @@
+"""
+Round trips, commits and latency of the /chat persistence work per turn.
+
+  before:       ensure_session + log_message(user) + get_history + log_message(assistant) + touch_session
+  after:        begin_turn + finish_turn
+  write-behind: the same with CHAT_LOG_MODE=write_behind (messages flushed in batches off the
+                request path; only the request thread's round trips are counted)
+
+Needs a Postgres seeded from `postgres scripts/` (POSTGRES_* env vars as for the service).
+
+    python -m benchmarks.bench_chat_persistence --turns 200 --sessions 20
+"""
+
+import argparse
+import statistics
+import threading
+import time
+
+import psycopg2
+from psycopg2 import extensions
+
+from app import db
+from app.core import config
+from app.services import message_log, sessions
+
+COUNTS = {"round_trips": 0, "commits": 0}
+
+_counting_cursors = {}
+
+
+def _counting_cursor(base):
+    if base not in _counting_cursors:
+        class CountingCursor(base):
+            def execute(self, query, vars=None):
+                if threading.current_thread() is not threading.main_thread():
+                    return super().execute(query, vars)
+                conn = self.connection
+                if conn.autocommit:
+                    COUNTS["commits"] += 1  # the statement commits on its own
+                elif conn.get_transaction_status() == extensions.TRANSACTION_STATUS_IDLE:
+                    COUNTS["round_trips"] += 1  # implicit BEGIN
+                COUNTS["round_trips"] += 1
+                return super().execute(query, vars)
+
+        _counting_cursors[base] = CountingCursor
+    return _counting_cursors[base]
+
+
+class CountingConnection(extensions.connection):
+    def cursor(self, *args, **kwargs):
+        kwargs["cursor_factory"] = _counting_cursor(kwargs.get("cursor_factory") or extensions.cursor)
+        return super().cursor(*args, **kwargs)
+
+    def commit(self):
+        if (
+            threading.current_thread() is threading.main_thread()
+            and self.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE
+        ):
+            COUNTS["round_trips"] += 1
+            COUNTS["commits"] += 1
+        return super().commit()
+
+
+def _connect():
+    return psycopg2.connect(
+        host=config.DB_HOST,
+        port=config.DB_PORT,
+        user=config.DB_USER,
+        password=config.DB_PASSWORD,
+        dbname=config.DB_NAME,
+        connection_factory=CountingConnection,
+    )
+
+
+def _user_id() -> str:
+    with db.db_conn() as conn, db.dict_cursor(conn) as cur:
+        cur.execute("SELECT id FROM users ORDER BY created_at LIMIT 1")
+        row = cur.fetchone()
+    if not row:
+        raise SystemExit("no users found; load `postgres scripts/sample_data.sql` first")
+    return row["id"]
+
+
+def turn_before(user_id, session_id, message):
+    session_id = sessions.ensure_session(user_id, session_id)
+    sessions.log_message(session_id, "user", message)
+    sessions.get_history(session_id, limit=10)
+    sessions.log_message(session_id, "assistant", "reply to " + message)
+    sessions.touch_session(session_id)
+    return session_id
+
+
+def turn_after(user_id, session_id, message):
+    session_id, _ = sessions.begin_turn(user_id, session_id, message, history_limit=10)
+    sessions.finish_turn(session_id, "reply to " + message)
+    return session_id
+
+
+def run(name, turn, user_id, turns, n_sessions):
+    session_ids = [None] * n_sessions
+    COUNTS.update(round_trips=0, commits=0)
+    latencies = []
+    for i in range(turns):
+        k = i % n_sessions
+        t0 = time.perf_counter()
+        session_ids[k] = turn(user_id, session_ids[k], f"message {i}")
+        latencies.append((time.perf_counter() - t0) * 1000)
+    print(
+        f"{name:<12} round_trips/turn={COUNTS['round_trips'] / turns:5.2f} "
+        f"commits/turn={COUNTS['commits'] / turns:5.2f} "
+        f"p50={statistics.median(latencies):7.3f}ms "
+        f"mean={statistics.fmean(latencies):7.3f}ms"
+    )
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--turns", type=int, default=200)
+    ap.add_argument("--sessions", type=int, default=20)
+    args = ap.parse_args()
+
+    # One connection for the request path, one for the write-behind flusher
+    db._pool = db.ConnectionPool(connect=_connect, minconn=1, maxconn=2)
+    user_id = _user_id()
+    run("before", turn_before, user_id, args.turns, args.sessions)
+    run("after", turn_after, user_id, args.turns, args.sessions)
+
+    config.WRITE_BEHIND_LOG = True
+    run("write-behind", turn_after, user_id, args.turns, args.sessions)
+    writer = message_log.get_writer()
+    message_log.stop_writer()  # drains the queue
+    config.WRITE_BEHIND_LOG = False
+    stats = writer.stats()
+    print(
+        f"{'':<12} flushed={stats['flushed']} batches={stats['batches']} "
+        f"avg_batch={stats['avg_batch_size']} avg_flush={stats['avg_flush_ms']}ms "
+        f"dropped={stats['dropped']} queue_depth={stats['queue_depth']}"
+    )
+    db.close_pool()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""
+Time to first byte / first content of /chat vs /chat/stream, end to end through uvicorn
+against the local fake OpenAI server (model latency and per-token delay are simulated).
+
+  ttfb     first response body byte
+  content  first thing a user could read: the reply (/chat), a token or part event (/chat/stream)
+  total    full reply received (the "done" event for /chat/stream)
+
+  text  "hello"                 -> plain model text, streamed token by token
+  tool  "any slots tomorrow?"   -> check_availability tool call, rendered part
+
+Needs a Postgres seeded from `postgres scripts/` (POSTGRES_* env vars as for the service).
+
+    python -m benchmarks.bench_chat_stream --turns 30 --latency-ms 300 --token-ms 30
+"""
+
+import argparse
+import http.client
+import json
+import logging
+import os
+import socket
+import statistics
+import threading
+import time
+
+from benchmarks.fake_openai import FakeOpenAI
+
+SCENARIOS = {"text": "hello", "tool": "any slots tomorrow?"}
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _serve(app, port):
+    import uvicorn
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    return server, thread
+
+
+def _user_id():
+    from app.db import db_conn
+
+    with db_conn() as conn, conn.cursor() as cur:
+        cur.execute("SELECT id FROM users ORDER BY created_at LIMIT 1")
+        return str(cur.fetchone()[0])
+
+
+def _post(conn, path, body):
+    conn.request("POST", path, json.dumps(body), {"Content-Type": "application/json"})
+    return conn.getresponse()
+
+
+def chat_once(conn, body):
+    t0 = time.perf_counter()
+    resp = _post(conn, "/chat", body)
+    first = resp.read(1)
+    ttfb = time.perf_counter() - t0
+    data = json.loads(first + resp.read())
+    total = time.perf_counter() - t0
+    return ttfb, total, total, data["reply"]
+
+
+def stream_once(conn, body):
+    t0 = time.perf_counter()
+    resp = _post(conn, "/chat/stream", body)
+    ttfb = content = None
+    event = None
+    reply = None
+    while True:
+        line = resp.readline()
+        if ttfb is None:
+            ttfb = time.perf_counter() - t0
+        if not line:
+            break
+        line = line.decode().rstrip("\n")
+        if line.startswith("event: "):
+            event = line[len("event: "):]
+        elif line.startswith("data: "):
+            if event in ("token", "part") and content is None:
+                content = time.perf_counter() - t0
+            elif event == "done":
+                reply = json.loads(line[len("data: "):])["reply"]
+    total = time.perf_counter() - t0
+    return ttfb, content if content is not None else total, total, reply
+
+
+def run(port, fn, body, turns):
+    conn = http.client.HTTPConnection("127.0.0.1", port)
+    fn(conn, body)  # warm-up: registry, pools, availability index
+    samples = [fn(conn, body) for _ in range(turns)]
+    conn.close()
+    return samples
+
+
+def report(label, samples):
+    def p50(i):
+        return statistics.median(s[i] for s in samples) * 1000
+
+    print(f"{label:18s} ttfb p50={p50(0):7.1f} ms  content p50={p50(1):7.1f} ms  total p50={p50(2):7.1f} ms")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--turns", type=int, default=30)
+    ap.add_argument("--latency-ms", type=float, default=300.0, help="fake model time to first token")
+    ap.add_argument("--token-ms", type=float, default=30.0, help="fake model delay between tokens")
+    ap.add_argument("--execution-mode", choices=("sync", "async"), default=os.getenv("CHAT_EXECUTION_MODE", "sync"))
+    args = ap.parse_args()
+    logging.disable(logging.INFO)
+
+    fake = FakeOpenAI(latency_ms=args.latency_ms, token_ms=args.token_ms).start()
+    os.environ["OPENAI_API_KEY"] = "fake"
+    os.environ["OPENAI_BASE_URL"] = fake.base_url
+    os.environ["CHAT_EXECUTION_MODE"] = args.execution_mode
+    from app.api import app  # noqa: E402  (config reads the env above at import)
+
+    port = _free_port()
+    server, thread = _serve(app, port)
+    user_id = _user_id()
+    print(f"mode={args.execution_mode} model latency={args.latency_ms:.0f} ms token={args.token_ms:.0f} ms")
+    try:
+        for scenario, message in SCENARIOS.items():
+            body = {"userId": user_id, "message": message}
+            chat = run(port, chat_once, body, args.turns)
+            stream = run(port, stream_once, body, args.turns)
+            if chat[-1][3] != stream[-1][3]:
+                print(f"  !! replies differ:\n  /chat:        {chat[-1][3]!r}\n  /chat/stream: {stream[-1][3]!r}")
+            report(f"{scenario} /chat", chat)
+            report(f"{scenario} /chat/stream", stream)
+    finally:
+        server.should_exit = True
+        thread.join()
+        fake.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+"""
+Cold start of one worker, each measurement in a fresh Python process:
+
+  import    `import app.main` (what `uvicorn app.main:app`, tests and CLI scripts pay)
+  server    uvicorn subprocess against the fake OpenAI server: time until /health answers,
+            until /ready answers 200, then the latency of the first and the second /chat
+            (different messages, so the second isn't a plan-cache hit). Needs Postgres
+            (POSTGRES_* env vars as for the service; the first /chat creates a session for
+            the alice@example.com sample user).
+  no-db     the same first/second turn in-process through chat_with_llm, no HTTP and no
+            database: the DB is pointed at a closed local port, so the availability tool
+            fails fast after parsing its date. Shows what the model client and the LangChain
+            imports cost the first turn, and what the first dateparser parse costs.
+
+Every mode runs with WARMUP_ON_STARTUP off (costs land on the first request) and on.
+
+    python -m benchmarks.bench_cold_start --mode import --runs 5
+    python -m benchmarks.bench_cold_start --mode no-db --runs 3
+    python -m benchmarks.bench_cold_start --mode server
+"""
+
+import argparse
+import http.client
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from benchmarks.fake_openai import FakeOpenAI
+
+SERVICE_DIR = Path(__file__).resolve().parents[1]
+FIRST_MESSAGE = "any slots next friday?"            # check_availability tool call
+SECOND_MESSAGE = "is there availability on the 3rd of december?"
+# The fake model only emits dates the compiled fast path handles; a model's "in two weeks"
+# goes to dateparser, whose first call loads its language data
+DATEPARSER_PHRASE = "in two weeks"
+
+IMPORT_CHILD = """
+import json, time
+t0 = time.perf_counter()
+import app.main
+print(json.dumps({"import_ms": (time.perf_counter() - t0) * 1000}))
+"""
+
+NO_DB_CHILD = """
+import asyncio, json, logging, time
+logging.disable(logging.WARNING)
+t0 = time.perf_counter()
+from app import warmup
+from app.services.llm import chat_with_llm
+out = {"import_ms": (time.perf_counter() - t0) * 1000}
+t0 = time.perf_counter()
+asyncio.run(warmup.run())
+out["warmup_ms"] = (time.perf_counter() - t0) * 1000
+for key, message in (("first_ms", %r), ("second_ms", %r)):
+    t0 = time.perf_counter()
+    chat_with_llm(message, "00000000-0000-0000-0000-000000000001", [])
+    out[key] = (time.perf_counter() - t0) * 1000
+from app.services.dates import parse_user_date
+t0 = time.perf_counter()
+parse_user_date(%r)
+out["parse_ms"] = (time.perf_counter() - t0) * 1000
+print(json.dumps(out))
+""" % (FIRST_MESSAGE, SECOND_MESSAGE, DATEPARSER_PHRASE)
+
+
+def _env(fake: FakeOpenAI, warm: bool, **extra) -> dict:
+    env = dict(os.environ)
+    env.update({
+        "OPENAI_API_KEY": "fake",
+        "OPENAI_BASE_URL": fake.base_url,
+        "WARMUP_ON_STARTUP": "true" if warm else "false",
+        "LOG_LEVEL": "WARNING",
+    })
+    env.update(extra)
+    return env
+
+
+def _child(code: str, env: dict) -> dict:
+    out = subprocess.run(
+        [sys.executable, "-c", code], cwd=SERVICE_DIR, env=env, capture_output=True, text=True, check=True
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _request(port: int, method: str, path: str, body=None):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+    try:
+        payload = json.dumps(body) if body is not None else None
+        conn.request(method, path, body=payload, headers={"Content-Type": "application/json"})
+        resp = conn.getresponse()
+        return resp.status, resp.read()
+    finally:
+        conn.close()
+
+
+def _wait(port: int, path: str, want_status, deadline: float) -> float:
+    while time.perf_counter() < deadline:
+        try:
+            status, _ = _request(port, "GET", path)
+            if want_status is None or status == want_status:
+                return time.perf_counter()
+        except OSError:
+            pass
+        time.sleep(0.01)
+    raise SystemExit(f"timed out waiting for {path}")
+
+
+def _sample_user() -> str:
+    from app.db import db_conn
+    with db_conn() as conn, conn.cursor() as cur:
+        cur.execute("SELECT id FROM users WHERE email = 'alice@example.com'")
+        row = cur.fetchone()
+    if row is None:
+        raise SystemExit("no alice@example.com user; run schema.sql and sample_data.sql first")
+    return str(row[0])
+
+
+def run_server(fake: FakeOpenAI, warm: bool, user_id: str) -> dict:
+    port = _free_port()
+    t0 = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=SERVICE_DIR, env=_env(fake, warm),
+    )
+    try:
+        deadline = t0 + 120
+        out = {"listening_ms": (_wait(port, "/health", None, deadline) - t0) * 1000}
+        out["ready_ms"] = (_wait(port, "/ready", 200, deadline) - t0) * 1000
+        for key, message in (("first", FIRST_MESSAGE), ("second", SECOND_MESSAGE)):
+            t1 = time.perf_counter()
+            status, _ = _request(port, "POST", "/chat", {"userId": user_id, "message": message})
+            out[f"{key}_ms"] = (time.perf_counter() - t1) * 1000
+            out[f"{key}_status"] = status
+        return out
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
+
+
+def _median(samples, key):
+    return statistics.median(s[key] for s in samples)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--mode", choices=("import", "server", "no-db"), default="no-db")
+    ap.add_argument("--runs", type=int, default=3, help="fresh processes per setting (median reported)")
+    ap.add_argument("--latency-ms", type=float, default=0.0, help="fake model latency per call")
+    args = ap.parse_args()
+
+    if args.mode == "import":
+        samples = [_child(IMPORT_CHILD, dict(os.environ)) for _ in range(args.runs)]
+        print(f"import app.main  p50 {_median(samples, 'import_ms'):8.1f} ms  ({args.runs} processes)")
+        return
+
+    fake = FakeOpenAI(latency_ms=args.latency_ms).start()
+    user_id = _sample_user() if args.mode == "server" else None
+    try:
+        for warm in (False, True):
+            label = "warm-up on " if warm else "warm-up off"
+            if args.mode == "no-db":
+                env = _env(fake, warm, POSTGRES_HOST="127.0.0.1", POSTGRES_PORT=str(_free_port()), DB_POOL_TIMEOUT="1")
+                samples = [_child(NO_DB_CHILD, env) for _ in range(args.runs)]
+                print(
+                    f"{label}  import llm {_median(samples, 'import_ms'):6.1f} ms  warm-up {_median(samples, 'warmup_ms'):7.1f} ms  "
+                    f"first turn {_median(samples, 'first_ms'):7.1f} ms  second turn {_median(samples, 'second_ms'):6.1f} ms  "
+                    f"first dateparser parse {_median(samples, 'parse_ms'):7.1f} ms"
+                )
+            else:
+                samples = [run_server(fake, warm, user_id) for _ in range(args.runs)]
+                print(
+                    f"{label}  listening {_median(samples, 'listening_ms'):7.1f} ms  ready {_median(samples, 'ready_ms'):7.1f} ms  "
+                    f"first /chat {_median(samples, 'first_ms'):7.1f} ms (HTTP {samples[-1]['first_status']})  "
+                    f"second /chat {_median(samples, 'second_ms'):7.1f} ms"
+                )
+    finally:
+        fake.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Parses per second of parse_user_date/parse_user_datetime on a realistic corpus, comparing
+the old "dateparser for everything" behaviour with the tiered parser (fast path -> LRU ->
+dateparser). Results of both are checked to be identical.
+
+    python -m benchmarks.bench_date_parsing --rounds 20
+"""
+
+import argparse
+import logging
+import time
+
+from app.services import dates
+
+# Shapes the model/tools actually send: ISO from normalize_datetime, short relative forms
+# from users, and a tail of free-form phrases that only dateparser understands.
+CORPUS = [
+    "tomorrow", "today", "tomorrow 09:30", "tomorrow at 10:00", "tomorrow 3pm", "today 16:30",
+    "2025-11-15", "2025-11-15 10:30", "2025-11-15T10:30:00+04:00", "2025-12-01T09:00:00",
+    "monday", "next friday", "thursday 11:00", "next tuesday at 2:30 pm", "saturday 9am",
+    "Tomorrow", "TODAY", "friday", "wednesday 14:00",
+    "nov 15", "15 November", "the day after tomorrow", "next week", "december 1st 10am",
+    "in 3 days", "2 weeks from now",
+]
+
+
+def legacy_parse_datetime(text, now):
+    dt = dates._try_dateparser(text, now)
+    return None if dt is None else dates._coerce_future(dt, now, text)
+
+
+def tiered_parse_datetime(text, now):
+    dt = dates._parse(text, now)
+    return None if dt is None else dates._coerce_future(dt, now, text)
+
+
+def bench(fn, rounds):
+    t0 = time.perf_counter()
+    for _ in range(rounds):
+        for text in CORPUS:
+            fn(text, dates._now_tz())
+    elapsed = time.perf_counter() - t0
+    return rounds * len(CORPUS) / elapsed
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--rounds", type=int, default=20)
+    args = ap.parse_args()
+    logging.disable(logging.INFO)
+
+    t0 = time.perf_counter()
+    dates._try_dateparser("tomorrow", dates._now_tz())
+    print(f"first dateparser call (language data load): {(time.perf_counter() - t0) * 1000:.0f} ms")
+
+    now = dates._now_tz()
+    mismatches = [
+        t for t in CORPUS
+        # "next <weekday>" is new fast-path coverage: dateparser returns None for it.
+        if not t.startswith("next ") or t == "next week"
+        if legacy_parse_datetime(t, now) != tiered_parse_datetime(t, now)
+    ]
+    print(f"result mismatches vs dateparser: {mismatches or 'none'}")
+
+    legacy = bench(legacy_parse_datetime, args.rounds)
+    tiered = bench(tiered_parse_datetime, args.rounds)
+    print(f"dateparser only: {legacy:10.0f} parses/s")
+    print(f"tiered:          {tiered:10.0f} parses/s  ({tiered / legacy:.0f}x)")
+    print(f"tiers: {dates.date_parse_stats()}")
+
+
+if __name__ == "__main__":
+    main()
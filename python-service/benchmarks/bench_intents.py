@@ -0,0 +1,227 @@
+"""
+Messages per second and extraction accuracy of the rule-based fallback's understanding step:
+the previous implementation (dateutil on every whitespace token, then a fuzzy parse of the
+whole message that decided whether to book) against app/services/intents.extract.
+
+Both run on a labelled corpus (intent, clinic-local date, time of day). Only extraction is
+measured – no slots are listed and nothing is booked, so no database is needed.
+
+  intent   availability / booking / unknown
+  date     resolved clinic-local date (None when the message has none)
+  time     time of day (None when the message has none)
+  spurious a booking attempt on a message that didn't ask for one (a DB write before)
+
+The corpus is read at 08:00 clinic time, before any time it mentions. The run fails (exit 1)
+if the reply chat_rule_based suggests after listing slots ("<date> 15:00") isn't extracted as
+a booking of that date and time, or if any of the PAST_TIMES messages, read at 15:00, comes
+out wrong: a booking time earlier that day must be dropped, not booked.
+
+    python -m benchmarks.bench_intents --rounds 200
+"""
+
+import argparse
+import logging
+import time as timer
+from datetime import date, datetime, time, timedelta
+
+from dateutil import parser as dateparser
+
+from app.services import intents
+from app.services.dates import clinic_now
+from app.services.rules import suggested_reply
+
+# (message, intent, date spec, "HH:MM" or None). Date specs: None, "today", "+N" days, "wd:N"
+# (next weekday N after today, Monday=0), "md:M-D" (next M-D on or after today), "dm:D"
+# (next day-of-month D on or after today) or ISO.
+CORPUS = [
+    ("hello", "unknown", None, None),
+    ("hi there", "unknown", None, None),
+    ("thanks!", "unknown", None, None),
+    ("what can you do?", "unknown", None, None),
+    ("who is my dentist", "unknown", None, None),
+    ("Show me slots tomorrow", "availability", "+1", None),
+    ("any slots today?", "availability", "today", None),
+    ("slots for tomorrow please", "availability", "+1", None),
+    ("is there availability on 2026-11-15", "availability", "2026-11-15", None),
+    ("what's available on 2026-12-01?", "availability", "2026-12-01", None),
+    ("any openings next friday?", "availability", "wd:4", None),
+    ("are you free on monday", "availability", "wd:0", None),
+    ("availability thursday", "availability", "wd:3", None),
+    ("slots on nov 20", "availability", "md:11-20", None),
+    ("anything open on 3rd of december", "availability", "md:12-3", None),
+    ("free slots the day after tomorrow", "availability", "+2", None),
+    ("what about tomorrow?", "availability", "+1", None),
+    ("any slot tomorrow at 3pm?", "availability", "+1", "15:00"),
+    ("is 10:30 available today", "availability", "today", "10:30"),
+    ("show me availability for 2026-11-15", "availability", "2026-11-15", None),
+    ("Book me on 2026-11-15 10:30", "booking", "2026-11-15", "10:30"),
+    ("book tomorrow 09:30", "booking", "+1", "09:30"),
+    ("book me tomorrow at 3pm", "booking", "+1", "15:00"),
+    ("please schedule friday 11:00", "booking", "wd:4", "11:00"),
+    ("reserve 2026-12-01T09:00:00+04:00", "booking", "2026-12-01", "09:00"),
+    ("I want an appointment next tuesday at 2:30 pm", "booking", "wd:1", "14:30"),
+    ("book nov 20 10am", "booking", "md:11-20", "10:00"),
+    ("schedule the 15th of november at 9:30", "booking", "md:11-15", "09:30"),
+    ("can you book me in for today 16:30", "booking", "today", "16:30"),
+    ("book the day after tomorrow at noon", "booking", "+2", "12:00"),
+    ("book an appointment", "booking", None, None),
+    ("i'd like to book tomorrow", "booking", "+1", None),
+    ("schedule a cleaning on wednesday", "booking", "wd:2", None),
+    ("book 14:00", "booking", None, "14:00"),
+    ("Book me on 2026-11-15, 10:30 please", "booking", "2026-11-15", "10:30"),
+    ("2026-11-15 15:00", "booking", "2026-11-15", "15:00"),
+    ("tomorrow 10:30 please", "booking", "+1", "10:30"),
+    ("book tomorrow at 10", "booking", "+1", "10:00"),
+    ("book friday at 3", "booking", "wd:4", "15:00"),
+    ("I want 9am on the 20th", "booking", "dm:20", "09:00"),
+    ("any slots on the 20th?", "availability", "dm:20", None),
+    ("schedule the 3rd of december at 11", "booking", "md:12-3", "11:00"),
+    ("is any appointment available tomorrow at 10am?", "availability", "+1", "10:00"),
+    ("can you book me tomorrow at 3pm?", "availability", "+1", "15:00"),
+    ("schedule a free checkup friday at 9:30", "availability", "wd:4", "09:30"),
+]
+
+# Read at 15:00 clinic time: the time of a booking for earlier that day (or any past date) is
+# dropped, so nothing gets booked; one still ahead is kept
+PAST_TIMES = [
+    ("book today at 9", "booking", "today", None),
+    ("book me in today at 11:30am", "booking", "today", None),
+    ("2020-01-06 10:00", "booking", "2020-01-06", None),
+    ("book today at 4pm", "booking", "today", "16:00"),
+    ("book tomorrow at 9", "booking", "+1", "09:00"),
+    ("is 10:30 available today", "availability", "today", "10:30"),
+]
+
+# Phrasings the extractor is known to get wrong, scored separately so the corpus numbers
+# above aren't inflated by leaving them out
+KNOWN_MISSES = [
+    ("can I come in sometime next week", "availability", None, None),  # no week spans
+    ("look at 2 openings tomorrow", "availability", "+1", None),       # "at 2" read as 14:00
+    ("book half past ten tomorrow", "booking", "+1", "10:30"),         # no spelled-out times
+]
+
+
+def expected_date(spec, today: date):
+    if spec is None:
+        return None
+    if spec == "today":
+        return today
+    if spec.startswith("+"):
+        return today + timedelta(days=int(spec[1:]))
+    if spec.startswith("wd:"):
+        return today + timedelta(days=(int(spec[3:]) - today.weekday()) % 7 or 7)
+    if spec.startswith("dm:"):
+        mday, d = int(spec[3:]), today
+        while d.day != mday:
+            d += timedelta(days=1)
+        return d
+    if spec.startswith("md:"):
+        month, day = map(int, spec[3:].split("-"))
+        d = date(today.year, month, day)
+        return d if d >= today else date(today.year + 1, month, day)
+    return date.fromisoformat(spec)
+
+
+def legacy_extract(message: str, now: datetime):
+    """What chat_rule_based used to conclude, without the DB calls it made."""
+    today = now.date()
+    text = message.lower()
+    date_candidate = None
+    for token in text.replace(",", " ").split():
+        try:
+            date_candidate = dateparser.parse(token, fuzzy=False).date()
+            break
+        except Exception:
+            continue
+    kind = "availability" if any(k in text for k in ["slot", "available", "availability", "book", "schedule"]) else "unknown"
+    at = None
+    try:
+        # The old code called create_appointment with whatever this returned
+        dt = dateparser.parse(message, fuzzy=True, default=datetime.combine(today, time(0, 0)))
+        kind, date_candidate, at = "booking", dt.date(), dt.time()
+    except Exception:
+        pass
+    return kind, date_candidate, at
+
+
+def new_extract(message: str, now: datetime):
+    intent = intents.extract(message, now)
+    return intent.kind, intent.day, intent.at
+
+
+def accuracy(fn, now: datetime, corpus=CORPUS):
+    scores = {"intent": 0, "date": 0, "time": 0, "all": 0, "spurious": 0}
+    misses = []
+    for message, kind, date_spec, hhmm in corpus:
+        got_kind, got_day, got_at = fn(message, now)
+        want_day = expected_date(date_spec, now.date())
+        want_at = time.fromisoformat(hhmm) if hhmm else None
+        ok = (got_kind == kind, got_day == want_day, got_at == want_at)
+        scores["intent"] += ok[0]
+        scores["date"] += ok[1]
+        scores["time"] += ok[2]
+        scores["all"] += all(ok)
+        # A booking attempt needs a time; anything else with one was a DB write nobody asked for
+        scores["spurious"] += got_kind == "booking" and got_at is not None and kind != "booking"
+        if not all(ok):
+            misses.append((message, (got_kind, got_day, got_at)))
+    return scores, misses
+
+
+def suggested_reply_books(now: datetime) -> bool:
+    day = now.date() + timedelta(days=1)
+    intent = intents.extract(suggested_reply(day), now)
+    return intent.kind == intents.BOOKING and intent.day == day and intent.at == time(15, 0)
+
+
+def throughput(fn, now: datetime, rounds: int) -> float:
+    t0 = timer.perf_counter()
+    for _ in range(rounds):
+        for message, *_ in CORPUS:
+            fn(message, now)
+    return rounds * len(CORPUS) / (timer.perf_counter() - t0)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--rounds", type=int, default=200)
+    ap.add_argument("--show-misses", action="store_true")
+    args = ap.parse_args()
+    logging.disable(logging.INFO)
+
+    morning = clinic_now().replace(hour=8, minute=0, second=0, microsecond=0)
+    afternoon = morning.replace(hour=15)
+    n = len(CORPUS)
+    print(f"corpus: {n} labelled messages, today={morning.date().isoformat()}")
+    for label, fn, rounds in (("legacy", legacy_extract, max(1, args.rounds // 20)), ("intents", new_extract, args.rounds)):
+        scores, misses = accuracy(fn, morning)
+        rate = throughput(fn, morning, rounds)
+        print(
+            f"{label:8s} {rate:10.0f} msg/s  intent {scores['intent']}/{n}  date {scores['date']}/{n}  "
+            f"time {scores['time']}/{n}  all {scores['all']}/{n}  spurious bookings {scores['spurious']}"
+        )
+        if args.show_misses:
+            for message, got in misses:
+                print(f"    miss: {message!r} -> {got}")
+
+    scores, misses = accuracy(new_extract, morning, KNOWN_MISSES)
+    print(f"known misses: {scores['all']}/{len(KNOWN_MISSES)} right")
+    if args.show_misses:
+        for message, got in misses:
+            print(f"    miss: {message!r} -> {got}")
+    failed = False
+    if not suggested_reply_books(morning):
+        print(f"FAIL: the suggested reply {suggested_reply(morning.date() + timedelta(days=1))!r} doesn't book")
+        failed = True
+    else:
+        print("suggested reply books: ok")
+    scores, misses = accuracy(new_extract, afternoon, PAST_TIMES)
+    print(f"times already past at 15:00: {scores['all']}/{len(PAST_TIMES)} right")
+    for message, got in misses:
+        print(f"    FAIL: {message!r} -> {got}")
+    failed = failed or bool(misses)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
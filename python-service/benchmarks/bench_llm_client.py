@@ -0,0 +1,79 @@
+"""
+Startup cost of the model/tool registry and per-message model-call overhead, against the
+local fake OpenAI server (no network, no DB: the scripted reply is plain text).
+
+  per-call: build a fresh LLMRegistry (ChatOpenAI + tools + bind_tools) for every message,
+            like chat_with_llm used to
+  shared:   reuse the process-wide registry and its keep-alive HTTP client
+
+    python -m benchmarks.bench_llm_client --messages 200
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+from benchmarks.fake_openai import FakeOpenAI
+
+
+def _report(name, latencies, fake, connections_before):
+    print(
+        f"{name:<9} p50={statistics.median(latencies):7.3f}ms "
+        f"mean={statistics.fmean(latencies):7.3f}ms "
+        f"new_tcp_connections={fake.connections - connections_before}"
+    )
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--messages", type=int, default=200)
+    args = ap.parse_args()
+
+    fake = FakeOpenAI().start()
+    os.environ["OPENAI_API_KEY"] = "fake"
+    os.environ["OPENAI_BASE_URL"] = fake.base_url
+
+    t0 = time.perf_counter()
+    from app.services import llm  # noqa: E402  (config reads the env above at import)
+    t_import = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    registry = llm.get_registry()
+    t_cold = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    asyncio.run(llm.LLMRegistry().aclose())
+    t_warm = time.perf_counter() - t0
+
+    print(f"import app.services.llm: {t_import * 1000:7.1f} ms")
+    print(f"registry build (cold):   {t_cold * 1000:7.1f} ms  (langchain imports + clients + bind_tools)")
+    print(f"registry build (warm):   {t_warm * 1000:7.1f} ms")
+
+    messages = llm._build_messages("hello", [])
+
+    conns = fake.connections
+    latencies = []
+    for _ in range(args.messages):
+        t0 = time.perf_counter()
+        per_call = llm.LLMRegistry()
+        per_call.llm_with_tools.invoke(messages)
+        latencies.append((time.perf_counter() - t0) * 1000)
+        asyncio.run(per_call.aclose())
+    _report("per-call", latencies, fake, conns)
+
+    conns = fake.connections
+    latencies = []
+    for _ in range(args.messages):
+        t0 = time.perf_counter()
+        registry.llm_with_tools.invoke(messages)
+        latencies.append((time.perf_counter() - t0) * 1000)
+    _report("shared", latencies, fake, conns)
+
+    asyncio.run(llm.close_registry())
+    fake.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,357 @@
+"""
+Load test for /chat: N concurrent clients (keep-alive connections) send scripted turns for a
+fixed duration; reports p50/p95/p99 latency and requests per second per scenario and stores
+the run as JSON so runs can be compared over time.
+
+  availability  "any slots <day>?"          -> check_availability tool call
+  booking       "book me <YYYY-MM-DD HH:MM>"  -> schedule_appointment (random far-future slot)
+  chat          "hello"                     -> plain model text, no tool
+  mixed         70% availability / 10% booking / 20% chat
+
+The model is the local fake OpenAI server (benchmarks/fake_openai.py) with --latency-ms per
+call, so the LLM path of chat_with_llm runs without a network. The service runs in-process
+under uvicorn with DEFAULT_PROVIDER set to a bench provider whose appointments are deleted
+afterwards. --url targets an already running service instead (point its OPENAI_BASE_URL at
+`python -m benchmarks.fake_openai`); its bookings go to that service's DEFAULT_PROVIDER and
+are left in place.
+
+Needs a local Postgres (POSTGRES_* env vars as for the service); --seed applies
+`postgres scripts/schema.sql` and `sample_data.sql` and creates --users bench patients first.
+
+    python -m benchmarks.bench_load --seed --scenario mixed --concurrency 32 --duration 30
+    python -m benchmarks.bench_load --scenario availability --compare benchmarks/results/<earlier>.json
+"""
+
+import argparse
+import http.client
+import json
+import logging
+import math
+import os
+import platform
+import random
+import re
+import socket
+import subprocess
+import threading
+import time
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlsplit
+
+from benchmarks.fake_openai import FakeOpenAI
+
+BENCH_PROVIDER = "Dr. Bench Load"
+SQL_DIR = Path(__file__).resolve().parents[2] / "postgres scripts"
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+
+MIXES = {
+    "availability": {"availability": 1.0},
+    "booking": {"booking": 1.0},
+    "chat": {"chat": 1.0},
+    "mixed": {"availability": 0.7, "booking": 0.1, "chat": 0.2},
+}
+DAY_PHRASES = ("today", "tomorrow", "next monday", "next wednesday", "friday")
+PATH_RE = re.compile(r'^chat_reply_path_total\{path="(\w+)"\} ([0-9.e+]+)$', re.MULTILINE)
+
+
+# ---------- setup ----------
+
+def seed(users: int) -> None:
+    from app.db import db_conn
+
+    with db_conn() as conn, conn.cursor() as cur:
+        cur.execute((SQL_DIR / "schema.sql").read_text())
+        cur.execute("SELECT 1 FROM users WHERE email = 'alice@example.com'")
+        if cur.fetchone() is None:
+            cur.execute((SQL_DIR / "sample_data.sql").read_text())
+        cur.executemany(
+            """INSERT INTO users (email, password_hash, full_name, role)
+               VALUES (%s, 'bench', %s, 'patient') ON CONFLICT (email) DO NOTHING""",
+            [(f"bench-{i}@example.com", f"Bench Patient {i}") for i in range(users)],
+        )
+
+
+def user_ids() -> List[str]:
+    from app.db import db_conn
+
+    with db_conn() as conn, conn.cursor() as cur:
+        cur.execute("SELECT id FROM users WHERE email LIKE 'bench-%%@example.com' ORDER BY email")
+        ids = [str(r[0]) for r in cur.fetchall()]
+        if not ids:
+            cur.execute("SELECT id FROM users ORDER BY created_at LIMIT 1")
+            ids = [str(cur.fetchone()[0])]
+    return ids
+
+
+def cleanup() -> int:
+    from app.db import db_conn
+
+    with db_conn() as conn, conn.cursor() as cur:
+        cur.execute("DELETE FROM appointments WHERE provider_name = %s", (BENCH_PROVIDER,))
+        return cur.rowcount
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _serve(app, port: int, workers_hint: int):
+    import uvicorn
+
+    server = uvicorn.Server(
+        uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", backlog=max(2048, workers_hint * 4))
+    )
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    return server, thread
+
+
+# ---------- load ----------
+
+def message(kind: str, rng: random.Random) -> str:
+    if kind == "availability":
+        return f"any slots {rng.choice(DAY_PHRASES)}?"
+    if kind == "booking":
+        # Far out and spread over a year so most bookings land on a free slot
+        day = date.today() + timedelta(days=rng.randrange(400, 765))
+        slot = rng.randrange(16)
+        return f"book me {day.isoformat()} {9 + slot // 2:02d}:{30 * (slot % 2):02d}"
+    return "hello"
+
+
+def _pick(mix: Dict[str, float], rng: random.Random) -> str:
+    return rng.choices(list(mix), weights=list(mix.values()))[0]
+
+
+class Worker(threading.Thread):
+    """One client: a keep-alive connection and a session that restarts every `turns_per_session`."""
+
+    def __init__(self, idx: int, host: str, port: int, users: List[str], mix: Dict[str, float],
+                 deadline: float, measure_from: float, turns_per_session: int, seed_: int):
+        super().__init__(daemon=True)
+        self.host, self.port = host, port
+        self.user_id = users[idx % len(users)]
+        self.mix = mix
+        self.deadline = deadline
+        self.measure_from = measure_from
+        self.turns_per_session = turns_per_session
+        self.rng = random.Random(seed_ + idx)
+        self.samples: List[tuple] = []  # (scenario, seconds, ok)
+
+    def run(self) -> None:
+        conn = http.client.HTTPConnection(self.host, self.port, timeout=120)
+        session_id: Optional[str] = None
+        turns = 0
+        while True:
+            t0 = time.perf_counter()
+            if t0 >= self.deadline:
+                break
+            kind = _pick(self.mix, self.rng)
+            body: Dict[str, Any] = {"userId": self.user_id, "message": message(kind, self.rng)}
+            if session_id:
+                body["sessionId"] = session_id
+            ok = False
+            try:
+                conn.request("POST", "/chat", json.dumps(body), {"Content-Type": "application/json"})
+                resp = conn.getresponse()
+                data = resp.read()
+                ok = resp.status == 200
+                if ok:
+                    session_id = json.loads(data)["sessionId"]
+            except (OSError, http.client.HTTPException):
+                conn.close()
+                conn = http.client.HTTPConnection(self.host, self.port, timeout=120)
+            elapsed = time.perf_counter() - t0
+            if t0 >= self.measure_from:
+                self.samples.append((kind, elapsed, ok))
+            turns += 1
+            if turns % self.turns_per_session == 0:
+                session_id = None
+        conn.close()
+
+
+def reply_paths(host: str, port: int) -> Dict[str, float]:
+    """chat_reply_path_total from /metrics (empty if the target doesn't expose it)."""
+    conn = http.client.HTTPConnection(host, port, timeout=10)
+    try:
+        conn.request("GET", "/metrics")
+        resp = conn.getresponse()
+        text = resp.read().decode()
+        return {m.group(1): float(m.group(2)) for m in PATH_RE.finditer(text)} if resp.status == 200 else {}
+    except (OSError, http.client.HTTPException):
+        return {}
+    finally:
+        conn.close()
+
+
+def run_load(host: str, port: int, users: List[str], mix: Dict[str, float], concurrency: int,
+             duration: float, warmup: float, turns_per_session: int, seed_: int):
+    start = time.perf_counter()
+    measure_from = start + warmup
+    deadline = measure_from + duration
+    workers = [
+        Worker(i, host, port, users, mix, deadline, measure_from, turns_per_session, seed_)
+        for i in range(concurrency)
+    ]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    return [s for w in workers for s in w.samples], duration
+
+
+# ---------- reporting ----------
+
+def _percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    k = math.ceil(q * len(sorted_values)) - 1  # nearest rank
+    return sorted_values[max(0, min(len(sorted_values) - 1, k))]
+
+
+def summarize(samples: List[tuple], duration: float) -> Dict[str, Dict[str, float]]:
+    groups: Dict[str, List[tuple]] = {"all": samples}
+    for s in samples:
+        groups.setdefault(s[0], []).append(s)
+    out = {}
+    for name, group in groups.items():
+        lat = sorted(s[1] for s in group)
+        out[name] = {
+            "requests": len(group),
+            "errors": sum(1 for s in group if not s[2]),
+            "rps": round(len(group) / duration, 2),
+            "mean_ms": round(sum(lat) / len(lat) * 1000, 2) if lat else 0.0,
+            "p50_ms": round(_percentile(lat, 0.50) * 1000, 2),
+            "p95_ms": round(_percentile(lat, 0.95) * 1000, 2),
+            "p99_ms": round(_percentile(lat, 0.99) * 1000, 2),
+            "max_ms": round(lat[-1] * 1000, 2) if lat else 0.0,
+        }
+    return out
+
+
+def report(results: Dict[str, Dict[str, float]]) -> None:
+    print(f"{'scenario':14s} {'requests':>9s} {'errors':>7s} {'req/s':>9s} {'p50 ms':>9s} {'p95 ms':>9s} {'p99 ms':>9s}")
+    for name, r in results.items():
+        print(
+            f"{name:14s} {r['requests']:9d} {r['errors']:7d} {r['rps']:9.1f} "
+            f"{r['p50_ms']:9.1f} {r['p95_ms']:9.1f} {r['p99_ms']:9.1f}"
+        )
+
+
+def compare(results: Dict[str, Dict[str, float]], baseline_path: str) -> None:
+    baseline = json.loads(Path(baseline_path).read_text())
+    print(f"\nvs {baseline_path} ({baseline.get('started_at', '?')}, git {baseline.get('git', '?')})")
+    for name, r in results.items():
+        old = baseline.get("results", {}).get(name)
+        if not old:
+            continue
+        deltas = []
+        for key in ("rps", "p50_ms", "p95_ms", "p99_ms"):
+            if old.get(key):
+                deltas.append(f"{key} {old[key]:.1f} -> {r[key]:.1f} ({(r[key] / old[key] - 1) * 100:+.1f}%)")
+        print(f"{name:14s} " + "  ".join(deltas))
+
+
+def _git_rev() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=Path(__file__).resolve().parent,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--scenario", choices=sorted(MIXES), default="mixed")
+    ap.add_argument("--concurrency", type=int, default=16)
+    ap.add_argument("--duration", type=float, default=30.0, help="measured seconds")
+    ap.add_argument("--warmup", type=float, default=3.0, help="seconds of load before measuring")
+    ap.add_argument("--turns-per-session", type=int, default=10)
+    ap.add_argument("--latency-ms", type=float, default=200.0, help="fake model latency per call")
+    ap.add_argument("--execution-mode", choices=("sync", "async"), default=os.getenv("CHAT_EXECUTION_MODE", "sync"))
+    ap.add_argument("--url", help="load an already running service instead of starting one in-process")
+    ap.add_argument("--seed", action="store_true", help="apply schema.sql/sample_data.sql and create bench users")
+    ap.add_argument("--users", type=int, default=50, help="bench patients created by --seed")
+    ap.add_argument("--random-seed", type=int, default=1)
+    ap.add_argument("--out", help="result JSON (default benchmarks/results/load-<scenario>-<timestamp>.json)")
+    ap.add_argument("--compare", help="earlier result JSON to diff against")
+    args = ap.parse_args()
+    logging.disable(logging.INFO)
+
+    fake = server = thread = None
+    if args.url:
+        target = urlsplit(args.url)
+        host, port = target.hostname, target.port or 80
+    else:
+        fake = FakeOpenAI(latency_ms=args.latency_ms).start()
+        os.environ["OPENAI_API_KEY"] = "fake"
+        os.environ["OPENAI_BASE_URL"] = fake.base_url
+        os.environ["CHAT_EXECUTION_MODE"] = args.execution_mode
+        os.environ["DEFAULT_PROVIDER"] = BENCH_PROVIDER
+        os.environ.setdefault("DB_POOL_MAX", str(max(10, args.concurrency)))
+        from app.api import app  # noqa: E402  (config reads the env above at import)
+
+        host, port = "127.0.0.1", _free_port()
+        server, thread = _serve(app, port, args.concurrency)
+
+    if args.seed:
+        seed(args.users)
+    users = user_ids()
+    started_at = datetime.now(timezone.utc).isoformat(timespec="seconds")
+    print(
+        f"scenario={args.scenario} concurrency={args.concurrency} duration={args.duration:.0f}s "
+        f"target={'%s:%d' % (host, port)} mode={args.execution_mode if not args.url else 'external'} "
+        f"model latency={args.latency_ms:.0f} ms users={len(users)}"
+    )
+    try:
+        paths_before = reply_paths(host, port)
+        samples, duration = run_load(
+            host, port, users, MIXES[args.scenario], args.concurrency, args.duration, args.warmup,
+            args.turns_per_session, args.random_seed,
+        )
+        paths_after = reply_paths(host, port)
+    finally:
+        if server is not None:
+            server.should_exit = True
+            thread.join()
+            fake.stop()
+            print(f"removed {cleanup()} bench appointments")
+
+    results = summarize(samples, duration)
+    report(results)
+    paths = {k: paths_after[k] - paths_before.get(k, 0) for k in paths_after}
+    if paths:
+        print("reply paths (incl. warm-up): " + ", ".join(f"{k}={v:.0f}" for k, v in sorted(paths.items())))
+
+    record = {
+        "started_at": started_at,
+        "git": _git_rev(),
+        "python": platform.python_version(),
+        "params": {
+            k: getattr(args, k)
+            for k in ("scenario", "concurrency", "duration", "warmup", "turns_per_session", "latency_ms",
+                      "execution_mode", "url", "users", "random_seed")
+        },
+        "results": results,
+        "reply_paths": paths,
+    }
+    out = Path(args.out) if args.out else RESULTS_DIR / (
+        f"load-{args.scenario}-{started_at.replace(':', '').replace('+0000', 'Z')}.json"
+    )
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(record, indent=2) + "\n")
+    print(f"saved {out}")
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
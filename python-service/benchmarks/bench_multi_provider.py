@@ -0,0 +1,180 @@
+"""
+Free-slot computation for a whole clinic: every provider × every day of a month, each with
+its own business hours. Compares the three ways the service has answered it:
+
+  overlaps  the original loop: per provider-day, per grid slot, any(overlaps(...)) over
+            that day's appointments
+  per-slot  the occupancy index with a per-slot mask AND (the previous free_slots)
+  batched   availability.free_starts: all provider-days packed into one bitset, one
+            shift/AND pass (what list_location_slots_range / list_any_provider_slots use)
+
+Appointments are synthetic (a seeded RNG, roughly --fill of each provider's hours booked)
+and the occupancy masks are folded from them once up front (also timed), so no database
+is needed. Every method must return the same slots; the run fails if they differ.
+
+    python -m benchmarks.bench_multi_provider --providers 100 --days 30 --rounds 20
+"""
+
+import argparse
+import random
+import statistics
+import time as timer
+from datetime import date, datetime, time, timedelta
+from zoneinfo import ZoneInfo
+
+from app.services import availability, scheduling
+from app.services.providers import Provider
+
+TZ = ZoneInfo("Asia/Dubai")
+
+# (weekday spans) templates: minutes after local midnight, Monday=0
+SHIFTS = [
+    (((540, 1020),),) * 7,                                 # 09:00-17:00 every day
+    (((480, 720), (780, 960)),) * 5 + ((),) * 2,           # weekdays 08:00-12:00, 13:00-16:00
+    ((),) * 5 + (((600, 1080),),) * 2,                     # weekends 10:00-18:00
+    (((420, 900),),) * 6 + ((),),                          # Mon-Sat 07:00-15:00
+    ((), ((720, 1260),), ((720, 1260),), (), ((720, 1260),), ((720, 1260),), ()),  # late shifts
+]
+
+
+def make_providers(n: int):
+    return [Provider(f"Dr. Bench {i:03d}", "Bench Clinic", SHIFTS[i % len(SHIFTS)]) for i in range(n)]
+
+
+def make_appointments(staff, days, fill: float, rng: random.Random):
+    """Non-overlapping 15-60 min bookings inside each provider's hours."""
+    rows = []
+    for p in staff:
+        for day in days:
+            midnight = datetime.combine(day, time(0, 0), tzinfo=TZ)
+            for first, last in p.spans(day):
+                minute = first
+                while minute < last:
+                    length = rng.choice((15, 30, 30, 45, 60))
+                    if minute + length <= last and rng.random() < fill:
+                        rows.append({
+                            "provider_name": p.name,
+                            "start_time": midnight + timedelta(minutes=minute),
+                            "end_time": midnight + timedelta(minutes=minute + length),
+                        })
+                    minute += length
+    return rows
+
+
+def grid(p: Provider, day: date, duration: int):
+    midnight = datetime.combine(day, time(0, 0), tzinfo=TZ)
+    step = timedelta(minutes=duration)
+    out = []
+    for first, last in p.spans(day):
+        start = midnight + timedelta(minutes=first)
+        for i in range((last - first) // duration):
+            out.append((start + i * step, start + (i + 1) * step))
+    return out
+
+
+def overlaps(a_start, a_end, b_start, b_end) -> bool:
+    return a_start < b_end and b_start < a_end
+
+
+def by_overlaps(staff, days, appts, duration, limit):
+    by_key = {}
+    for r in appts:
+        by_key.setdefault((r["provider_name"], r["start_time"].date()), []).append(r)
+    out = []
+    for p in staff:
+        for day in days:
+            booked = by_key.get((p.name, day), [])
+            free = []
+            for s, e in grid(p, day, duration):
+                if any(overlaps(s, e, r["start_time"], r["end_time"]) for r in booked):
+                    continue
+                free.append((s, e))
+                if len(free) >= limit:
+                    break
+            out.append(free)
+    return out
+
+
+def by_slot_mask(staff, days, occ, duration, limit):
+    out = []
+    for p in staff:
+        for day in days:
+            mask = occ[(p.name, day)]
+            day_start, day_end = availability.day_bounds(day, TZ)
+            free = []
+            for s, e in grid(p, day, duration):
+                if mask & availability._span_mask(*availability._minute_span(s, e, day_start, day_end)):
+                    continue
+                free.append((s, e))
+                if len(free) >= limit:
+                    break
+            out.append(free)
+    return out
+
+
+def batched(staff, days, occ, duration, limit):
+    return scheduling._free_rows(scheduling._staff_rows(staff, days, occ), TZ, duration, limit)
+
+
+def timed(fn, rounds: int):
+    samples, result = [], None
+    for _ in range(rounds):
+        t0 = timer.perf_counter()
+        result = fn()
+        samples.append((timer.perf_counter() - t0) * 1000)
+    return result, samples
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--providers", type=int, default=100)
+    ap.add_argument("--days", type=int, default=30)
+    ap.add_argument("--duration", type=int, default=30, help="slot length, minutes")
+    ap.add_argument("--limit", type=int, default=200, help="slots per provider-day (200 = all)")
+    ap.add_argument("--fill", type=float, default=0.5, help="share of business hours booked")
+    ap.add_argument("--rounds", type=int, default=20)
+    ap.add_argument("--seed", type=int, default=1)
+    args = ap.parse_args()
+
+    rng = random.Random(args.seed)
+    staff = make_providers(args.providers)
+    first = date(2026, 11, 2)
+    days = [first + timedelta(days=i) for i in range(args.days)]
+    appts = make_appointments(staff, days, args.fill, rng)
+    names = [p.name for p in staff]
+
+    occ, fold_ms = timed(lambda: availability.occupancy_by_provider_day(appts, names, days, TZ), max(1, args.rounds // 5))
+    print(
+        f"{len(staff)} providers x {len(days)} days = {len(staff) * len(days)} provider-days, "
+        f"{len(appts)} appointments, {args.duration}-min slots"
+    )
+    print(f"fold into occupancy masks: {statistics.median(fold_ms):8.2f} ms (once per cache fill)")
+
+    occupancy = [occ[(p.name, day)] for p in staff for day in days]
+    spans = [p.spans(day) for p in staff for day in days]
+    _, pass_ms = timed(lambda: availability.free_starts(occupancy, spans, args.duration), args.rounds)
+    print(f"bitset pass alone:         {statistics.median(pass_ms):8.2f} ms (free_starts, no slot objects)")
+
+    runs = [
+        ("overlaps", lambda: by_overlaps(staff, days, appts, args.duration, args.limit), max(1, args.rounds // 5)),
+        ("per-slot", lambda: by_slot_mask(staff, days, occ, args.duration, args.limit), max(1, args.rounds // 5)),
+        ("batched", lambda: batched(staff, days, occ, args.duration, args.limit), args.rounds),
+    ]
+    results = {}
+    for label, fn, rounds in runs:
+        results[label], samples = timed(fn, rounds)
+        slots = sum(len(r) for r in results[label])
+        print(
+            f"{label:9s} p50 {statistics.median(samples):8.2f} ms  min {min(samples):8.2f} ms  "
+            f"({rounds} rounds, {slots} free slots)"
+        )
+
+    base = results["overlaps"]
+    for label in ("per-slot", "batched"):
+        if results[label] != base:
+            raise SystemExit(f"{label} disagrees with overlaps")
+    print("all methods agree")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+Availability index misses: reading the per-(provider, day) occupancy summary versus folding
+the raw appointment rows, and what maintaining the summary costs a booking.
+
+Seeds --providers synthetic "Dr. Summary NNN" providers with about --fill of 08:00-23:00
+booked on each of --days days (plus cancelled rows, as real tables have), then times
+availability's loader both ways for:
+
+  day      one provider, one day      (list_available_slots on a cold index)
+  month    one provider, 31 days      (/availability?from=&to=)
+  clinic   every provider, --days     (/availability/location)
+
+and a single-row INSERT with the summary triggers on and skipped
+(session_replication_role = replica). Both reads must agree. Needs Postgres with the schema
+(POSTGRES_* env vars as for the service); the seeded rows are deleted afterwards.
+
+    python -m benchmarks.bench_occupancy_summary --providers 100 --days 30 --rounds 50
+"""
+
+import argparse
+import random
+import statistics
+import time as timer
+from datetime import date, datetime, time, timedelta
+
+from psycopg2.extras import execute_values
+
+from app.db import db_conn
+from app.services import availability
+from app.services.scheduling import _clinic_tz
+
+PREFIX = "Dr. Summary "
+
+
+def seed(providers, days, fill: float, rng: random.Random, tz) -> int:
+    with db_conn() as conn, conn.cursor() as cur:
+        cur.execute("SELECT id FROM users WHERE email = 'alice@example.com'")
+        row = cur.fetchone()
+        if row is None:
+            raise SystemExit("no alice@example.com user; run schema.sql and sample_data.sql first")
+        rows = []
+        for p in providers:
+            for day in days:
+                midnight = datetime.combine(day, time(0, 0), tzinfo=tz)
+                minute = 8 * 60
+                while minute < 23 * 60:
+                    length = rng.choice((15, 30, 30, 45, 60))
+                    if rng.random() < fill:
+                        start = midnight + timedelta(minutes=minute)
+                        status = "cancelled" if rng.random() < 0.2 else rng.choice(("pending", "confirmed"))
+                        rows.append((row[0], start, start + timedelta(minutes=length), status, p))
+                    minute += length
+        execute_values(
+            cur, "INSERT INTO appointments (user_id, start_time, end_time, status, provider_name) VALUES %s",
+            rows, page_size=5000,
+        )
+    return len(rows)
+
+
+def cleanup() -> None:
+    with db_conn() as conn, conn.cursor() as cur:
+        cur.execute("DELETE FROM appointments WHERE provider_name LIKE %s", (PREFIX + "%",))
+
+
+def timed(fn, rounds: int):
+    samples, result = [], None
+    for _ in range(rounds):
+        t0 = timer.perf_counter()
+        result = fn()
+        samples.append((timer.perf_counter() - t0) * 1000)
+    return result, samples
+
+
+def load(providers, days, tz, summary: bool):
+    availability._summary_available = summary
+    return availability._load(providers, days, tz)
+
+
+def insert_ms(rounds: int, triggers: bool, tz) -> float:
+    samples = []
+    with db_conn() as conn, conn.cursor() as cur:
+        cur.execute("SELECT id FROM users WHERE email = 'alice@example.com'")
+        user_id = cur.fetchone()[0]
+    base = datetime.combine(date(2031, 1, 1), time(9, 0), tzinfo=tz)
+    for i in range(rounds):
+        start = base + timedelta(days=i, hours=int(triggers))
+        with db_conn() as conn, conn.cursor() as cur:
+            if not triggers:
+                cur.execute("SET LOCAL session_replication_role = replica")
+            t0 = timer.perf_counter()
+            cur.execute(
+                "INSERT INTO appointments (user_id, start_time, end_time, status, provider_name) "
+                "VALUES (%s, %s, %s, 'confirmed', %s)",
+                (user_id, start, start + timedelta(minutes=30), PREFIX + "insert"),
+            )
+            conn.commit()
+            samples.append((timer.perf_counter() - t0) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--providers", type=int, default=100)
+    ap.add_argument("--days", type=int, default=30)
+    ap.add_argument("--fill", type=float, default=0.5, help="share of 08:00-23:00 booked")
+    ap.add_argument("--rounds", type=int, default=50)
+    ap.add_argument("--seed", type=int, default=1)
+    args = ap.parse_args()
+
+    tz = _clinic_tz()
+    providers = [f"{PREFIX}{i:03d}" for i in range(args.providers)]
+    first = date(2030, 3, 4)
+    days = [first + timedelta(days=i) for i in range(args.days)]
+    cleanup()
+    try:
+        n = seed(providers, days, args.fill, random.Random(args.seed), tz)
+        with db_conn() as conn, conn.cursor() as cur:
+            cur.execute("ANALYZE appointments; ANALYZE appointment_occupancy")
+        print(f"{n} appointments for {len(providers)} providers x {len(days)} days")
+
+        month = [first + timedelta(days=i) for i in range(31)]
+        cases = [
+            ("day", providers[:1], days[:1], args.rounds),
+            ("month", providers[:1], month, args.rounds),
+            ("clinic", providers, days, max(1, args.rounds // 10)),
+        ]
+        for label, who, when, rounds in cases:
+            scanned, scan_ms = timed(lambda: load(who, when, tz, False), rounds)
+            summed, summary_ms = timed(lambda: load(who, when, tz, True), rounds)
+            if scanned != summed:
+                raise SystemExit(f"{label}: summary disagrees with the appointment scan")
+            print(
+                f"{label:6s} scan p50 {statistics.median(scan_ms):8.2f} ms   "
+                f"summary p50 {statistics.median(summary_ms):8.2f} ms   ({rounds} rounds)"
+            )
+
+        print(
+            f"insert  triggers skipped p50 {insert_ms(args.rounds, False, tz):6.2f} ms   "
+            f"with triggers p50 {insert_ms(args.rounds, True, tz):6.2f} ms"
+        )
+    finally:
+        availability._summary_available = True
+        cleanup()
+
+
+if __name__ == "__main__":
+    main()
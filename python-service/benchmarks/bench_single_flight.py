@@ -0,0 +1,167 @@
+"""
+Single-flight availability lookups (scheduling._lookups): a burst of identical lookups
+for a day nobody has asked about yet (cold availability index), as when several chats
+check the same day at once. Each round releases --callers threads (or coroutines, --mode
+async) together on list_available_slots for a fresh day, with SINGLE_FLIGHT_LOOKUPS off,
+then on; reported are Postgres round trips per burst and per-caller latency.
+
+Before that, a booking race is checked (exit 1 on failure): a lookup that starts after a
+booking must not join one that read the occupancy before it. The first lookup's read is held
+back and a booking of the whole day is written through while it waits; the second lookup
+has to come back empty instead of sharing the first one's free slots.
+
+Needs Postgres with the schema (POSTGRES_* env vars as for the service). Read-only.
+
+    python -m benchmarks.bench_single_flight --callers 32 --rounds 50
+    python -m benchmarks.bench_single_flight --callers 32 --rounds 50 --mode async
+"""
+
+import argparse
+import asyncio
+import statistics
+import threading
+import time
+from datetime import datetime, timedelta
+
+from app.core import config, metrics
+from app.db import close_pool
+from app.adb import close_async_pool
+from app.services import availability, providers, scheduling
+
+FULL_DAY = (1 << 1500) - 1  # every minute of any clinic-local day taken
+
+
+def _round_trips() -> float:
+    return metrics.db_round_trips._values.get((), 0)
+
+
+def _days(first: int, rounds: int):
+    # Far enough out that no booking or earlier run has warmed them
+    tz = scheduling._clinic_tz()
+    start = datetime.now(tz).replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=3000 + first)
+    return [start + timedelta(days=i) for i in range(rounds)]
+
+
+def burst_threads(day: datetime, callers: int):
+    barrier = threading.Barrier(callers)
+    latencies = [0.0] * callers
+
+    def call(i):
+        barrier.wait()
+        t0 = time.perf_counter()
+        scheduling.list_available_slots(day)
+        latencies[i] = (time.perf_counter() - t0) * 1000
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(callers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return latencies
+
+
+async def burst_async(day: datetime, callers: int):
+    async def call():
+        t0 = time.perf_counter()
+        await scheduling.alist_available_slots(day)
+        return (time.perf_counter() - t0) * 1000
+
+    return await asyncio.gather(*(call() for _ in range(callers)))
+
+
+def check_booking_race() -> bool:
+    scheduling._lookups.enabled = True
+    day = _days(-3, 1)[0]
+    first_read, release = threading.Event(), threading.Event()
+    real = availability.day_occupancy
+    reads = []
+
+    def held_read(provider, d, tz):
+        # The first read is the pre-booking snapshot (all free); later ones see the booking
+        reads.append(d)
+        if len(reads) == 1:
+            first_read.set()
+            release.wait(5)
+            return 0
+        return FULL_DAY
+
+    results = {}
+    availability.day_occupancy = held_read
+    try:
+        before = threading.Thread(target=lambda: results.setdefault("before", scheduling.list_available_slots(day)))
+        before.start()
+        first_read.wait(5)
+        availability.mark_booked(config.DEFAULT_PROVIDER, day, day + timedelta(days=1))
+        after = threading.Thread(target=lambda: results.setdefault("after", scheduling.list_available_slots(day)))
+        after.start()
+        after.join(0.5)
+        release.set()
+        before.join()
+        after.join()
+    finally:
+        availability.day_occupancy = real
+    ok = bool(results.get("before")) and results.get("after") == []
+    print(
+        f"booking race: lookup before the booking {len(results.get('before') or [])} slots, "
+        f"after it {len(results.get('after') or [])} slots, {len(reads)} reads -> {'ok' if ok else 'FAIL'}"
+    )
+    return ok
+
+
+def report(enabled: bool, latencies, trips):
+    latencies = sorted(latencies)
+    label = "single-flight" if enabled else "off"
+    print(
+        f"  {label:<14} round trips/burst {statistics.mean(trips):6.1f}   "
+        f"p50 {statistics.median(latencies):7.2f} ms   p95 {latencies[int(len(latencies) * 0.95)]:7.2f} ms   "
+        f"max {latencies[-1]:7.2f} ms"
+    )
+
+
+def run_threads(callers: int, rounds: int):
+    scheduling.list_available_slots(_days(-1, 1)[0])
+    for enabled, first_day in ((False, 0), (True, rounds)):
+        scheduling._lookups.enabled = enabled
+        latencies, trips = [], []
+        for day in _days(first_day, rounds):
+            before = _round_trips()
+            latencies += burst_threads(day, callers)
+            trips.append(_round_trips() - before)
+        report(enabled, latencies, trips)
+    close_pool()
+
+
+async def run_async(callers: int, rounds: int):
+    await scheduling.alist_available_slots(_days(-1, 1)[0])
+    for enabled, first_day in ((False, 0), (True, rounds)):
+        scheduling._lookups.enabled = enabled
+        latencies, trips = [], []
+        for day in _days(first_day, rounds):
+            before = _round_trips()
+            latencies += await burst_async(day, callers)
+            trips.append(_round_trips() - before)
+        report(enabled, latencies, trips)
+    await close_async_pool()
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--mode", choices=("threads", "async"), default="threads")
+    ap.add_argument("--callers", type=int, default=32)
+    ap.add_argument("--rounds", type=int, default=50)
+    args = ap.parse_args()
+
+    # Provider directory and pool warm first, so a burst only reads occupancy
+    providers.directory()
+    if not check_booking_race():
+        return 1
+    print(f"{args.callers} concurrent identical lookups x {args.rounds} rounds ({args.mode})")
+    if args.mode == "async":
+        asyncio.run(run_async(args.callers, args.rounds))
+    else:
+        run_threads(args.callers, args.rounds)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
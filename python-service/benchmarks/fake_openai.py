@@ -0,0 +1,231 @@
+"""
+Deterministic OpenAI-compatible stand-in (POST /v1/chat/completions) for benchmarks.
+
+The reply is scripted from the last user message, so the /chat LLM path runs end to end
+without a network or an API key:
+
+  "earliest"/"soonest"/"first/next available" -> tool call find_next_available(after=<date phrase | 'now'>)
+  "slots"/"available"/"availability"  -> tool call check_availability(date=<date phrase | 'tomorrow'>)
+  "book"/"schedule" + HH:MM           -> tool call schedule_appointment(start_iso=<date phrase> <HH:MM>)
+  anything else                       -> plain assistant text
+
+Requests with "stream": true get chat.completion.chunk events: --latency-ms before the
+first chunk, then --token-ms between chunks (one per word of text / per tool-call delta).
+Non-streamed replies wait for the same total generation time before answering.
+
+Run standalone:
+    python -m benchmarks.fake_openai --port 9100 --latency-ms 200 --token-ms 20
+and point the service at it with OPENAI_BASE_URL=http://127.0.0.1:9100/v1 OPENAI_API_KEY=fake.
+"""
+
+import argparse
+import json
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+DATE_RE = re.compile(
+    r"\b(\d{4}-\d{2}-\d{2}|today|tomorrow|(?:next\s+)?(?:mon|tues|wednes|thurs|fri|satur|sun)day)\b",
+    re.IGNORECASE,
+)
+TIME_RE = re.compile(r"\b(\d{1,2}:\d{2})\b")
+AVAILABILITY_RE = re.compile(r"\b(slots?|available|availability|openings?)\b", re.IGNORECASE)
+NEXT_RE = re.compile(r"\b(earliest|soonest|(?:first|next) (?:available|opening))\b", re.IGNORECASE)
+BOOKING_RE = re.compile(r"\b(book|schedule|reserve)\b", re.IGNORECASE)
+
+DEFAULT_TEXT = "I can help you check availability and book appointments."
+
+
+def script_reply(text: str) -> Dict[str, Any]:
+    """Scripted assistant message (OpenAI wire format) for the last user message."""
+    date = DATE_RE.search(text)
+    date_phrase = date.group(1).lower() if date else "tomorrow"
+    hhmm = TIME_RE.search(text)
+
+    call: Optional[Dict[str, Any]] = None
+    if BOOKING_RE.search(text) and hhmm:
+        call = {"name": "schedule_appointment", "arguments": {"start_iso": f"{date_phrase} {hhmm.group(1)}"}}
+    elif NEXT_RE.search(text):
+        call = {"name": "find_next_available", "arguments": {"after": date.group(1).lower() if date else "now"}}
+    elif AVAILABILITY_RE.search(text):
+        call = {"name": "check_availability", "arguments": {"date": date_phrase}}
+
+    if call is None:
+        return {"role": "assistant", "content": DEFAULT_TEXT}
+    return {
+        "role": "assistant",
+        "content": None,
+        "tool_calls": [
+            {
+                "id": "call_" + uuid.uuid4().hex[:12],
+                "type": "function",
+                "function": {"name": call["name"], "arguments": json.dumps(call["arguments"])},
+            }
+        ],
+    }
+
+
+def _last_user_text(messages: List[Dict[str, Any]]) -> str:
+    for m in reversed(messages):
+        if m.get("role") == "user":
+            content = m.get("content")
+            return content if isinstance(content, str) else json.dumps(content)
+    return ""
+
+
+class FakeOpenAI:
+    """Threaded HTTP/1.1 server (keep-alive) with request/connection counters."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency_ms: float = 0.0, token_ms: float = 0.0):
+        self.latency_ms = latency_ms
+        self.token_ms = token_ms
+        self.requests = 0
+        self.connections = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> "FakeOpenAI":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def serve_forever(self) -> None:
+        self._server.serve_forever()
+
+    def _count(self, attr: str) -> None:
+        with self._lock:
+            setattr(self, attr, getattr(self, attr) + 1)
+
+    def completion(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        message = script_reply(_last_user_text(body.get("messages", [])))
+        return {
+            "id": "chatcmpl-" + uuid.uuid4().hex[:12],
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "fake"),
+            "choices": [
+                {
+                    "index": 0,
+                    "message": message,
+                    "finish_reason": "tool_calls" if message.get("tool_calls") else "stop",
+                }
+            ],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+        }
+
+    def completion_chunks(self, body: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """The same scripted message as a list of streaming chunks (OpenAI delta format)."""
+        message = script_reply(_last_user_text(body.get("messages", [])))
+        if message.get("tool_calls"):
+            deltas: List[Dict[str, Any]] = [{"role": "assistant", "content": None}]
+            for i, call in enumerate(message["tool_calls"]):
+                fn = call["function"]
+                deltas.append({"tool_calls": [{
+                    "index": i, "id": call["id"], "type": "function",
+                    "function": {"name": fn["name"], "arguments": ""},
+                }]})
+                deltas.append({"tool_calls": [{"index": i, "function": {"arguments": fn["arguments"]}}]})
+            finish = "tool_calls"
+        else:
+            words = message["content"].split(" ")
+            deltas = [{"role": "assistant", "content": ""}]
+            deltas += [{"content": w if i == 0 else " " + w} for i, w in enumerate(words)]
+            finish = "stop"
+
+        base = {
+            "id": "chatcmpl-" + uuid.uuid4().hex[:12],
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": body.get("model", "fake"),
+        }
+        chunks = [{**base, "choices": [{"index": 0, "delta": d, "finish_reason": None}]} for d in deltas]
+        chunks.append({**base, "choices": [{"index": 0, "delta": {}, "finish_reason": finish}]})
+        if (body.get("stream_options") or {}).get("include_usage"):
+            chunks.append({**base, "choices": [], "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}})
+        return chunks
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def setup(self):
+                super().setup()
+                fake._count("connections")
+
+            def log_message(self, *args):
+                pass
+
+            def _send_json(self, status: int, payload: Dict[str, Any]) -> None:
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                if not self.path.rstrip("/").endswith("/chat/completions"):
+                    self._send_json(404, {"error": {"message": f"unknown path {self.path}"}})
+                    return
+                fake._count("requests")
+                if fake.latency_ms:
+                    time.sleep(fake.latency_ms / 1000)
+                chunks = fake.completion_chunks(body)
+                if body.get("stream"):
+                    self._send_stream(chunks)
+                else:
+                    if fake.token_ms:
+                        time.sleep(fake.token_ms * (len(chunks) - 1) / 1000)
+                    self._send_json(200, fake.completion(body))
+
+            def _write_chunk(self, data: bytes) -> None:
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+                self.wfile.flush()
+
+            def _send_stream(self, chunks: List[Dict[str, Any]]) -> None:
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                for i, chunk in enumerate(chunks):
+                    if i and fake.token_ms:
+                        time.sleep(fake.token_ms / 1000)
+                    self._write_chunk(b"data: " + json.dumps(chunk).encode() + b"\n\n")
+                self._write_chunk(b"data: [DONE]\n\n")
+                self._write_chunk(b"")
+
+        return Handler
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=9100)
+    ap.add_argument("--latency-ms", type=float, default=0.0)
+    ap.add_argument("--token-ms", type=float, default=0.0, help="delay between streamed chunks")
+    args = ap.parse_args()
+    fake = FakeOpenAI(args.host, args.port, args.latency_ms, args.token_ms)
+    print(f"fake OpenAI listening on {fake.base_url} (latency {args.latency_ms:.0f} ms, token {args.token_ms:.0f} ms)")
+    fake.serve_forever()
+
+
+if __name__ == "__main__":
+    main()